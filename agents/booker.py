@@ -1,6 +1,13 @@
 from typing import List
 from schemas.response import Transportation, DestinationPlan
-from utils.llm import LLMService
+from schemas.structured import TRANSPORTATION_RESPONSE_SCHEMA
+from utils.llm import LLMService, structured_system_message
+
+# Consigne fixe en message système, trajet et budget en fin de prompt (préfixe stable pour le cache KV)
+TRANSPORTATION_SYSTEM_MESSAGE = structured_system_message("""
+Propose 1 option de transport pour le trajet et le budget de la demande.
+Format attendu : { "transportation": [ { "type": ..., "from_location": ..., "to_location": ..., "departure_time": ..., "arrival_time": ..., "cost": ..., "booking_url": ... } ] }
+""")
 
 class BookerAgent:
     def __init__(self, llm_service: LLMService):
@@ -10,11 +17,10 @@ class BookerAgent:
         """
         Génère des options de transport via Ollama
         """
-        prompt = f"""
-        Propose 1 option de transport de {from_destination.city} à {to_destination.city} pour un budget de {budget}.
-        Format attendu : {{ "transportation": [ {{ "type": ..., "from_location": ..., "to_location": ..., "departure_time": ..., "arrival_time": ..., "cost": ..., "booking_url": ... }} ] }}
-        """
-        response = await self.llm_service.generate_structured_response(prompt)
+        prompt = f"Trajet : de {from_destination.city} à {to_destination.city}\nBudget : {budget}"
+        response = await self.llm_service.generate_structured_response(
+            prompt, TRANSPORTATION_SYSTEM_MESSAGE, schema=TRANSPORTATION_RESPONSE_SCHEMA, caller="booker.find_transportation"
+        )
         return [Transportation(**trans) for trans in response.get("transportation", [])]
 
     async def optimize_transportation(self, transportation_options: List[Transportation], criteria: str = "cost") -> Transportation:
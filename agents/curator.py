@@ -1,8 +1,66 @@
-from typing import List
-from schemas.response import Activity, Accommodation, DestinationPlan
-from utils.llm import LLMService
+from typing import List, Dict, Any, AsyncIterator
+from pydantic import ValidationError
+from schemas.request import TravelRequest, Destination
+from schemas.response import Activity, Accommodation, DayPlan, DestinationPlan, ACTIVITY_LIST
+from schemas.structured import ACTIVITIES_RESPONSE_SCHEMA, ACCOMMODATIONS_RESPONSE_SCHEMA, PLAN_AND_CURATE_RESPONSE_SCHEMA
+from utils.llm import LLMService, structured_system_message
+from datetime import timedelta
 import re
 
+# Tokens de sortie prévus par jour en mode fusionné (3 activités, repas)
+FUSED_TOKENS_PER_DAY = 350
+
+# Instructions fixes de chaque type d'appel, envoyées en message système : elles forment un
+# préfixe identique d'un appel à l'autre (cache KV d'Ollama) ; la destination vient en fin de prompt
+ACTIVITIES_SYSTEM_MESSAGE = structured_system_message("""
+Propose 3 activités par jour en JSON pour la destination de la demande, adaptées à ses centres d'intérêt et à son budget.
+Chaque activité doit obligatoirement contenir les champs suivants :
+- name (str)
+- description (str)
+- duration_hours (float)
+- cost (float)
+- location (str)
+- category (str)
+N'utilise que les clés : name, description, duration_hours, cost, location, category. Pas d'autres clés.
+Format attendu : { "activities": [ { "name": ..., "description": ..., "duration_hours": ..., "cost": ..., "location": ..., "category": ... } ] }
+Réponds uniquement avec le JSON.
+""")
+
+ACCOMMODATIONS_SYSTEM_MESSAGE = structured_system_message("""
+Propose 1 hébergement pour la destination, les dates, le style et le budget total de la demande.
+Format attendu : { "accommodations": [ { "name": ..., "type": ..., "location": ..., "check_in": ..., "check_out": ..., "price_per_night": ..., "booking_url": ... } ] }
+""")
+
+PLAN_AND_CURATE_SYSTEM_MESSAGE = structured_system_message("""
+Génère un programme de voyage structuré en JSON pour la destination décrite dans la demande.
+Pour chaque jour, propose 3 activités adaptées aux centres d'intérêt et au budget, avec obligatoirement :
+name, description, duration_hours, cost, location, category.
+Propose aussi 1 hébergement pour tout le séjour, dans le style demandé, avec :
+name, type, location, check_in, check_out, price_per_night, booking_url.
+
+Format attendu : { "days": [ { "date": ..., "activities": [ { "name": ..., "description": ..., "duration_hours": ..., "cost": ..., "location": ..., "category": ... } ], "meals": [...] } ], "accommodation": { "name": ..., "type": ..., "location": ..., "check_in": ..., "check_out": ..., "price_per_night": ..., "booking_url": ... } }
+""")
+
+DAY_PLAN_SYSTEM_MESSAGE = """Tu es un assistant spécialisé dans la génération de programmes de voyage.
+Génère un programme de voyage structuré jour par jour pour la destination de la demande.
+Pour chaque jour, propose :
+- Une activité le matin
+- Un restaurant pour le midi
+- Une ou deux activités l'après-midi
+- Un restaurant pour le soir
+- Une activité le soir
+
+Présente chaque jour ainsi :
+
+Jour X (Ville)
+Matin : ...
+Déjeuner : ...
+Après-midi : ...
+Soir : ...
+Nuit : ...
+
+Sois synthétique, va à la ligne pour chaque section, et ne donne que le programme sans texte autour."""
+
 class CuratorAgent:
     def __init__(self, llm_service: LLMService):
         self.llm_service = llm_service
@@ -11,22 +69,25 @@ class CuratorAgent:
         """
         Enrichit les activités pour une destination via Ollama
         """
-        prompt = f"""
-        Pour la destination {destination_plan.city}, propose 3 activités par jour en JSON, adaptées aux intérêts suivants : {', '.join(interests)} et au budget {budget}.
-        Chaque activité doit obligatoirement contenir les champs suivants :
-        - name (str)
-        - description (str)
-        - duration_hours (float)
-        - cost (float)
-        - location (str)
-        - category (str)
-        N'utilise que les clés : name, description, duration_hours, cost, location, category. Pas d'autres clés.
-        Format attendu : {{ "activities": [ {{ "name": ..., "description": ..., "duration_hours": ..., "cost": ..., "location": ..., "category": ... }} ] }}
-        Réponds uniquement avec le JSON.
+        prompt = (
+            f"Destination : {destination_plan.city}\n"
+            f"Centres d'intérêt : {', '.join(interests)}\n"
+            f"Budget : {budget}"
+        )
+        response = await self.llm_service.generate_structured_response(
+            prompt, ACTIVITIES_SYSTEM_MESSAGE, schema=ACTIVITIES_RESPONSE_SCHEMA, caller="curator.enhance_activities"
+        )
+        return self.normalize_activities(response.get("activities", []), destination_plan.city)
+
+    def normalize_activities(self, raw_activities: List[Dict[str, Any]], city: str) -> List[Activity]:
+        """
+        Convertit les activités renvoyées par le LLM (clés variables, durées et coûts en texte)
+        en objets Activity ; une activité "Découverte libre" remplace une liste vide
         """
-        response = await self.llm_service.generate_structured_response(prompt)
         activities = []
-        for act in response.get("activities", []):
+        for act in raw_activities:
+            if not isinstance(act, dict):
+                continue
             # Mapping ultra-générique des clés pour le nom
             name = (
                 act.get("name")
@@ -43,7 +104,7 @@ class CuratorAgent:
                 "description": act.get("description") or act.get("desc") or act.get("details") or act.get("texte") or name,
                 "duration_hours": 1.0,
                 "cost": 0.0,
-                "location": act.get("location") or act.get("lieu") or destination_plan.city,
+                "location": act.get("location") or act.get("lieu") or city,
                 "category": act.get("category") or act.get("type") or "général"
             }
             # Parsing duration
@@ -71,55 +132,119 @@ class CuratorAgent:
                 except Exception:
                     pass
             # Ajoute uniquement l'objet bien formaté
-            activities.append(Activity(**activity_data))
-        # Fallback si aucune activité valide
+            activities.append(activity_data)
+        # Fallback si aucune activité valide (valeurs fixes : pas de validation)
         if not activities:
-            activities.append(Activity(
+            return [Activity.model_construct(
                 name="Découverte libre",
                 description="Journée libre pour explorer la ville.",
                 duration_hours=4.0,
                 cost=0.0,
-                location=destination_plan.city,
+                location=city,
                 category="général"
-            ))
-        return activities
+            )]
+        # Liste entière validée en un appel à pydantic-core
+        return ACTIVITY_LIST.validate_python(activities)
 
     async def find_accommodations(self, destination_plan: DestinationPlan, budget: float, style: str) -> List[Accommodation]:
         """
         Trouve des hébergements via Ollama
         """
-        prompt = f"""
-        Propose 1 hébergement pour {destination_plan.city} du {destination_plan.days[0].date} au {destination_plan.days[-1].date}, style : {style}, budget total : {budget}.
-        Format attendu : {{ "accommodations": [ {{ "name": ..., "type": ..., "location": ..., "check_in": ..., "check_out": ..., "price_per_night": ..., "booking_url": ... }} ] }}
+        prompt = (
+            f"Destination : {destination_plan.city}\n"
+            f"Dates : du {destination_plan.days[0].date} au {destination_plan.days[-1].date}\n"
+            f"Style : {style}\n"
+            f"Budget total : {budget}"
+        )
+        response = await self.llm_service.generate_structured_response(
+            prompt, ACCOMMODATIONS_SYSTEM_MESSAGE, schema=ACCOMMODATIONS_RESPONSE_SCHEMA, caller="curator.find_accommodations"
+        )
+        return self.normalize_accommodations(response.get("accommodations", []), destination_plan)
+
+    def normalize_accommodations(self, raw_accommodations: List[Dict[str, Any]], destination_plan: DestinationPlan) -> List[Accommodation]:
+        """
+        Convertit les hébergements renvoyés par le LLM en objets Accommodation : lieu et dates
+        manquants repris de l'itinéraire, entrées inexploitables ignorées
+        """
+        accommodations = []
+        for acc in raw_accommodations:
+            if not isinstance(acc, dict):
+                continue
+            data = {
+                "location": destination_plan.city,
+                "check_in": destination_plan.days[0].date if destination_plan.days else None,
+                "check_out": destination_plan.days[-1].date if destination_plan.days else None,
+                **{key: value for key, value in acc.items() if value not in (None, "")}
+            }
+            try:
+                accommodations.append(Accommodation(**data))
+            except ValidationError:
+                continue
+        return accommodations
+
+    async def plan_and_curate(self, request: TravelRequest, destination: Destination, interests: List[str], style: str) -> DestinationPlan:
+        """
+        Mode fusionné : un seul prompt structuré renvoie les jours, leurs activités et un hébergement
+        pour la destination (au lieu de l'itinéraire du planner, de l'enrichissement et de l'hébergement)
         """
-        response = await self.llm_service.generate_structured_response(prompt)
-        return [Accommodation(**acc) for acc in response.get("accommodations", [])]
+        interests = interests or [request.mood]
+        prompt = (
+            f"Programme pour {destination.city}, {destination.country} sur {destination.duration_days} jours.\n"
+            f"Dates: {request.start_date} à {request.end_date}\n"
+            f"Mood: {request.mood}\n"
+            f"Budget: {request.budget}\n"
+            f"Groupe: {request.group_size}\n"
+            f"Centres d'intérêt: {', '.join(interests)}\n"
+            f"Style d'hébergement: {style}"
+        )
+        response = await self.llm_service.generate_structured_response(
+            prompt,
+            PLAN_AND_CURATE_SYSTEM_MESSAGE,
+            schema=PLAN_AND_CURATE_RESPONSE_SCHEMA,
+            max_tokens=max(self.llm_service.options["num_predict"], FUSED_TOKENS_PER_DAY * destination.duration_days),
+            caller="curator.plan_and_curate"
+        )
+        raw_days = [day for day in response.get("days", []) if isinstance(day, dict)]
+        # Autant de jours que demandé : un jour absent (sortie tronquée) reçoit l'activité de repli
+        days = []
+        for offset in range(destination.duration_days):
+            raw_day = raw_days[offset] if offset < len(raw_days) else {}
+            # Activités validées, repas et notes filtrés : jour assemblé sans nouvelle validation
+            days.append(DayPlan.model_construct(
+                date=request.start_date + timedelta(days=offset),
+                activities=self.normalize_activities(raw_day.get("activities", []), destination.city),
+                meals=[meal for meal in raw_day.get("meals", []) if isinstance(meal, str)],
+                notes=raw_day.get("notes") if isinstance(raw_day.get("notes"), str) else None
+            ))
+        plan = DestinationPlan.model_construct(
+            city=destination.city,
+            country=destination.country,
+            days=days,
+            accommodations=[],
+            transportation=[]
+        )
+        accommodation = response.get("accommodation")
+        plan.accommodations = self.normalize_accommodations([accommodation] if accommodation else [], plan)
+        return plan
 
     async def generate_structured_day_plan(self, destination_plan: DestinationPlan, interests: List[str], budget: float) -> str:
         """
         Génère un programme texte structuré jour par jour pour une destination via Ollama
         """
-        prompt = f"""
-Pour la destination {destination_plan.city}, génère un programme de voyage structuré jour par jour pour un groupe de {len(destination_plan.days)} jours.
-Pour chaque jour, propose :
-- Une activité le matin
-- Un restaurant pour le midi
-- Une ou deux activités l'après-midi
-- Un restaurant pour le soir
-- Une activité le soir
+        prompt = self._structured_day_plan_prompt(destination_plan, interests, budget)
+        response = await self.llm_service.generate_response(prompt, DAY_PLAN_SYSTEM_MESSAGE, caller="curator.structured_day_plan")
+        return response
 
-Présente chaque jour ainsi :
-
-Jour X ({destination_plan.city})
-Matin : ...
-Déjeuner : ...
-Après-midi : ...
-Soir : ...
-Nuit : ...
+    def stream_structured_day_plan(self, destination_plan: DestinationPlan, interests: List[str], budget: float) -> AsyncIterator[str]:
+        """
+        Variante streamée de generate_structured_day_plan (fragments de texte au fil de la génération)
+        """
+        prompt = self._structured_day_plan_prompt(destination_plan, interests, budget)
+        return self.llm_service.stream_response(prompt, DAY_PLAN_SYSTEM_MESSAGE, caller="curator.structured_day_plan")
 
-Sois synthétique, va à la ligne pour chaque section, et ne donne que le programme sans texte autour.
-Centres d'intérêt : {', '.join(interests)}
-Budget total : {budget} €
-"""
-        response = await self.llm_service.generate_response(prompt)
-        return response 
\ No newline at end of file
+    def _structured_day_plan_prompt(self, destination_plan: DestinationPlan, interests: List[str], budget: float) -> str:
+        return (
+            f"Pour la destination {destination_plan.city}, programme de {len(destination_plan.days)} jours.\n"
+            f"Centres d'intérêt : {', '.join(interests)}\n"
+            f"Budget total : {budget} €"
+        )
@@ -1,116 +1,153 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from schemas.request import TravelRequest
 from schemas.response import TravelProgram
 from agents.planner import PlannerAgent
 from agents.curator import CuratorAgent
 from agents.booker import BookerAgent
 from utils.llm import LLMService
-from datetime import datetime
+from utils.intent import IntentClassifier
+from utils.sessions import SessionStore, MemorySessionStore
+from utils.context import ConversationContextBuilder, estimate_tokens, ROLE_LABELS
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Messages système fixes : premier segment de chaque appel, repris du cache KV d'Ollama
+CHAT_SYSTEM_MESSAGE = (
+    "Tu es un expert en voyages qui conseille un voyageur. Tiens compte des échanges précédents "
+    "de la conversation (destinations, dates, budget, préférences, décisions)."
+)
+
+INTENT_SYSTEM_MESSAGE = """Analyse le message de l'utilisateur et détermine l'intention principale.
+Réponds avec un seul mot parmi :
+- PROGRAM : demande de génération/modification de programme
+- INFO : demande d'information sur une destination/activité
+- BOOKING : demande de réservation
+- OTHER : autre type de demande"""
+
+SUMMARY_SYSTEM_MESSAGE = """Mets à jour le résumé d'une conversation entre un voyageur et un expert en voyages.
+Conserve les destinations, dates, budget, préférences et décisions. 120 mots maximum, sans introduction."""
 
 class AgentManager:
-    def __init__(self, llm_service: LLMService):
+    def __init__(self, llm_service: LLMService, sessions: Optional[SessionStore] = None):
         self.llm_service = llm_service
         self.planner = PlannerAgent(llm_service)
         self.curator = CuratorAgent(llm_service)
         self.booker = BookerAgent(llm_service)
-        self.conversations: Dict[str, List[Dict[str, str]]] = {}
+        # Historique des conversations (borné, éventuellement partagé entre workers)
+        self.sessions = sessions or MemorySessionStore()
+        self.intent_classifier = IntentClassifier()
+        # Confiance minimale du classifieur local pour se passer de l'appel LLM
+        self.intent_threshold = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.5"))
+        self.intent_stats = {"local": 0, "llm": 0}
+        self.context_builder = ConversationContextBuilder(self.sessions, self._summarize_history)
+        self.context_stats = {"turns": 0, "last_prompt_tokens": 0, "max_prompt_tokens": 0}
 
     async def process_message(self, session_id: str, message: str, context: Dict[str, Any] = None) -> str:
         """
         Traite un message utilisateur et génère une réponse appropriée
         """
-        # Initialiser ou récupérer l'historique de conversation
-        if session_id not in self.conversations:
-            self.conversations[session_id] = []
-        
         # Ajouter le message de l'utilisateur à l'historique
-        self.conversations[session_id].append({
-            "role": "user",
-            "content": message,
-            "timestamp": datetime.now().isoformat()
-        })
-
-        # Analyser l'intention du message
-        intent_prompt = f"""
-        Analyse le message suivant et détermine l'intention principale :
-        Message: {message}
-        
-        Réponds avec un seul mot parmi :
-        - PROGRAM : demande de génération/modification de programme
-        - INFO : demande d'information sur une destination/activité
-        - BOOKING : demande de réservation
-        - OTHER : autre type de demande
-        """
-        intent = await self.llm_service.generate_response(intent_prompt)
+        await self.sessions.append(session_id, "user", message)
+
+        # Analyser l'intention du message (classifieur local, LLM seulement si la confiance est faible)
+        intent, confidence = self.intent_classifier.classify(message)
+        if confidence >= self.intent_threshold:
+            self.intent_stats["local"] += 1
+        else:
+            self.intent_stats["llm"] += 1
+            intent = await self._classify_with_llm(message)
+
+        # Contexte de conversation borné (résumé glissant + derniers échanges), envoyé en messages
+        summary, history = await self.context_builder.build_messages(session_id)
+        prompt_tokens = estimate_tokens(summary) + sum(estimate_tokens(m["content"]) for m in history) + estimate_tokens(message)
+        self.context_stats["turns"] += 1
+        self.context_stats["last_prompt_tokens"] = prompt_tokens
+        self.context_stats["max_prompt_tokens"] = max(self.context_stats["max_prompt_tokens"], prompt_tokens)
+        logger.info("Chat session=%s messages=%d tokens_contexte=%d", session_id, await self.sessions.count(session_id), prompt_tokens)
 
         # Générer une réponse appropriée selon l'intention
         if "PROGRAM" in intent.upper():
-            response = await self._handle_program_request(message, context)
+            response = await self._handle_program_request(message, context, summary, history)
         elif "INFO" in intent.upper():
-            response = await self._handle_info_request(message)
+            response = await self._handle_info_request(message, summary, history)
         elif "BOOKING" in intent.upper():
-            response = await self._handle_booking_request(message)
+            response = await self._handle_booking_request(message, summary, history)
         else:
-            response = await self._handle_general_request(message)
+            response = await self._handle_general_request(message, summary, history)
 
         # Ajouter la réponse à l'historique
-        self.conversations[session_id].append({
-            "role": "assistant",
-            "content": response,
-            "timestamp": datetime.now().isoformat()
-        })
+        await self.sessions.append(session_id, "assistant", response)
 
         return response
 
-    async def _handle_program_request(self, message: str, context: Dict[str, Any] = None) -> str:
+    async def _classify_with_llm(self, message: str) -> str:
         """
-        Gère les demandes liées à la génération ou modification de programme
+        Classification de l'intention par le LLM (repli du classifieur local)
+        """
+        return await self.llm_service.generate_response(f"Message: {message}", INTENT_SYSTEM_MESSAGE, caller="manager.intent")
+
+    async def _summarize_history(self, summary: str, messages: List[Dict[str, str]]) -> str:
         """
-        prompt = f"""
-        En tant qu'expert en voyages, réponds à la demande suivante concernant un programme de voyage :
-        {message}
-        
-        Si la demande nécessite des modifications au programme, explique les changements proposés.
-        Si c'est une nouvelle demande, propose une structure de programme adaptée.
+        Replie les messages sortis de la fenêtre dans le résumé de la conversation
         """
-        return await self.llm_service.generate_response(prompt)
+        exchanges = "\n".join(f"{ROLE_LABELS.get(m['role'], m['role'])} : {m['content']}" for m in messages)
+        prompt = f"Résumé actuel : {summary or '(vide)'}\nNouveaux échanges :\n{exchanges}"
+        return (await self.llm_service.generate_response(prompt, SUMMARY_SYSTEM_MESSAGE, caller="manager.summary")).strip()
+
+    async def _reply(self, instruction: str, message: str, summary: str, history: List[Dict[str, str]], caller: str) -> str:
+        """
+        Réponse de chat : message système fixe (et résumé, qui ne change qu'au repli), échanges
+        précédents en messages user/assistant, puis la demande en cours suivie de la consigne du type
+        de demande. Seul ce dernier message est nouveau pour le cache KV d'Ollama.
+        """
+        system_message = CHAT_SYSTEM_MESSAGE
+        if summary:
+            system_message += f"\n\nRésumé de la conversation : {summary}"
+        return await self.llm_service.generate_response(
+            f"{message}\n\n{instruction}", system_message, caller=caller, history=history
+        )
 
-    async def _handle_info_request(self, message: str) -> str:
+    async def _handle_program_request(
+        self,
+        message: str,
+        context: Dict[str, Any] = None,
+        summary: str = "",
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> str:
         """
-        Gère les demandes d'information sur les destinations ou activités
+        Gère les demandes liées à la génération ou modification de programme
         """
-        prompt = f"""
-        En tant qu'expert en voyages, fournis des informations détaillées sur :
-        {message}
-        
-        Inclus des détails pratiques, des conseils et des recommandations.
+        instruction = (
+            "Si la demande nécessite des modifications au programme, explique les changements proposés. "
+            "Si c'est une nouvelle demande, propose une structure de programme adaptée."
+        )
+        return await self._reply(instruction, message, summary, history or [], "manager.program")
+
+    async def _handle_info_request(self, message: str, summary: str = "", history: Optional[List[Dict[str, str]]] = None) -> str:
         """
-        return await self.llm_service.generate_response(prompt)
+        Gère les demandes d'information sur les destinations ou activités
+        """
+        instruction = "Fournis des informations détaillées : détails pratiques, conseils et recommandations."
+        return await self._reply(instruction, message, summary, history or [], "manager.info")
 
-    async def _handle_booking_request(self, message: str) -> str:
+    async def _handle_booking_request(self, message: str, summary: str = "", history: Optional[List[Dict[str, str]]] = None) -> str:
         """
         Gère les demandes de réservation
         """
-        prompt = f"""
-        En tant qu'expert en voyages, explique le processus de réservation pour :
-        {message}
-        
-        Fournis des étapes claires et des conseils pratiques.
-        """
-        return await self.llm_service.generate_response(prompt)
+        instruction = "Explique le processus de réservation avec des étapes claires et des conseils pratiques."
+        return await self._reply(instruction, message, summary, history or [], "manager.booking")
 
-    async def _handle_general_request(self, message: str) -> str:
+    async def _handle_general_request(self, message: str, summary: str = "", history: Optional[List[Dict[str, str]]] = None) -> str:
         """
         Gère les autres types de demandes
         """
-        prompt = f"""
-        En tant qu'expert en voyages, réponds de manière professionnelle et utile à :
-        {message}
-        """
-        return await self.llm_service.generate_response(prompt)
+        instruction = "Réponds de manière professionnelle et utile."
+        return await self._reply(instruction, message, summary, history or [], "manager.general")
 
-    def get_conversation_history(self, session_id: str) -> List[Dict[str, str]]:
+    async def get_conversation_history(self, session_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, str]]:
         """
-        Récupère l'historique des conversations pour une session donnée
+        Récupère l'historique des conversations pour une session donnée (éventuellement paginé)
         """
-        return self.conversations.get(session_id, []) 
\ No newline at end of file
+        return await self.sessions.history(session_id, offset, limit) 
\ No newline at end of file
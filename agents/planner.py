@@ -1,67 +1,93 @@
-from typing import List
-from schemas.request import TravelRequest
-from schemas.response import DayPlan, DestinationPlan, Activity
-from utils.llm import LLMService
+from typing import List, Optional
+from schemas.request import TravelRequest, Destination
+from schemas.response import DayPlan, DestinationPlan, DAY_PLAN_LIST
+from schemas.structured import DAYS_RESPONSE_SCHEMA
+from utils.llm import LLMService, structured_system_message
+from utils.taskgraph import TaskGraph
 from datetime import timedelta
 
+# Instructions fixes en tête (préfixe réutilisé par le cache KV d'Ollama), destination en fin de prompt
+PLAN_SYSTEM_MESSAGE = structured_system_message("""
+Génère un programme de voyage structuré en JSON pour la destination décrite dans la demande.
+Pour chaque activité, fournis obligatoirement :
+- name (str) : nom de l'activité
+- description (str) : description courte
+- duration_hours (float) : durée en heures
+- cost (float) : coût en euros
+- location (str) : lieu précis
+- category (str) : type d'activité
+
+Format attendu : { "days": [ { "date": ..., "activities": [ { "name": ..., "description": ..., "duration_hours": ..., "cost": ..., "location": ..., "category": ... } ] } ] }
+""")
+
 class PlannerAgent:
     def __init__(self, llm_service: LLMService):
         self.llm_service = llm_service
 
-    async def create_itinerary(self, request: TravelRequest) -> List[DestinationPlan]:
+    async def create_itinerary(self, request: TravelRequest, max_concurrency: Optional[int] = None) -> List[DestinationPlan]:
+        """
+        Crée un itinéraire détaillé pour chaque destination en utilisant Ollama (destinations traitées en parallèle)
+        """
+        graph = TaskGraph(max_concurrency)
+        for i, destination in enumerate(request.destinations):
+            graph.add(f"plan:{i}", lambda results, destination=destination: self.create_destination_plan(request, destination))
+        run = await graph.run()
+        return [run.results[f"plan:{i}"] for i in range(len(request.destinations))]
+
+    async def create_destination_plan(self, request: TravelRequest, destination: Destination) -> DestinationPlan:
+        """
+        Crée l'itinéraire jour par jour d'une destination
+        """
+        prompt = (
+            f"Programme pour {destination.city}, {destination.country} sur {destination.duration_days} jours.\n"
+            f"Dates: {request.start_date} à {request.end_date}\n"
+            f"Mood: {request.mood}\n"
+            f"Budget: {request.budget}\n"
+            f"Groupe: {request.group_size}"
+        )
+        response = await self.llm_service.generate_structured_response(
+            prompt, PLAN_SYSTEM_MESSAGE, schema=DAYS_RESPONSE_SCHEMA, caller="planner.create_destination_plan"
+        )
+        # Jours et activités validés en un seul appel (pydantic-core) plutôt qu'objet par objet
+        days = [
+            {
+                "date": request.start_date + timedelta(days=offset),
+                "activities": [
+                    {
+                        "name": act.get("name", "Activité non spécifiée"),
+                        "description": act.get("description", act.get("name", "Activité non spécifiée")),
+                        "duration_hours": act.get("duration_hours", 1.0),
+                        "cost": act.get("cost", 0.0),
+                        "location": act.get("location", destination.city),
+                        "category": act.get("category", "général")
+                    }
+                    for act in day.get("activities", [])
+                ],
+                "meals": day.get("meals", []),
+                "notes": day.get("notes")
+            }
+            for offset, day in enumerate(response["days"])
+        ]
+        # Jours déjà validés : le plan est assemblé sans nouvelle validation
+        return DestinationPlan.model_construct(
+            city=destination.city,
+            country=destination.country,
+            days=DAY_PLAN_LIST.validate_python(days),
+            accommodations=[],
+            transportation=[]
+        )
+
+    def skeleton_plan(self, request: TravelRequest, destination: Destination) -> DestinationPlan:
         """
-        Crée un itinéraire détaillé pour chaque destination en utilisant Ollama
+        Squelette d'itinéraire (jours sans activités) construit sans appel LLM ni validation
         """
-        destination_plans = []
-        for destination in request.destinations:
-            prompt = f"""
-            Génère un programme de voyage structuré en JSON pour {destination.city}, {destination.country} sur {destination.duration_days} jours.
-            Dates: {request.start_date} à {request.end_date}
-            Mood: {request.mood}
-            Budget: {request.budget}
-            Groupe: {request.group_size}
-            
-            Pour chaque activité, fournis obligatoirement :
-            - name (str) : nom de l'activité
-            - description (str) : description courte
-            - duration_hours (float) : durée en heures
-            - cost (float) : coût en euros
-            - location (str) : lieu précis
-            - category (str) : type d'activité
-            
-            Format attendu : {{ "days": [ {{ "date": ..., "activities": [ {{ "name": ..., "description": ..., "duration_hours": ..., "cost": ..., "location": ..., "category": ... }} ] }} ] }}
-            """
-            response = await self.llm_service.generate_structured_response(prompt)
-            day_plans = []
-            current_date = request.start_date
-            for day in response["days"]:
-                activities = []
-                for act in day.get("activities", []):
-                    activity = Activity(
-                        name=act.get("name", "Activité non spécifiée"),
-                        description=act.get("description", act.get("name", "Activité non spécifiée")),
-                        duration_hours=float(act.get("duration_hours", 1.0)),
-                        cost=float(act.get("cost", 0.0)),
-                        location=act.get("location", destination.city),
-                        category=act.get("category", "général")
-                    )
-                    activities.append(activity)
-                
-                day_plan = DayPlan(
-                    date=current_date,
-                    activities=activities,
-                    meals=day.get("meals", []),
-                    notes=day.get("notes")
-                )
-                day_plans.append(day_plan)
-                current_date += timedelta(days=1)
-            
-            destination_plan = DestinationPlan(
-                city=destination.city,
-                country=destination.country,
-                days=day_plans,
-                accommodations=[],
-                transportation=[]
-            )
-            destination_plans.append(destination_plan)
-        return destination_plans 
\ No newline at end of file
+        return DestinationPlan.model_construct(
+            city=destination.city,
+            country=destination.country,
+            days=[
+                DayPlan.model_construct(date=request.start_date + timedelta(days=offset), activities=[], meals=[])
+                for offset in range(destination.duration_days)
+            ],
+            accommodations=[],
+            transportation=[]
+        )
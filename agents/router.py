@@ -1,73 +1,311 @@
-from typing import List
+from typing import List, Optional, AsyncIterator, Dict, Any, Tuple, Callable
 from schemas.request import TravelRequest
-from schemas.response import TravelProgram, DestinationPlan
+from schemas.response import TravelProgram, DestinationPlan, Transportation
 from agents.planner import PlannerAgent
 from agents.curator import CuratorAgent
 from agents.booker import BookerAgent
-from utils.llm import LLMService
+from utils.llm import LLMService, DeadlineExceeded
+from utils.taskgraph import TaskGraph, StepFunc
+from utils.jobs import ProgressCallback
 from datetime import datetime
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# pipeline : planner, enrichissement et hébergement séparés ; fused : un prompt par destination
+GENERATION_MODES = ("pipeline", "fused")
 
 class RouterAgent:
-    def __init__(self, llm_service: LLMService):
+    def __init__(self, llm_service: LLMService, max_concurrency: Optional[int] = None):
         self.llm_service = llm_service
         self.planner = PlannerAgent(llm_service)
         self.curator = CuratorAgent(llm_service)
         self.booker = BookerAgent(llm_service)
+        # Nombre maximal d'étapes (appels LLM) lancées simultanément pour une requête
+        self.max_concurrency = max_concurrency or int(os.getenv("AGENT_MAX_CONCURRENCY", "4"))
+        # Mode de génération par défaut (remplaçable à chaque requête)
+        self.generation_mode = os.getenv("AGENT_GENERATION_MODE", "pipeline")
+        # Échéance par défaut d'une génération (0 : aucune) ; à l'échéance, programme partiel
+        self.deadline_seconds = float(os.getenv("GENERATION_DEADLINE_SECONDS", "120"))
+
+    def _resolve_mode(self, mode: Optional[str]) -> str:
+        mode = mode or self.generation_mode
+        if mode not in GENERATION_MODES:
+            raise ValueError(f"Mode de génération inconnu : {mode}")
+        return mode
+
+    async def generate_travel_program(
+        self,
+        request: TravelRequest,
+        mode: Optional[str] = None,
+        on_progress: Optional[ProgressCallback] = None,
+        deadline: Optional[float] = None
+    ) -> TravelProgram:
+        """
+        Orchestration complète avec appels LLM (Ollama) à chaque étape.
+        Les étapes indépendantes (destinations, activités, hébergement, transport) s'exécutent en parallèle.
+        mode "fused" remplace itinéraire, enrichissement et hébergement par un prompt par destination.
+        on_progress(étape, ville, étapes terminées, étapes au total) est appelé à la fin de chaque étape.
+        deadline (secondes, défaut GENERATION_DEADLINE_SECONDS, 0 : aucune) borne la génération :
+        chaque appel LLM ne dispose que du temps restant, les étapes non terminées à l'échéance
+        sont remplacées par leur repli et listées dans metadata.
+        """
+        mode = self._resolve_mode(mode)
+        deadline = self.deadline_seconds if deadline is None else deadline
+        degraded: List[Dict[str, Any]] = []
+        graph = self._build_program_graph(request, mode, degraded)
+        with self.llm_service.deadline(deadline):
+            run = await graph.run(self._progress_reporter(graph, request, on_progress) if on_progress else None)
+        logger.info("Programme généré (mode %s) : %s", mode, run.report())
+
+        destination_plans = [run.results[f"destination:{i}"] for i in range(len(request.destinations))]
+        total_cost = sum(self.plan_cost(plan) for plan in destination_plans)
+        # Plans déjà validés étape par étape : le programme est assemblé sans nouvelle validation
+        return TravelProgram.model_construct(
+            destinations=destination_plans,
+            total_cost=total_cost,
+            currency="EUR",
+            generated_at=datetime.now().isoformat(),
+            version="1.0",
+            metadata=self.program_metadata(mode, deadline, degraded)
+        )
+
+    @staticmethod
+    def program_metadata(mode: str, deadline: Optional[float], degraded: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "mode": mode,
+            "deadline_seconds": deadline or None,
+            "partial": bool(degraded),
+            "degraded_stages": degraded
+        }
+
+    async def iter_destination_plans(
+        self,
+        request: TravelRequest,
+        mode: Optional[str] = None,
+        deadline: Optional[float] = None,
+        degraded: Optional[List[Dict[str, Any]]] = None
+    ) -> AsyncIterator[Tuple[int, DestinationPlan]]:
+        """
+        Renvoie chaque destination (index, plan complet) dès que toutes ses étapes sont terminées,
+        sans attendre le reste du programme. Mêmes échéance et replis que generate_travel_program,
+        les étapes dégradées étant ajoutées à degraded.
+        """
+        mode = self._resolve_mode(mode)
+        deadline = self.deadline_seconds if deadline is None else deadline
+        degraded = [] if degraded is None else degraded
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def on_complete(name: str, value):
+            if name.startswith("destination:"):
+                queue.put_nowait(("destination", (int(name.split(":")[1]), value)))
+
+        async def produce():
+            try:
+                with self.llm_service.deadline(deadline):
+                    run = await self._build_program_graph(request, mode, degraded).run(on_complete)
+                queue.put_nowait(("done", run))
+            except Exception as e:
+                queue.put_nowait(("error", e))
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == "destination":
+                    yield value
+                elif kind == "error":
+                    raise value
+                else:
+                    logger.info("Programme généré (mode %s) : %s", mode, value.report())
+                    return
+        finally:
+            # Client déconnecté ou erreur : les étapes restantes sont annulées
+            if not producer.done():
+                producer.cancel()
+                await asyncio.gather(producer, return_exceptions=True)
+
+    @staticmethod
+    def _progress_reporter(graph: TaskGraph, request: TravelRequest, on_progress: ProgressCallback):
+        total = len(graph.steps)
+        completed = 0
+
+        def on_complete(name: str, value):
+            nonlocal completed
+            completed += 1
+            # Étapes nommées "type:index de destination"
+            stage, _, index = name.partition(":")
+            city = request.destinations[int(index)].city if index else None
+            on_progress(stage, city, completed, total)
+
+        return on_complete
+
+    @staticmethod
+    def plan_cost(plan: DestinationPlan) -> float:
+        return (
+            sum(acc.price_per_night for acc in plan.accommodations) +
+            sum(trans.cost for trans in plan.transportation) +
+            sum(activity.cost for day in plan.days for activity in day.activities)
+        )
 
-    async def generate_travel_program(self, request: TravelRequest) -> TravelProgram:
+    def _build_program_graph(
+        self,
+        request: TravelRequest,
+        mode: str = "pipeline",
+        degraded: Optional[List[Dict[str, Any]]] = None
+    ) -> TaskGraph:
         """
-        Orchestration complète avec appels LLM (Ollama) à chaque étape
+        Graphe de dépendances du pipeline : l'itinéraire d'une destination débloque ses activités
+        et son hébergement, les itinéraires de deux destinations consécutives débloquent le transport.
+        Avec degraded, une étape interrompue par l'échéance prend son repli au lieu d'échouer.
         """
-        destination_plans = await self.planner.create_itinerary(request)
-        for i, plan in enumerate(destination_plans):
+        graph = TaskGraph(self.max_concurrency)
+        count = len(request.destinations)
+        interests = getattr(request, 'interests', [getattr(request, 'mood', '')])
+        style = getattr(request, 'mood', getattr(request, 'travel_style', ''))
+        if mode == "fused":
+            graph = self._build_fused_graph(graph, request, interests, style)
+            return graph if degraded is None else self._with_fallbacks(graph, request, degraded)
+        for i, destination in enumerate(request.destinations):
+            graph.add(f"plan:{i}", lambda results, destination=destination: self.planner.create_destination_plan(request, destination))
+        for i in range(count):
+            plan = f"plan:{i}"
             # Enrichissement des activités
-            enhanced_activities = await self.curator.enhance_activities(
-                plan,
-                getattr(request, 'interests', [getattr(request, 'mood', '')]),
-                request.budget
+            graph.add(
+                f"activities:{i}",
+                lambda results, plan=plan: self.curator.enhance_activities(results[plan], interests, request.budget),
+                [plan]
             )
-            for day in plan.days:
-                day.activities = enhanced_activities
             # Hébergement
-            accommodations = await self.curator.find_accommodations(
-                plan,
-                request.budget,
-                getattr(request, 'mood', getattr(request, 'travel_style', ''))
+            graph.add(
+                f"accommodations:{i}",
+                lambda results, plan=plan: self.curator.find_accommodations(results[plan], request.budget, style),
+                [plan]
             )
-            plan.accommodations = accommodations
-            # Transport
-            if i < len(destination_plans) - 1:
-                transportation_options = await self.booker.find_transportation(
-                    plan,
-                    destination_plans[i + 1],
-                    request.budget,
-                    None
+            # Transport vers la destination suivante
+            if i < count - 1:
+                next_plan = f"plan:{i + 1}"
+                graph.add(
+                    f"transportation:{i}",
+                    lambda results, plan=plan, next_plan=next_plan: self._best_transportation(results[plan], results[next_plan], request.budget),
+                    [plan, next_plan]
                 )
-                best_transport = await self.booker.optimize_transportation(
-                    transportation_options,
-                    "cost"
+            # Destination complète : assemblage des résultats de ses étapes
+            steps = [plan, f"activities:{i}", f"accommodations:{i}"] + ([f"transportation:{i}"] if i < count - 1 else [])
+            graph.add(f"destination:{i}", lambda results, i=i: self._assemble_destination(results, i), steps)
+        return graph if degraded is None else self._with_fallbacks(graph, request, degraded)
+
+    def _with_fallbacks(self, graph: TaskGraph, request: TravelRequest, degraded: List[Dict[str, Any]]) -> TaskGraph:
+        """
+        Replis des étapes LLM à l'échéance : itinéraire sans appel (jours en "Découverte libre"),
+        activité "Découverte libre", pas d'hébergement ni de transport. Chaque repli est consigné
+        dans degraded (étape, destination, issue).
+        """
+        fallbacks = {
+            "plan": ("degraded", "Découverte libre", lambda i: self._fallback_plan(request, i)),
+            "activities": ("degraded", "Découverte libre", lambda i: self.curator.normalize_activities([], request.destinations[i].city)),
+            "accommodations": ("skipped", None, lambda i: []),
+            "transportation": ("skipped", None, lambda i: None),
+        }
+        for name, step in list(graph.steps.items()):
+            stage, _, index = name.partition(":")
+            if stage in fallbacks:
+                graph.steps[name] = self._guarded(step, stage, int(index), request, degraded, *fallbacks[stage])
+        return graph
+
+    @staticmethod
+    def _guarded(
+        step: StepFunc,
+        stage: str,
+        index: int,
+        request: TravelRequest,
+        degraded: List[Dict[str, Any]],
+        outcome: str,
+        fallback_name: Optional[str],
+        fallback: Callable[[int], Any]
+    ) -> StepFunc:
+        async def run(results):
+            try:
+                return await step(results)
+            except DeadlineExceeded as e:
+                logger.warning("Étape %s:%d remplacée par son repli : %s", stage, index, e)
+                degraded.append({
+                    "stage": stage,
+                    "destination": request.destinations[index].city,
+                    "outcome": outcome,
+                    "fallback": fallback_name
+                })
+                return fallback(index)
+        return run
+
+    def _fallback_plan(self, request: TravelRequest, index: int) -> DestinationPlan:
+        destination = request.destinations[index]
+        plan = self.planner.skeleton_plan(request, destination)
+        for day in plan.days:
+            day.activities = self.curator.normalize_activities([], destination.city)
+        return plan
+
+    def _build_fused_graph(self, graph: TaskGraph, request: TravelRequest, interests: List[str], style: str) -> TaskGraph:
+        """
+        Mode fusionné : un prompt par destination (jours, activités, hébergement) puis le transport
+        entre destinations consécutives, soit 2N-1 appels LLM au lieu de 4N-1
+        """
+        count = len(request.destinations)
+        for i, destination in enumerate(request.destinations):
+            graph.add(
+                f"plan:{i}",
+                lambda results, destination=destination: self.curator.plan_and_curate(request, destination, interests, style)
+            )
+        for i in range(count):
+            plan = f"plan:{i}"
+            steps = [plan]
+            if i < count - 1:
+                next_plan = f"plan:{i + 1}"
+                graph.add(
+                    f"transportation:{i}",
+                    lambda results, plan=plan, next_plan=next_plan: self._best_transportation(results[plan], results[next_plan], request.budget),
+                    [plan, next_plan]
                 )
-                if best_transport:
-                    plan.transportation.append(best_transport)
-        total_cost = sum(
-            sum(acc.price_per_night for acc in plan.accommodations) +
-            sum(trans.cost for trans in plan.transportation) +
-            sum(activity.cost for day in plan.days for activity in day.activities)
-            for plan in destination_plans
+                steps.append(f"transportation:{i}")
+            graph.add(f"destination:{i}", lambda results, i=i: self._assemble_fused_destination(results, i), steps)
+        return graph
+
+    async def _assemble_fused_destination(self, results: Dict[str, Any], index: int) -> DestinationPlan:
+        plan = results[f"plan:{index}"]
+        best_transport = results.get(f"transportation:{index}")
+        if best_transport:
+            plan.transportation.append(best_transport)
+        return plan
+
+    async def _assemble_destination(self, results: Dict[str, Any], index: int) -> DestinationPlan:
+        plan = results[f"plan:{index}"]
+        for day in plan.days:
+            day.activities = results[f"activities:{index}"]
+        plan.accommodations = results[f"accommodations:{index}"]
+        best_transport = results.get(f"transportation:{index}")
+        if best_transport:
+            plan.transportation.append(best_transport)
+        return plan
+
+    async def _best_transportation(self, from_plan: DestinationPlan, to_plan: DestinationPlan, budget: float) -> Optional[Transportation]:
+        transportation_options = await self.booker.find_transportation(
+            from_plan,
+            to_plan,
+            budget,
+            None
         )
-        return TravelProgram(
-            destinations=destination_plans,
-            total_cost=total_cost,
-            currency="EUR",
-            generated_at=datetime.now().isoformat(),
-            version="1.0"
+        return await self.booker.optimize_transportation(
+            transportation_options,
+            "cost"
         )
 
     async def generate_structured_text_program(self, request: TravelRequest) -> str:
         """
         Orchestration pour générer un programme texte structuré (Markdown ou texte clair) pour la première destination
         """
-        destination_plans = await self.planner.create_itinerary(request)
+        destination_plans = await self.planner.create_itinerary(request, self.max_concurrency)
         if not destination_plans:
             return "Aucune destination trouvée."
         plan = destination_plans[0]
@@ -76,4 +314,18 @@ class RouterAgent:
         budget = request.budget
         # Appel à l'agent curator pour générer le texte structuré
         program_text = await self.curator.generate_structured_day_plan(plan, interests, budget)
-        return program_text 
\ No newline at end of file
+        return program_text
+
+    async def stream_structured_text_program(self, request: TravelRequest) -> AsyncIterator[str]:
+        """
+        Variante streamée de generate_structured_text_program. Le texte n'utilise que la ville et le
+        nombre de jours : le squelette local remplace l'appel au planner pour que les premiers
+        fragments arrivent dès la fin de l'évaluation du prompt.
+        """
+        if not request.destinations:
+            yield "Aucune destination trouvée."
+            return
+        plan = self.planner.skeleton_plan(request, request.destinations[0])
+        interests = request.interests or [request.mood]
+        async for token in self.curator.stream_structured_day_plan(plan, interests, request.budget):
+            yield token
@@ -0,0 +1,126 @@
+"""
+Pool de backends Ollama (utils/backends.py) contre plusieurs faux Ollama locaux, chacun limité à
+--parallel générations simultanées (comme OLLAMA_NUM_PARALLEL sur CPU) :
+
+1. débit selon le nombre de backends ;
+2. backends de vitesses différentes : répartition au moins d'appels en cours ;
+3. backend injoignable (connexion refusée : appel rejoué ailleurs) et panne d'un backend en cours
+   de route : backends retirés, puis réintégrés par le contrôle de santé ;
+4. backend sans le modèle demandé : aucun appel ne lui est envoyé.
+
+Usage : python -m benchmarks.backend_pool [--calls 48] [--concurrency 16] [--parallel 2]
+"""
+from typing import List, Tuple
+from benchmarks.fake_ollama import FakeOllama, LatencyProfile, run_fake_ollama
+from utils.backends import BackendPool, OllamaBackend
+from utils.llm import LLMService
+from contextlib import ExitStack
+import argparse
+import asyncio
+import httpx
+import time
+
+# ~0,25 s par appel (prompt court, ~200 tokens de sortie)
+PROFILE = LatencyProfile(load_ms=5.0, prompt_rate=2000.0, token_rate=1000.0, jitter=0.1)
+SLOW_PROFILE = LatencyProfile(load_ms=5.0, prompt_rate=500.0, token_rate=250.0, jitter=0.1)
+
+async def _run_calls(llm: LLMService, calls: int, concurrency: int, tag: str) -> Tuple[float, int]:
+    """
+    Lance calls appels structurés distincts (concurrency à la fois) ; renvoie (durée, erreurs)
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    errors = 0
+
+    async def one(index: int):
+        nonlocal errors
+        async with semaphore:
+            try:
+                await llm.generate_structured_response(f"{tag} appel {index}", use_cache=False, caller="bench.pool")
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(calls)))
+    return time.perf_counter() - start, errors
+
+def _pool(urls: List[str], client: httpx.AsyncClient, limit: int, health_interval: float = 0.2) -> BackendPool:
+    return BackendPool(
+        [OllamaBackend(url, limit) for url in urls],
+        client=client,
+        health_interval=health_interval,
+        failure_threshold=2,
+        health_timeout=0.5
+    )
+
+def _calls_by_backend(pool: BackendPool) -> str:
+    return ", ".join(f"{backend.url.rsplit(':', 1)[1]}={backend.calls}" for backend in pool.backends)
+
+async def scaling(args, client: httpx.AsyncClient):
+    print("1. Débit selon le nombre de backends")
+    for count in (1, 2, 3):
+        with ExitStack() as stack:
+            servers = [stack.enter_context(run_fake_ollama(FakeOllama(PROFILE, seed=i, parallel=args.parallel))) for i in range(count)]
+            pool = _pool([server.base_url for server in servers], client, args.parallel)
+            llm = LLMService(client=client, pool=pool)
+            await pool.check_all()
+            elapsed, errors = await _run_calls(llm, args.calls, args.concurrency, f"scaling{count}")
+            print(f"   {count} backend(s) : {args.calls / elapsed:6.1f} appels/s  ({elapsed:.2f} s, erreurs {errors})  [{_calls_by_backend(pool)}]")
+
+async def heterogeneous(args, client: httpx.AsyncClient):
+    print("2. Un backend rapide, un backend 4x plus lent : répartition au moins d'appels en cours")
+    with run_fake_ollama(FakeOllama(PROFILE, parallel=args.parallel)) as fast, \
+            run_fake_ollama(FakeOllama(SLOW_PROFILE, parallel=args.parallel)) as slow:
+        pool = _pool([fast.base_url, slow.base_url], client, args.parallel)
+        llm = LLMService(client=client, pool=pool)
+        await pool.check_all()
+        elapsed, errors = await _run_calls(llm, args.calls, args.concurrency, "hetero")
+        print(f"   {args.calls / elapsed:6.1f} appels/s, erreurs {errors} ; rapide={pool.backends[0].calls} lent={pool.backends[1].calls}")
+
+async def failover(args, client: httpx.AsyncClient):
+    print("3. Backend injoignable dès le départ, puis panne (503) d'un backend en cours de route")
+    with ExitStack() as stack:
+        fakes = [FakeOllama(PROFILE, seed=i, parallel=args.parallel) for i in range(3)]
+        servers = [stack.enter_context(run_fake_ollama(fake)) for fake in fakes]
+        # Port sans serveur : connexion refusée, l'appel est rejoué sur un autre backend
+        dead = "http://127.0.0.1:9"
+        pool = _pool([dead] + [server.base_url for server in servers], client, args.parallel, health_interval=0.2)
+        llm = LLMService(client=client, pool=pool)
+        pool.start()
+        try:
+            run = asyncio.create_task(_run_calls(llm, args.calls * 2, args.concurrency, "failover"))
+            await asyncio.sleep(0.5)
+            fakes[0].available = False
+            elapsed, errors = await run
+            down = pool.backends[1]
+            print(f"   {args.calls * 2} appels en {elapsed:.2f} s, erreurs {errors} (appels en cours sur le backend en panne)")
+            print(f"   injoignable : sain={pool.backends[0].healthy} ; en panne : sain={down.healthy} ({down.last_error.split(' for ')[0]})")
+            print(f"   appels par backend : [{_calls_by_backend(pool)}]")
+            fakes[0].available = True
+            await asyncio.sleep(0.5)
+            print(f"   après rétablissement : sain={down.healthy}")
+        finally:
+            await pool.close()
+
+async def model_aware(args, client: httpx.AsyncClient):
+    print("4. Backend sans le modèle mistral")
+    with run_fake_ollama(FakeOllama(PROFILE, parallel=args.parallel)) as with_model, \
+            run_fake_ollama(FakeOllama(PROFILE, parallel=args.parallel, models=("llama3:latest",))) as without:
+        pool = _pool([with_model.base_url, without.base_url], client, args.parallel)
+        llm = LLMService(client=client, pool=pool)
+        await pool.check_all()
+        elapsed, errors = await _run_calls(llm, args.calls, args.concurrency, "model")
+        print(f"   erreurs {errors} ; avec mistral={pool.backends[0].calls} sans mistral={pool.backends[1].calls}")
+
+async def main(args):
+    async with httpx.AsyncClient(timeout=30) as client:
+        await scaling(args, client)
+        await heterogeneous(args, client)
+        await failover(args, client)
+        await model_aware(args, client)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=48)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--parallel", type=int, default=2, help="générations simultanées par faux Ollama")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,223 @@
+"""
+Catalogue local d'activités (utils/catalog.py) contre un faux Supabase de --rows activités
+synthétiques (--cities villes, 6 moods, 10 catégories, coûts de 0 à 300 €) :
+
+1. chargement initial (pages sur le curseur (updated_at, id), la plupart des lignes partageant
+   le même updated_at comme après un import en masse) ;
+2. requêtes (destination, mood, budget) : appel distant sans cache contre copie locale,
+   mêmes résultats vérifiés sur un échantillon ;
+3. synchronisation incrémentale après --changes modifications (coût, ville, mood), suppressions
+   logiques et insertions : seules les lignes modifiées sont relues ;
+4. Supabase injoignable : la copie reste servie jusqu'à --max-staleness (CATALOG_MAX_STALENESS),
+   puis les requêtes repartent vers l'appel distant.
+
+Usage : python -m benchmarks.catalog [--rows 100000] [--queries 2000] [--changes 1000]
+"""
+from typing import Any, Dict, List, Tuple
+from benchmarks.standin import run_standin_server
+from benchmarks.e2e import percentile
+from utils.services import ExternalServices
+import argparse
+import asyncio
+import bisect
+import random
+import httpx
+import time
+import os
+
+MOODS = ("culture", "nature", "gastronomie", "aventure", "détente", "fête")
+CATEGORIES = ("musée", "monument", "randonnée", "plage", "restaurant", "marché", "concert", "atelier", "visite guidée", "spa")
+IMPORT_AT = "2024-01-01T00:00:00+00:00"
+
+class SupabaseTable:
+    """
+    Table activities du faux Supabase : requête filtrée (index par ville, comme une base indexée)
+    et pages de synchronisation triées par (updated_at, id)
+    """
+    def __init__(self, rows: List[Dict[str, Any]]):
+        self.rows = {row["id"]: row for row in rows}
+        self.clock = 0
+        self._reindex()
+
+    def _reindex(self):
+        self.by_city: Dict[str, List[Dict[str, Any]]] = {}
+        for row in self.rows.values():
+            if not row.get("deleted_at"):
+                self.by_city.setdefault(row["city"].casefold(), []).append(row)
+        self.order = sorted(self.rows.values(), key=lambda row: (row["updated_at"], row["id"]))
+        self.keys = [(row["updated_at"], row["id"]) for row in self.order]
+
+    def touch(self) -> str:
+        self.clock += 1
+        return f"2024-06-01T00:00:{self.clock // 1000:02d}.{self.clock % 1000:03d}+00:00"
+
+    def route(self, path, params, body):
+        if "order" in params:
+            limit = int(params["limit"])
+            start = 0
+            if "updated_after" in params:
+                start = bisect.bisect_right(self.keys, (params["updated_after"], int(params["after_id"])))
+            return 200, self.order[start:start + limit]
+        budget = float(params["max_budget"])
+        mood = params["mood"].casefold()
+        return 200, [
+            row for row in self.by_city.get(params["destination"].casefold(), [])
+            if mood in row["mood"] and (row["cost"] is None or row["cost"] <= budget)
+        ]
+
+def synthetic_rows(count: int, cities: List[str], rng: random.Random) -> List[Dict[str, Any]]:
+    rows = []
+    for index in range(1, count + 1):
+        city = rng.choice(cities)
+        rows.append({
+            "id": index,
+            "name": f"{rng.choice(CATEGORIES).capitalize()} n°{index} à {city}",
+            "city": city,
+            "mood": rng.sample(MOODS, rng.choice((1, 1, 2))),
+            "category": rng.choice(CATEGORIES),
+            "cost": None if rng.random() < 0.05 else round(rng.uniform(0, 300), 2),
+            "duration_hours": rng.choice((1, 2, 3, 4)),
+            # Import en masse : même horodatage pour la plupart des lignes
+            "updated_at": IMPORT_AT if rng.random() < 0.8 else f"2024-03-{rng.randint(1, 28):02d}T12:00:00+00:00"
+        })
+    return rows
+
+def _ids(activities: List[Dict[str, Any]]) -> List[int]:
+    return sorted(activity["id"] for activity in activities)
+
+def _us(values: List[float], q: float) -> float:
+    return round(percentile(sorted(values), q) * 1e6, 1)
+
+async def _timed(call) -> Tuple[float, Any]:
+    start = time.perf_counter()
+    result = await call
+    return time.perf_counter() - start, result
+
+def _queries(cities: List[str], count: int, rng: random.Random) -> List[Tuple[str, str, float]]:
+    return [(rng.choice(cities), rng.choice(MOODS), rng.choice((30.0, 80.0, 150.0, 400.0))) for _ in range(count)]
+
+async def check_same(remote: ExternalServices, local: ExternalServices, queries) -> int:
+    mismatches = 0
+    for city, mood, budget in queries:
+        expected = await remote.get_supabase_activities(city, mood, budget)
+        if _ids(expected) != _ids(local.catalog.query(city, mood, budget)):
+            mismatches += 1
+    return mismatches
+
+async def main(args):
+    rng = random.Random(args.seed)
+    cities = [f"Ville{index:03d}" for index in range(args.cities)]
+    table = SupabaseTable(synthetic_rows(args.rows, cities, rng))
+    with run_standin_server({("GET", "/activities"): table.route}) as server:
+        os.environ.update(
+            SUPABASE_URL=server.base_url, SUPABASE_KEY="bench",
+            # Appel distant mesuré sans le cache TTL des services externes
+            EXTERNAL_CACHE_SIZE="0",
+            CATALOG_PAGE_SIZE=str(args.page_size),
+            CATALOG_SYNC_INTERVAL="3600"
+        )
+        async with httpx.AsyncClient(timeout=60) as client:
+            remote = ExternalServices(client=client)
+            local = ExternalServices(client=client)
+            os.environ["ACTIVITY_CATALOG"] = "1"
+            local.start()
+            catalog = local.catalog
+            # La tâche de fond lance le chargement initial ; on attend sa fin
+            await asyncio.sleep(0)
+            requests_before = server.requests
+            start = time.perf_counter()
+            while catalog.counts["syncs"] == 0:
+                await asyncio.sleep(0.01)
+            elapsed = time.perf_counter() - start
+            status = catalog.status()
+            print(f"1. Chargement initial : {status['activities']} activités, {status['cities']} villes, "
+                  f"{server.requests - requests_before} pages de {args.page_size} en {elapsed:.2f} s "
+                  f"({status['activities'] / elapsed:,.0f} lignes/s)")
+
+            queries = _queries(cities, args.queries, rng)
+            remote_latencies = []
+            results = 0
+            for city, mood, budget in queries[:args.remote_queries]:
+                elapsed, _ = await _timed(remote.get_supabase_activities(city, mood, budget))
+                remote_latencies.append(elapsed)
+            local_latencies = []
+            for city, mood, budget in queries:
+                start = time.perf_counter()
+                results += len(catalog.query(city, mood, budget))
+                local_latencies.append(time.perf_counter() - start)
+            served_latencies = []
+            for city, mood, budget in queries:
+                elapsed, _ = await _timed(local.get_supabase_activities(city, mood, budget))
+                served_latencies.append(elapsed)
+            mismatches = await check_same(remote, local, queries[:args.check])
+            print(f"2. Requêtes (destination, mood, budget), {results / len(queries):.0f} activités par réponse en moyenne")
+            print(f"   distant (sans cache) : p50 {_us(remote_latencies, 50):9.1f} µs  p95 {_us(remote_latencies, 95):9.1f} µs  ({len(remote_latencies)} requêtes)")
+            print(f"   copie locale         : p50 {_us(local_latencies, 50):9.1f} µs  p95 {_us(local_latencies, 95):9.1f} µs  p99 {_us(local_latencies, 99):9.1f} µs")
+            print(f"   via ExternalServices : p50 {_us(served_latencies, 50):9.1f} µs  p95 {_us(served_latencies, 95):9.1f} µs")
+            for city, mood, budget in queries[:3]:
+                count = len(catalog.query(city, mood, budget))
+                print(f"   exemple : {city}/{mood} ≤ {budget:.0f} € -> {count} activités")
+            print(f"   résultats identiques à l'appel distant : {args.check - mismatches}/{args.check}")
+
+            ids = list(table.rows)
+            for row_id in rng.sample(ids, args.changes):
+                row = table.rows[row_id]
+                change = rng.choice(("cost", "city", "mood"))
+                if change == "cost":
+                    row["cost"] = round(rng.uniform(0, 300), 2)
+                elif change == "city":
+                    row["city"] = rng.choice(cities)
+                else:
+                    row["mood"] = rng.sample(MOODS, 1)
+                row["updated_at"] = table.touch()
+            deleted = rng.sample(ids, args.changes // 10)
+            for row_id in deleted:
+                table.rows[row_id]["deleted_at"] = table.rows[row_id]["updated_at"] = table.touch()
+            for row in synthetic_rows(args.changes // 2, cities, rng):
+                row["id"] += args.rows
+                row["updated_at"] = table.touch()
+                table.rows[row["id"]] = row
+            table._reindex()
+            requests_before = server.requests
+            elapsed, fetched = await _timed(catalog.sync())
+            pages = server.requests - requests_before
+            live = sum(1 for row in table.rows.values() if not row.get("deleted_at"))
+            mismatches = await check_same(remote, local, queries[:args.check])
+            print(f"3. Synchronisation incrémentale : {args.changes} modifiées, {len(deleted)} supprimées, {args.changes // 2} ajoutées")
+            print(f"   {fetched} lignes relues en {pages} page(s), {elapsed * 1000:.1f} ms (index des coûts reconstruit compris) ; "
+                  f"{len(catalog)} activités (Supabase : {live}) ; résultats identiques : {args.check - mismatches}/{args.check}")
+
+            original = catalog.fetch_page
+
+            async def unreachable(cursor, limit):
+                raise httpx.ConnectError("Supabase injoignable")
+
+            catalog.fetch_page = unreachable
+            catalog.max_staleness = args.max_staleness
+            try:
+                await catalog.sync()
+            except httpx.ConnectError:
+                pass
+            print(f"4. Supabase injoignable : synchronisation en échec, copie encore servie : {catalog.ready}")
+            await asyncio.sleep(args.max_staleness)
+            requests_before = server.requests
+            await local.get_supabase_activities(*queries[1])
+            print(f"   après {args.max_staleness:.1f} s sans synchronisation : copie servie {catalog.ready}, "
+                  f"{server.requests - requests_before} appel(s) distant(s) pour une requête")
+            catalog.fetch_page = original
+            await catalog.sync()
+            print(f"   synchronisation rétablie : copie servie {catalog.ready}")
+            await local.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--cities", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=2000, help="requêtes sur la copie locale")
+    parser.add_argument("--remote-queries", type=int, default=200, help="requêtes distantes mesurées")
+    parser.add_argument("--check", type=int, default=100, help="requêtes comparées à l'appel distant")
+    parser.add_argument("--changes", type=int, default=1000)
+    parser.add_argument("--page-size", type=int, default=5000)
+    parser.add_argument("--max-staleness", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(main(parser.parse_args()))
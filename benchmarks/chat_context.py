@@ -0,0 +1,41 @@
+"""
+Montre que les tokens de prompt par tour restent plats quand une session de chat s'allonge
+(contexte borné par utils/context.py), comparé à l'envoi de tout l'historique.
+
+Usage : python -m benchmarks.chat_context [nombre_de_tours]
+"""
+from agents.manager import AgentManager
+from utils.context import estimate_tokens
+import asyncio
+import sys
+
+class _ScriptedLLM:
+    """
+    LLM de substitution : réponses de longueur réaliste, compte les appels de résumé
+    """
+    def __init__(self):
+        self.calls = 0
+        self.summary_calls = 0
+
+    async def generate_response(self, prompt: str, system_message: str = None, **kwargs) -> str:
+        self.calls += 1
+        if "Mets à jour le résumé" in (system_message or ""):
+            self.summary_calls += 1
+            return "Voyage en Italie, 10 jours, budget 2000 €, préfère musées et gastronomie. " * 3
+        return "Voici quelques suggestions détaillées pour votre voyage. " * 12
+
+async def main(turns: int):
+    llm = _ScriptedLLM()
+    manager = AgentManager(llm)
+    naive_tokens = 0
+    print(f"{'tour':>5} {'contexte borné':>15} {'historique complet':>19}")
+    for turn in range(1, turns + 1):
+        message = f"Quelles activités me conseilles-tu pour le jour {turn} à Rome ?"
+        await manager.process_message("bench", message)
+        naive_tokens = sum(estimate_tokens(m["content"]) for m in (await manager.get_conversation_history("bench"))[:-1])
+        if turn == 1 or turn % max(1, turns // 10) == 0:
+            print(f"{turn:5d} {manager.context_stats['last_prompt_tokens']:15d} {naive_tokens:19d}")
+    print(f"Appels de résumé : {llm.summary_calls} pour {turns} tours (budget {manager.context_builder.token_budget} tokens)")
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 60))
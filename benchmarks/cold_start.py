@@ -0,0 +1,148 @@
+"""
+Démarrage à froid, comme après un déploiement ou une montée en charge : l'API est lancée dans un
+nouveau processus (uvicorn) face à un faux Ollama dont le modèle n'est pas chargé (--cold-load-ms
+de chargement au premier appel), sans puis avec la mise en route au démarrage (STARTUP_WARMUP).
+
+Pour chaque mode : délai jusqu'à l'écoute du port, jusqu'à /ready (200), latence de la première
+requête, délai entre le lancement du processus et la première réponse réussie, puis latence
+d'une deuxième requête (régime établi). Sans mise en route, le trafic arrive dès l'écoute du port ;
+avec, un répartiteur qui sonde /ready attend qu'il réponde 200.
+
+Usage : python -m benchmarks.cold_start [--runs 3] [--cold-load-ms 4000] [--scenario chat]
+"""
+from typing import Any, Dict, List, Optional
+from benchmarks.fake_ollama import FakeOllama, PROFILES, run_fake_ollama
+from datetime import date, timedelta
+import subprocess
+import statistics
+import argparse
+import tempfile
+import socket
+import httpx
+import time
+import sys
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _chat_body() -> Dict[str, Any]:
+    return {"message": "Quels quartiers visiter à Lisbonne en deux jours ?", "session_id": "cold-start"}
+
+def _program_body() -> Dict[str, Any]:
+    start = date(2024, 6, 1)
+    return {
+        "type": "mono",
+        "destinations": [{"city": "Lisbonne", "country": "Portugal", "duration_days": 2}],
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(days=1)).isoformat(),
+        "budget": 800,
+        "mood": "culture",
+        "group_size": 2
+    }
+
+SCENARIOS = {
+    "chat": ("/api/v1/chat", _chat_body),
+    "generate-program-v2": ("/api/v1/generate-program-v2", _program_body),
+}
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _wait_for(client: httpx.Client, path: str, deadline: float) -> Optional[float]:
+    """
+    Instant (perf_counter) du premier 200 sur path, None si le délai est dépassé
+    """
+    while time.perf_counter() < deadline:
+        try:
+            if client.get(path).status_code == 200:
+                return time.perf_counter()
+        except httpx.TransportError:
+            pass
+        time.sleep(0.02)
+    return None
+
+def run_once(warmup: bool, args) -> Dict[str, Any]:
+    fake = FakeOllama(profile=PROFILES[args.profile], seed=args.seed, cold_load_ms=args.cold_load_ms)
+    path, make_body = SCENARIOS[args.scenario]
+    port = _free_port()
+    with run_fake_ollama(fake) as ollama, tempfile.TemporaryDirectory() as tmp:
+        env = {key: value for key, value in os.environ.items() if not key.startswith(("SUPABASE_", "VIATOR_"))}
+        env.update(
+            PYTHONPATH=ROOT,
+            OLLAMA_BACKENDS=ollama.base_url,
+            OLLAMA_BACKEND_CONCURRENCY="0",
+            LLM_CACHE_SIZE="0",
+            LLM_CACHE_PATH="",
+            SESSION_STORE="memory",
+            ACTIVITY_CATALOG="0",
+            JOBS_DB_PATH=os.path.join(tmp, "jobs.db"),
+            STARTUP_WARMUP="1" if warmup else "0"
+        )
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=ROOT, env=env
+        )
+        try:
+            with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=args.timeout) as client:
+                deadline = start + args.timeout
+                listening = _wait_for(client, "/", deadline)
+                ready = _wait_for(client, "/ready", deadline)
+                if listening is None or ready is None:
+                    raise RuntimeError("l'API n'a pas démarré dans le délai imparti")
+                # Sans mise en route, /ready répond dès l'écoute : le trafic arrive aussitôt
+                sent = time.perf_counter()
+                first = client.post(path, json=make_body())
+                done = time.perf_counter()
+                first.raise_for_status()
+                second_start = time.perf_counter()
+                client.post(path, json=make_body()).raise_for_status()
+                second = time.perf_counter() - second_start
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+    counters = fake.snapshot()
+    return {
+        "listening": listening - start,
+        "ready": ready - start,
+        "first_request": done - sent,
+        "first_response": done - start,
+        "second_request": second,
+        "cold_loads": counters["cold_loads"],
+        "preloads": counters["preloads"]
+    }
+
+def _median(results: List[Dict[str, Any]], key: str) -> float:
+    return statistics.median(result[key] for result in results)
+
+def main(args):
+    print(f"Scénario {args.scenario}, chargement du modèle à froid {args.cold_load_ms:.0f} ms, profil {args.profile}, "
+          f"médiane de {args.runs} démarrage(s)")
+    rows = {}
+    for warmup in (False, True):
+        results = [run_once(warmup, args) for _ in range(args.runs)]
+        rows[warmup] = {key: _median(results, key) for key in results[0]}
+    print(f"   {'':<36}{'sans mise en route':>20}{'avec':>12}")
+    labels = (
+        ("listening", "port à l'écoute"),
+        ("ready", "/ready à 200"),
+        ("first_request", "latence de la première requête"),
+        ("first_response", "lancement -> première réponse"),
+        ("second_request", "latence de la deuxième requête"),
+    )
+    for key, label in labels:
+        print(f"   {label:<36}{rows[False][key]:>18.2f} s{rows[True][key]:>10.2f} s")
+    print(f"   chargements à froid / préchargements : {rows[False]['cold_loads']:.0f}/{rows[False]['preloads']:.0f} sans, "
+          f"{rows[True]['cold_loads']:.0f}/{rows[True]['preloads']:.0f} avec")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--cold-load-ms", type=float, default=4000.0, help="chargement du modèle par le faux Ollama")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="chat")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="fast")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=11)
+    main(parser.parse_args())
@@ -0,0 +1,269 @@
+"""
+Benchmark de bout en bout hors ligne : l'application tourne dans le processus (lifespan compris),
+Ollama, Supabase et Viator sont remplacés par des serveurs locaux déterministes.
+
+Pour chaque scénario : latences p50/p95/p99, débit, appels LLM et octets échangés par requête,
+statistiques d'analyse JSON. Les résultats sont écrits en JSON pour comparer deux exécutions.
+
+Usage :
+  python -m benchmarks.e2e --requests 50 --concurrency 8 --profile fast
+  python -m benchmarks.e2e --malformed-rate 0.1 --truncated-rate 0.1 --output avant.json
+  python -m benchmarks.e2e --compare avant.json --tolerance 0.1
+"""
+from typing import Any, Callable, Dict, List, Tuple
+from benchmarks.fake_ollama import FakeOllama, PROFILES, run_fake_ollama
+from benchmarks.standin import run_standin_server
+from datetime import date, datetime, timedelta
+import subprocess
+import argparse
+import asyncio
+import httpx
+import json
+import time
+import sys
+import os
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+CITIES = [("Paris", "France"), ("Lyon", "France"), ("Rome", "Italie"), ("Lisbonne", "Portugal"), ("Barcelone", "Espagne")]
+
+def _destinations(index: int, count: int, days: int) -> List[Dict[str, Any]]:
+    return [
+        {"city": city, "country": country, "duration_days": days}
+        for city, country in (CITIES[(index + offset) % len(CITIES)] for offset in range(count))
+    ]
+
+def _travel_request(index: int, args) -> Dict[str, Any]:
+    start = date(2024, 6, 1)
+    return {
+        "destinations": _destinations(index, args.cities, args.days),
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(days=args.cities * args.days - 1)).isoformat(),
+        # Budget propre à chaque requête : pas de fusion des prompts identiques entre requêtes
+        "budget": 1000 + index,
+        "mood": "culture",
+        "interests": ["culture", "gastronomie"],
+        "group_size": 2
+    }
+
+def _program_request(index: int, args) -> Dict[str, Any]:
+    request = _travel_request(index, args)
+    del request["interests"]
+    return {**request, "type": "multi" if args.cities > 1 else "mono"}
+
+def _chat_messages() -> List[str]:
+    with open(os.path.join(DATA_DIR, "intent_samples.jsonl"), encoding="utf-8") as f:
+        return [json.loads(line)["message"] for line in f if line.strip()]
+
+def _chat_request(index: int, args) -> Dict[str, Any]:
+    messages = args.chat_messages
+    # Sessions de plusieurs tours : le contexte de conversation grandit au fil du benchmark
+    return {"message": messages[index % len(messages)], "session_id": f"bench-{index % args.chat_sessions}"}
+
+# nom -> (chemin, fabrique du corps de requête)
+SCENARIOS: Dict[str, Tuple[str, Callable[[int, Any], Dict[str, Any]]]] = {
+    "generate-program": ("/api/v1/generate-program", _travel_request),
+    "generate-program-fused": ("/api/v1/generate-program?mode=fused", _travel_request),
+    "generate-program-v2": ("/api/v1/generate-program-v2", _program_request),
+    "generate-structured-text": ("/api/v1/generate-structured-text", _travel_request),
+    "chat": ("/api/v1/chat", _chat_request),
+}
+
+def _supabase(path, params, body):
+    return 200, [
+        {"name": f"Musée de {params['destination']}", "cost": 12.0, "category": "culture"},
+        {"name": f"Marché de {params['destination']}", "cost": 0.0, "category": "gastronomie"}
+    ]
+
+def _viator(path, params, body):
+    return 200, {"products": [{"title": "Visite guidée", "price": {"fromPrice": 35.0}}]}
+
+def percentile(values: List[float], q: float) -> float:
+    """
+    Percentile par rang le plus proche (valeurs triées)
+    """
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, int(round(q / 100 * len(values) + 0.5)) - 1))
+    return values[rank]
+
+async def run_scenario(client: httpx.AsyncClient, app, fake: FakeOllama, name: str, args) -> Dict[str, Any]:
+    path, make_body = SCENARIOS[name]
+    for index in range(args.warmup):
+        await client.post(path, json=make_body(10_000 + index, args))
+
+    llm_service = app.state.llm_service
+    parse_before = dict(llm_service.parse_counts)
+    ollama_before = fake.snapshot()
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    http_bytes = {"in": 0, "out": 0}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(index: int):
+        body = json.dumps(make_body(index, args)).encode()
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(path, content=body, headers={"Content-Type": "application/json"})
+            latencies.append(time.perf_counter() - start)
+        statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        http_bytes["in"] += len(body)
+        http_bytes["out"] += len(response.content)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(args.requests)))
+    wall = time.perf_counter() - start
+
+    ollama = {key: value - ollama_before[key] for key, value in fake.snapshot().items()}
+    parse = {key: value - parse_before[key] for key, value in llm_service.parse_counts.items()}
+    latencies.sort()
+    count = len(latencies)
+    return {
+        "requests": count,
+        "concurrency": args.concurrency,
+        "status": statuses,
+        "errors": sum(n for status, n in statuses.items() if not status.startswith("2")),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+            "mean": round(sum(latencies) / count * 1000, 2) if count else 0.0,
+            "max": round(latencies[-1] * 1000, 2) if count else 0.0
+        },
+        "throughput_rps": round(count / wall, 2) if wall else 0.0,
+        "llm_calls_per_request": round(ollama["calls"] / count, 2) if count else 0.0,
+        "ollama": ollama,
+        "bytes_per_request": {
+            "http_in": round(http_bytes["in"] / count) if count else 0,
+            "http_out": round(http_bytes["out"] / count) if count else 0,
+            "ollama_in": round(ollama["bytes_in"] / count) if count else 0,
+            "ollama_out": round(ollama["bytes_out"] / count) if count else 0
+        },
+        "parse": parse
+    }
+
+async def run(args) -> Dict[str, Any]:
+    import main
+
+    fake = FakeOllama(
+        profile=PROFILES[args.profile],
+        seed=args.seed,
+        malformed_rate=args.malformed_rate,
+        truncated_rate=args.truncated_rate
+    )
+    routes = {("GET", "/activities"): _supabase, ("GET", "/products"): _viator}
+    with run_fake_ollama(fake) as ollama, run_standin_server(routes) as external:
+        os.environ.update(
+            OLLAMA_BACKENDS=ollama.base_url,
+            # Le faux Ollama génère sans limite de parallélisme : pas de file d'attente côté API
+            OLLAMA_BACKEND_CONCURRENCY=os.environ.get("OLLAMA_BACKEND_CONCURRENCY", "0"),
+            LLM_CACHE_SIZE="512" if args.cache else "0",
+            LLM_CACHE_PATH="",
+            SESSION_STORE="memory",
+            # /generate-program refuse de répondre sans clé configurée
+            OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "benchmark"),
+            SUPABASE_URL=external.base_url, SUPABASE_KEY="benchmark",
+            # Faux Supabase sans table à synchroniser : requêtes distantes, sans catalogue local
+            ACTIVITY_CATALOG="0",
+            VIATOR_API_KEY="benchmark", VIATOR_API_URL=external.base_url
+        )
+        results = {}
+        async with main.app.router.lifespan_context(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+                for name in args.scenarios:
+                    results[name] = await run_scenario(client, main.app, fake, name, args)
+                    _print_scenario(name, results[name])
+    return {
+        "generated_at": datetime.now().isoformat(),
+        "commit": _git_commit(),
+        "config": {
+            "profile": args.profile,
+            "seed": args.seed,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+            "cities": args.cities,
+            "days": args.days,
+            "malformed_rate": args.malformed_rate,
+            "truncated_rate": args.truncated_rate,
+            "cache": args.cache
+        },
+        "scenarios": results
+    }
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "inconnu"
+
+def _print_scenario(name: str, result: Dict[str, Any]):
+    latency = result["latency_ms"]
+    print(
+        f"{name:<26} p50 {latency['p50']:9.1f} ms  p95 {latency['p95']:9.1f} ms  p99 {latency['p99']:9.1f} ms  "
+        f"{result['throughput_rps']:7.2f} req/s  {result['llm_calls_per_request']:5.2f} appels LLM/req  "
+        f"{result['bytes_per_request']['ollama_in'] + result['bytes_per_request']['ollama_out']:8d} o Ollama/req  "
+        f"erreurs {result['errors']}"
+    )
+
+def compare(current: Dict[str, Any], baseline_path: str, tolerance: float) -> bool:
+    """
+    Compare p95, débit et appels LLM avec une exécution de référence ; False si p95 régresse au-delà de la tolérance
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    ok = True
+    print(f"\nComparaison avec {baseline_path} (commit {baseline.get('commit')}, tolérance {tolerance:.0%})")
+    for name, result in current["scenarios"].items():
+        reference = baseline.get("scenarios", {}).get(name)
+        if reference is None:
+            continue
+        p95, p95_ref = result["latency_ms"]["p95"], reference["latency_ms"]["p95"]
+        p95_delta = (p95 - p95_ref) / p95_ref if p95_ref else 0.0
+        rps_delta = (result["throughput_rps"] - reference["throughput_rps"]) / reference["throughput_rps"] if reference["throughput_rps"] else 0.0
+        regression = p95_delta > tolerance
+        ok = ok and not regression
+        print(
+            f"{name:<26} p95 {p95_delta:+7.1%}  débit {rps_delta:+7.1%}  "
+            f"appels LLM/req {reference['llm_calls_per_request']:.2f} -> {result['llm_calls_per_request']:.2f}"
+            + ("  RÉGRESSION" if regression else "")
+        )
+    return ok
+
+def main_cli(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=30, help="requêtes mesurées par scénario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--profile", default="fast", choices=list(PROFILES), help="profil de latence du faux Ollama")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="part des réponses JSON malformées")
+    parser.add_argument("--truncated-rate", type=float, default=0.0, help="part des réponses JSON tronquées")
+    parser.add_argument("--cities", type=int, default=2)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--chat-sessions", type=int, default=5)
+    parser.add_argument("--cache", action="store_true", help="active le cache des réponses LLM (désactivé par défaut)")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--output", help="fichier de résultats JSON (défaut : benchmarks/results/e2e-<date>.json)")
+    parser.add_argument("--compare", help="résultats de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="hausse du p95 tolérée avant de signaler une régression")
+    args = parser.parse_args(argv)
+    args.chat_messages = _chat_messages()
+
+    results = asyncio.run(run(args))
+    output = args.output or os.path.join(RESULTS_DIR, f"e2e-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Résultats : {output}")
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
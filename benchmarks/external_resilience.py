@@ -0,0 +1,62 @@
+"""
+Scénario contre des serveurs Supabase/Viator locaux : cache TTL, cache négatif et disjoncteur
+d'ExternalServices. Affiche le nombre de requêtes réellement reçues par chaque serveur.
+
+Usage : python -m benchmarks.external_resilience
+"""
+from utils.services import ExternalServices
+from benchmarks.standin import run_standin_server
+from datetime import date
+import asyncio
+import time
+import os
+
+def _supabase(path, params, body):
+    return 200, [{"name": f"Musée de {params['destination']}", "cost": 12.0}]
+
+viator_up = False
+
+def _viator(path, params, body):
+    if not viator_up:
+        return 503, {"error": "unavailable"}
+    return 200, {"products": [{"title": "Croisière", "date": params.get("date")}]}
+
+async def main():
+    global viator_up
+    routes = {("GET", "/activities"): _supabase, ("GET", "/products"): _viator}
+    with run_standin_server(routes) as server:
+        os.environ.update(
+            SUPABASE_URL=server.base_url, SUPABASE_KEY="bench",
+            VIATOR_API_KEY="bench", VIATOR_API_URL=server.base_url,
+            EXTERNAL_BREAKER_THRESHOLD="3", EXTERNAL_BREAKER_RESET="0.5", EXTERNAL_NEGATIVE_TTL="0.1"
+        )
+        services = ExternalServices()
+
+        requests_before = server.requests
+        for _ in range(20):
+            await services.get_supabase_activities("Paris", "culture", 100)
+        print(f"Supabase : 20 appels identiques -> {server.requests - requests_before} requête(s) (cache TTL)")
+
+        requests_before = server.requests
+        start = time.perf_counter()
+        for day in range(1, 21):
+            await services.get_viator_activities("Paris", date(2024, 6, day))
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        print(f"Viator en panne : 20 appels -> {server.requests - requests_before} requête(s) en {elapsed:.2f}s (disjoncteur)")
+        print(f"  état : {services.status()['sources']['viator']['breaker']}")
+
+        viator_up = True
+        await asyncio.sleep(0.6)
+        requests_before = server.requests
+        await services.get_viator_activities("Paris", date(2024, 7, 1))
+        print(f"Viator rétabli, après reset_timeout : {server.requests - requests_before} requête de test, état {services.breakers['viator'].state}")
+
+        unconfigured = ExternalServices()
+        unconfigured.viator_api_key = None
+        start = time.perf_counter()
+        await unconfigured.get_viator_activities("Paris", date(2024, 6, 1))
+        print(f"Source non configurée : {1000 * (time.perf_counter() - start):.2f} ms, aucun appel réseau")
+
+if __name__ == "__main__":
+    asyncio.run(main())
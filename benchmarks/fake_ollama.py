@@ -0,0 +1,380 @@
+"""
+Faux serveur Ollama (/api/generate et /api/chat) déterministe pour les benchmarks hors ligne.
+
+La réponse est choisie d'après le schéma JSON du paramètre "format" (itinéraire, activités,
+hébergement, transport, sélection groupée, mode fusionné) ou, sans format, un texte canné.
+La latence suit le modèle d'Ollama : chargement + évaluation du prompt + génération token par
+token, avec une gigue log-normale. Une fraction des réponses JSON peut être malformée ou tronquée.
+
+Le serveur expose aussi /api/tags et /api/ps (modèles installés et chargés), refuse les modèles
+qu'il n'a pas (404) et, avec parallel > 0, ne génère que parallel réponses à la fois (OLLAMA_NUM_PARALLEL).
+
+Une requête sans prompt (/api/generate) ou sans messages (/api/chat) ne fait que charger le modèle,
+comme le préchargement d'Ollama.
+
+Comme Ollama, le serveur garde le préfixe évalué de ses derniers prompts (kv_slots emplacements) :
+seule la partie du prompt qui suit le plus long préfixe commun est évaluée. Le modèle est déchargé
+après keep_alive (5 minutes par défaut) sans requête ; le rechargement coûte cold_load_ms.
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from benchmarks.standin import run_standin_server
+from contextlib import contextmanager
+import threading
+import random
+import json
+import math
+import time
+import os
+import re
+
+ACTIVITY_NAMES = [
+    "Visite du musée d'art", "Balade dans la vieille ville", "Dégustation au marché couvert",
+    "Croisière sur le fleuve", "Randonnée au belvédère", "Atelier de cuisine locale",
+    "Concert en plein air", "Tour des quartiers street-art", "Visite de la cathédrale"
+]
+
+PROGRAM_TEXT = (
+    "Jour {day} ({city})\n"
+    "Matin : visite du centre historique\n"
+    "Déjeuner : bistrot du marché\n"
+    "Après-midi : musée puis balade au bord de l'eau\n"
+    "Soir : dîner dans un restaurant traditionnel\n"
+    "Nuit : bar à cocktails en rooftop\n\n"
+)
+
+CHAT_TEXT = (
+    "Pour ce voyage, je vous conseille de réserver les visites principales à l'avance, "
+    "de privilégier les transports en commun et de garder une demi-journée libre par étape. "
+)
+
+class LatencyProfile:
+    """
+    Modèle de latence d'un appel : load_ms + prompt_tokens / prompt_rate + sortie / token_rate,
+    multiplié par une gigue log-normale (jitter = écart-type du logarithme, 0 = déterministe)
+    """
+    def __init__(self, load_ms: float = 5.0, prompt_rate: float = 4000.0, token_rate: float = 2000.0, jitter: float = 0.2):
+        self.load_ms = load_ms
+        self.prompt_rate = prompt_rate
+        self.token_rate = token_rate
+        self.jitter = jitter
+
+    def durations(self, rng: random.Random, prompt_tokens: int, output_tokens: int) -> Tuple[float, float, float]:
+        """
+        (chargement, évaluation du prompt, génération) en secondes
+        """
+        factor = rng.lognormvariate(0.0, self.jitter) if self.jitter else 1.0
+        return (
+            self.load_ms / 1000 * factor,
+            prompt_tokens / self.prompt_rate * factor,
+            output_tokens / self.token_rate * factor
+        )
+
+# Profils prédéfinis : "fast" pour les comparaisons rapides, "cpu" proche de Mistral 7B sur CPU
+PROFILES = {
+    "instant": LatencyProfile(load_ms=0.0, prompt_rate=1e9, token_rate=1e9, jitter=0.0),
+    "fast": LatencyProfile(),
+    "gpu": LatencyProfile(load_ms=20.0, prompt_rate=2000.0, token_rate=80.0, jitter=0.15),
+    "cpu": LatencyProfile(load_ms=100.0, prompt_rate=150.0, token_rate=12.0, jitter=0.25),
+}
+
+def _tokens(text: str) -> int:
+    return max(1, (len(text) + 3) // 4)
+
+def _keep_alive_seconds(value: Any) -> float:
+    """
+    keep_alive d'Ollama : nombre de secondes ou durée ("30m", "1h", "90s") ; négatif = jamais déchargé
+    """
+    if value is None:
+        return 300.0
+    if isinstance(value, (int, float)):
+        return math.inf if value < 0 else float(value)
+    match = re.fullmatch(r"(-?\d+(?:\.\d+)?)(ms|s|m|h)?", str(value).strip())
+    if not match:
+        return 300.0
+    amount = float(match.group(1))
+    if amount < 0:
+        return math.inf
+    return amount * {"ms": 0.001, "s": 1, "m": 60, "h": 3600, None: 1}[match.group(2)]
+
+def _render_messages(messages: List[Dict[str, Any]]) -> str:
+    # Rendu proche du gabarit de chat : l'ordre des messages détermine le préfixe réutilisable
+    return "".join(f"<{message.get('role')}>{message.get('content', '')}\n" for message in messages)
+
+class FakeOllama:
+    """
+    Routes Ollama pour benchmarks.standin, avec ses compteurs (appels, tokens, octets, fautes injectées)
+    """
+    def __init__(
+        self,
+        profile: LatencyProfile = None,
+        seed: int = 0,
+        malformed_rate: float = 0.0,
+        truncated_rate: float = 0.0,
+        activities_per_day: int = 3,
+        kv_slots: int = 4,
+        cold_load_ms: float = 0.0,
+        models: Tuple[str, ...] = ("mistral:latest",),
+        parallel: int = 0
+    ):
+        self.profile = profile or PROFILES["fast"]
+        self.models = models
+        # False : le serveur répond 503 partout (panne simulée, contrôles de santé compris)
+        self.available = True
+        # Générations simultanées au plus ; les suivantes attendent leur tour (0 : illimité)
+        self._parallel = threading.Semaphore(parallel) if parallel else None
+        self.kv_slots = kv_slots
+        self.cold_load_ms = cold_load_ms
+        # Préfixes évalués conservés (du plus récent au plus ancien) et échéance de déchargement
+        self._slots: List[str] = []
+        self._unload_at = 0.0
+        self.malformed_rate = malformed_rate
+        self.truncated_rate = truncated_rate
+        self.activities_per_day = activities_per_day
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counters = {
+            "calls": 0, "streamed": 0, "malformed": 0, "truncated": 0, "cold_loads": 0, "preloads": 0,
+            "prompt_tokens": 0, "prompt_tokens_cached": 0, "eval_tokens": 0, "bytes_in": 0, "bytes_out": 0
+        }
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+    def _draw(self) -> Tuple[random.Random, float]:
+        # Un générateur par appel, tiré sous verrou : résultats reproductibles pour une même graine
+        with self._lock:
+            return random.Random(self._rng.random()), self._rng.random()
+
+    def _evaluate(self, prompt: str, keep_alive: Any) -> Tuple[int, bool]:
+        """
+        Caractères du prompt déjà présents dans le cache KV, et rechargement du modèle nécessaire
+        """
+        now = time.monotonic()
+        with self._lock:
+            cold = now >= self._unload_at
+            if cold:
+                self._slots = []
+            self._unload_at = now + _keep_alive_seconds(keep_alive)
+            best, cached = None, 0
+            for index, previous in enumerate(self._slots):
+                length = len(os.path.commonprefix([previous, prompt]))
+                if length > cached:
+                    best, cached = index, length
+            if best is not None and cached == len(self._slots[best]):
+                # Le prompt prolonge ce préfixe : l'emplacement est réutilisé tel quel
+                del self._slots[best]
+            elif len(self._slots) >= self.kv_slots:
+                # Comme le runner d'Ollama : le préfixe commun est recopié dans l'emplacement le moins
+                # récemment utilisé, l'emplacement d'origine est conservé
+                self._slots.pop()
+            self._slots.insert(0, prompt)
+        return cached, cold
+
+    def _serves(self, model: str) -> bool:
+        return model in self.models or f"{model}:latest" in self.models
+
+    def tags(self, path: str, params: Dict[str, Any], body: Optional[Dict[str, Any]]):
+        if not self.available:
+            return 503, {"error": "server unavailable"}
+        return 200, {"models": [{"name": model} for model in self.models]}
+
+    def ps(self, path: str, params: Dict[str, Any], body: Optional[Dict[str, Any]]):
+        loaded = time.monotonic() < self._unload_at
+        return 200, {"models": [{"name": model} for model in self.models] if loaded else []}
+
+    @contextmanager
+    def _generation_slot(self):
+        if self._parallel is None:
+            yield
+            return
+        with self._parallel:
+            yield
+
+    def route(self, path: str, params: Dict[str, Any], body: Optional[Dict[str, Any]]):
+        if not self.available:
+            return 503, {"error": "server unavailable"}
+        if not self._serves(body.get("model", "")):
+            return 404, {"error": f"model '{body.get('model')}' not found"}
+        chat = path.endswith("/chat")
+        if not (body.get("messages") if chat else "prompt" in body):
+            return self._preload(body)
+        rng, fault = self._draw()
+        prompt = _render_messages(body.get("messages", [])) if chat else body.get("system", "") + body.get("prompt", "")
+        output_format = body.get("format")
+        text, kind = self._response_text(prompt, output_format, rng)
+        if output_format:
+            if fault < self.malformed_rate:
+                text, kind = f"Voici le résultat demandé : {text[:-1]},,", "malformed"
+            elif fault < self.malformed_rate + self.truncated_rate:
+                text, kind = text[:int(len(text) * 0.6)], "truncated"
+        cached_chars, cold = self._evaluate(prompt, body.get("keep_alive"))
+        prompt_tokens = _tokens(prompt)
+        cached_tokens = min(prompt_tokens - 1, cached_chars // 4)
+        evaluated, eval_tokens = prompt_tokens - cached_tokens, _tokens(text)
+        load, prompt_eval, generation = self.profile.durations(rng, evaluated, eval_tokens)
+        if cold and self.cold_load_ms:
+            load += self.cold_load_ms / 1000
+        with self._lock:
+            self.counters["calls"] += 1
+            self.counters["cold_loads"] += int(cold)
+            self.counters["prompt_tokens"] += prompt_tokens
+            self.counters["prompt_tokens_cached"] += cached_tokens
+            self.counters["eval_tokens"] += eval_tokens
+            self.counters["bytes_in"] += len(json.dumps(body).encode())
+            if kind in ("malformed", "truncated"):
+                self.counters[kind] += 1
+        stats = {
+            "model": body.get("model"),
+            "done": True,
+            "total_duration": int((load + prompt_eval + generation) * 1e9),
+            "load_duration": int(load * 1e9),
+            # Comme Ollama : seuls les tokens hors cache KV sont comptés et évalués
+            "prompt_eval_count": evaluated,
+            "prompt_eval_duration": int(prompt_eval * 1e9),
+            "eval_count": eval_tokens,
+            "eval_duration": int(generation * 1e9)
+        }
+        if body.get("stream", True):
+            with self._lock:
+                self.counters["streamed"] += 1
+            return 200, self._chunks(text, load + prompt_eval, generation, stats, chat)
+        with self._generation_slot():
+            time.sleep(load + prompt_eval + generation)
+        payload = {**stats, **self._content(text, chat)}
+        self._count_out(payload)
+        return 200, payload
+
+    def _preload(self, body: Dict[str, Any]):
+        """
+        Chargement du modèle sans génération (maintenu keep_alive), cache KV vidé s'il était déchargé
+        """
+        now = time.monotonic()
+        with self._lock:
+            cold = now >= self._unload_at
+            if cold:
+                self._slots = []
+            self._unload_at = now + _keep_alive_seconds(body.get("keep_alive"))
+            self.counters["preloads"] += 1
+            self.counters["cold_loads"] += int(cold)
+        load = self.profile.load_ms / 1000 + (self.cold_load_ms / 1000 if cold else 0.0)
+        time.sleep(load)
+        return 200, {
+            "model": body.get("model"), "response": "", "done": True, "done_reason": "load",
+            "total_duration": int(load * 1e9), "load_duration": int(load * 1e9)
+        }
+
+    @staticmethod
+    def _content(text: str, chat: bool) -> Dict[str, Any]:
+        return {"message": {"role": "assistant", "content": text}} if chat else {"response": text}
+
+    def _count_out(self, payload: Dict[str, Any]):
+        with self._lock:
+            self.counters["bytes_out"] += len(json.dumps(payload).encode())
+
+    def _chunks(self, text: str, first_token_delay: float, generation: float, stats: Dict[str, Any], chat: bool) -> Iterator[Dict[str, Any]]:
+        with self._generation_slot():
+            time.sleep(first_token_delay)
+            pieces = re.findall(r"\S+\s*|\s+", text) or [""]
+            delay = generation / len(pieces)
+            for piece in pieces:
+                chunk = {"model": stats["model"], **self._content(piece, chat), "done": False}
+                self._count_out(chunk)
+                yield chunk
+                time.sleep(delay)
+        final = {**stats, **self._content("", chat)}
+        self._count_out(final)
+        yield final
+
+    def _response_text(self, prompt: str, output_format: Any, rng: random.Random) -> Tuple[str, str]:
+        if not output_format:
+            return self._text(prompt), "text"
+        properties = output_format.get("properties", {}) if isinstance(output_format, dict) else {}
+        days = self._days_in(prompt)
+        if "accommodation" in properties:
+            data = {"days": [self._day(rng, i, meals=True) for i in range(days)], "accommodation": self._accommodation(rng)}
+        elif "days" in properties:
+            item = properties["days"].get("items", {}).get("properties", {})
+            dates = item.get("date", {}).get("enum")
+            if dates:
+                data = {"days": [{"date": date, "activities": self._activities(rng)} for date in dates]}
+            else:
+                data = {"days": [self._day(rng, i) for i in range(days)]}
+        elif "accommodations" in properties:
+            data = {"accommodations": [self._accommodation(rng)]}
+        elif "transportation" in properties:
+            data = {"transportation": [self._transportation(rng)]}
+        else:
+            data = {"activities": self._activities(rng)}
+        return json.dumps(data, ensure_ascii=False), "json"
+
+    def _text(self, prompt: str) -> str:
+        if "Réponds avec un seul mot" in prompt:
+            return "OTHER"
+        if "Jour X" in prompt:
+            city = re.search(r"destination (\S+),", prompt)
+            return "".join(
+                PROGRAM_TEXT.format(day=day, city=city.group(1) if city else "Ville")
+                for day in range(1, self._days_in(prompt) + 1)
+            )
+        return CHAT_TEXT * 3
+
+    @staticmethod
+    def _days_in(prompt: str) -> int:
+        match = re.search(r"(\d+) jours", prompt)
+        return min(int(match.group(1)), 30) if match else 3
+
+    def _activities(self, rng: random.Random) -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": rng.choice(ACTIVITY_NAMES),
+                "description": "Activité adaptée au style et au budget du voyage.",
+                "duration_hours": rng.choice([1.5, 2.0, 3.0]),
+                "cost": float(rng.randint(0, 60)),
+                "location": "Centre-ville",
+                "category": rng.choice(["culture", "gastronomie", "nature"])
+            }
+            for _ in range(self.activities_per_day)
+        ]
+
+    def _day(self, rng: random.Random, index: int, meals: bool = False) -> Dict[str, Any]:
+        day = {"date": f"Jour {index + 1}", "activities": self._activities(rng)}
+        if meals:
+            day["meals"] = ["Déjeuner au marché", "Dîner traditionnel"]
+        return day
+
+    def _accommodation(self, rng: random.Random) -> Dict[str, Any]:
+        return {
+            "name": "Hôtel du Centre",
+            "type": "hotel",
+            "location": "Centre-ville",
+            "check_in": "2024-06-01",
+            "check_out": "2024-06-04",
+            "price_per_night": float(rng.randint(60, 180)),
+            "booking_url": "https://example.com"
+        }
+
+    def _transportation(self, rng: random.Random) -> Dict[str, Any]:
+        return {
+            "type": "train",
+            "from_location": "Gare centrale",
+            "to_location": "Gare centrale",
+            "departure_time": "09:00",
+            "arrival_time": "11:30",
+            "cost": float(rng.randint(20, 90)),
+            "booking_url": "https://example.com"
+        }
+
+@contextmanager
+def run_fake_ollama(fake: FakeOllama):
+    """
+    Démarre un faux Ollama local ; renvoie le serveur (base_url, connexions, requêtes)
+    """
+    routes = {
+        ("POST", "/api/generate"): fake.route,
+        ("POST", "/api/chat"): fake.route,
+        ("GET", "/api/tags"): fake.tags,
+        ("GET", "/api/ps"): fake.ps
+    }
+    with run_standin_server(routes) as server:
+        yield server
@@ -0,0 +1,59 @@
+"""
+Mesure le surcoût par appel de LLMService / ExternalServices avec un client HTTP éphémère
+(comportement historique) et avec le client mutualisé créé par le lifespan.
+
+Usage : python -m benchmarks.http_client [nombre_d_appels]
+"""
+from utils.llm import LLMService
+from utils.services import ExternalServices
+from utils.http import create_http_client
+from benchmarks.standin import run_standin_server
+import asyncio
+import time
+import sys
+import os
+
+def _ollama_generate(path, params, body):
+    if path.endswith("/chat"):
+        return 200, {"model": body["model"], "message": {"role": "assistant", "content": "ok"}, "done": True}
+    return 200, {"model": body["model"], "response": "ok", "done": True}
+
+def _supabase_activities(path, params, body):
+    return 200, [{"name": "Musée", "cost": 10.0}]
+
+async def _measure(label, server, call, calls):
+    start_connections = server.connections
+    start = time.perf_counter()
+    for _ in range(calls):
+        await call()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed / calls * 1000:8.3f} ms/appel  {server.connections - start_connections:5d} connexions TCP")
+
+async def main(calls: int):
+    routes = {
+        ("POST", "/api/generate"): _ollama_generate,
+        ("POST", "/api/chat"): _ollama_generate,
+        ("GET", "/activities"): _supabase_activities,
+    }
+    # Chaque appel Supabase atteint le serveur : on mesure la connexion, pas le cache TTL des services externes
+    os.environ["EXTERNAL_CACHE_SIZE"] = "0"
+    with run_standin_server(routes) as server:
+        # Client éphémère à chaque appel (comportement avant le lifespan)
+        llm = LLMService(base_url=server.base_url)
+        services = ExternalServices()
+        services.supabase_url, services.supabase_key = server.base_url, "bench"
+        await _measure("LLM (client par appel)", server, lambda: llm.generate_response("ping"), calls)
+        await _measure("Supabase (client par appel)", server, lambda: services.get_supabase_activities("Paris", "culture", 100), calls)
+
+        # Client mutualisé partagé par les deux services
+        client = create_http_client()
+        try:
+            llm = LLMService(base_url=server.base_url, client=client)
+            services.client = client
+            await _measure("LLM (client mutualisé)", server, lambda: llm.generate_response("ping"), calls)
+            await _measure("Supabase (client mutualisé)", server, lambda: services.get_supabase_activities("Paris", "culture", 100), calls)
+        finally:
+            await client.aclose()
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
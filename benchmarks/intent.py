@@ -0,0 +1,65 @@
+"""
+Précision et latence du classifieur d'intention local (utils/intent.py) sur des échantillons étiquetés.
+
+intent_samples.jsonl a servi au réglage des mots-clés ; intent_holdout.jsonl est un jeu de contrôle
+qui n'y a pas servi (messages écrits avant le réglage, non modifiés depuis) : c'est sa précision
+qui estime celle du classifieur en production. Les erreurs commises avec une confiance au-dessus
+du seuil (sans repli sur le LLM) sont listées.
+
+Usage : python -m benchmarks.intent [fichier.jsonl ...] [--threshold 0.5]
+"""
+from utils.intent import IntentClassifier, INTENTS
+import argparse
+import json
+import time
+import os
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+DEFAULT_SAMPLES = os.path.join(DATA, "intent_samples.jsonl")
+HOLDOUT_SAMPLES = os.path.join(DATA, "intent_holdout.jsonl")
+
+def evaluate(classifier: IntentClassifier, path: str, threshold: float, repeat: int = 200):
+    with open(path, encoding="utf-8") as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+
+    correct = confident = confident_correct = 0
+    errors = []
+    confusion = {expected: {predicted: 0 for predicted in INTENTS} for expected in INTENTS}
+    for sample in samples:
+        intent, confidence = classifier.classify(sample["message"])
+        confusion[sample["intent"]][intent] += 1
+        correct += intent == sample["intent"]
+        if confidence >= threshold:
+            confident += 1
+            confident_correct += intent == sample["intent"]
+            if intent != sample["intent"]:
+                errors.append((sample, intent, confidence))
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for sample in samples:
+            classifier.classify(sample["message"])
+    latency_us = (time.perf_counter() - start) / (repeat * len(samples)) * 1e6
+
+    print(f"{os.path.basename(path)}")
+    print(f"Échantillons               : {len(samples)}")
+    print(f"Précision globale          : {correct / len(samples):.1%}")
+    print(f"Couverture (conf >= {threshold:.2f}) : {confident / len(samples):.1%}  -> appels LLM évités")
+    print(f"Précision si confiant      : {confident_correct / confident:.1%}" if confident else "Précision si confiant      : n/a")
+    print(f"Latence moyenne            : {latency_us:.1f} µs/message")
+    print("Matrice de confusion (ligne = attendu) :")
+    print("          " + " ".join(f"{intent:>8}" for intent in INTENTS))
+    for expected in INTENTS:
+        print(f"{expected:>8}  " + " ".join(f"{confusion[expected][predicted]:8d}" for predicted in INTENTS))
+    for sample, intent, confidence in errors:
+        print(f"   erreur confiante : {sample['message']!r} -> {intent} ({confidence:.3f}), attendu {sample['intent']}")
+    print()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", default=[DEFAULT_SAMPLES, HOLDOUT_SAMPLES], help="échantillons JSONL (message, intent)")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.5")))
+    args = parser.parse_args()
+    classifier = IntentClassifier()
+    for path in args.files:
+        evaluate(classifier, path, args.threshold)
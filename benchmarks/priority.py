@@ -0,0 +1,145 @@
+"""
+Chat pendant des générations de programme en masse : un faux Ollama limité à --parallel générations
+simultanées, --bulk requêtes /generate-program-v2 de --days jours (sélection jour par jour) en continu
+et un message de chat toutes les --chat-interval secondes.
+
+1. sans ordonnanceur (LLM_CONCURRENCY=0) : les appels du chat attendent derrière ceux des générations ;
+2. avec ordonnanceur : le chat passe devant, une place lui reste réservée ;
+3. admission : attente maximale de la classe bulk abaissée (--max-wait), les générations en trop
+   reçoivent un 503 immédiat avec Retry-After.
+
+Usage : python -m benchmarks.priority [--bulk 8] [--days 30] [--chats 20] [--parallel 4]
+"""
+from typing import Any, Dict, List
+from benchmarks.fake_ollama import FakeOllama, LatencyProfile, run_fake_ollama
+from benchmarks.standin import run_standin_server
+from benchmarks.e2e import _chat_messages, _supabase, _viator, percentile
+from datetime import date, timedelta
+import argparse
+import asyncio
+import httpx
+import time
+import os
+
+# ~0,25 s par appel (prompt court, ~200 tokens de sortie)
+PROFILE = LatencyProfile(load_ms=5.0, prompt_rate=2000.0, token_rate=1000.0, jitter=0.1)
+
+SCHEDULER_ENV = (
+    "LLM_CONCURRENCY", "LLM_INTERACTIVE_CONCURRENCY", "LLM_BULK_CONCURRENCY",
+    "LLM_INTERACTIVE_MAX_WAIT", "LLM_BULK_MAX_WAIT", "LLM_INTERACTIVE_QUEUE", "LLM_BULK_QUEUE"
+)
+
+def _program_request(index: int, days: int) -> Dict[str, Any]:
+    start = date(2024, 6, 1)
+    return {
+        "destinations": [{"city": "Rome", "country": "Italie", "duration_days": days}],
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(days=days - 1)).isoformat(),
+        "budget": 3000 + index,
+        "mood": "culture",
+        "group_size": 2,
+        "type": "mono"
+    }
+
+def _ms(values: List[float], q: float) -> float:
+    return round(percentile(sorted(values), q) * 1000, 1)
+
+async def run_phase(client: httpx.AsyncClient, app, args, extra_bulk: int = 0) -> Dict[str, Any]:
+    messages = _chat_messages()
+    bulk_latencies: List[float] = []
+    rejected: List[float] = []
+    chat_latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+
+    async def bulk(index: int):
+        start = time.perf_counter()
+        response = await client.post("/api/v1/generate-program-v2?batch=false", json=_program_request(index, args.days))
+        elapsed = time.perf_counter() - start
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code == 503:
+            rejected.append(elapsed)
+            assert response.headers.get("Retry-After"), "503 sans Retry-After"
+        else:
+            bulk_latencies.append(elapsed)
+
+    async def chats():
+        # Laisse les générations remplir la file avant le premier message
+        await asyncio.sleep(args.chat_interval)
+        for index in range(args.chats):
+            start = time.perf_counter()
+            response = await client.post("/api/v1/chat", json={"message": messages[index % len(messages)], "session_id": f"prio-{index}"})
+            chat_latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            await asyncio.sleep(args.chat_interval)
+
+    async def late_bulk():
+        # Générations arrivant une fois la file installée
+        await asyncio.sleep(args.chat_interval * 2)
+        await asyncio.gather(*(bulk(1000 + index) for index in range(extra_bulk)))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(bulk(index) for index in range(args.bulk)), chats(), late_bulk())
+    return {
+        "wall": time.perf_counter() - start,
+        "chat": chat_latencies,
+        "bulk": bulk_latencies,
+        "rejected": rejected,
+        "statuses": statuses,
+        "scheduler": app.state.llm_service.scheduler.status()
+    }
+
+def _print_phase(title: str, result: Dict[str, Any]):
+    print(title)
+    chat, bulk = result["chat"], result["bulk"]
+    print(f"   chat       : p50 {_ms(chat, 50):8.1f} ms  p95 {_ms(chat, 95):8.1f} ms  max {_ms(chat, 100):8.1f} ms  ({len(chat)} messages)")
+    if bulk:
+        print(f"   génération : p50 {_ms(bulk, 50):8.1f} ms  max {_ms(bulk, 100):8.1f} ms  ({len(bulk)} programmes, {result['wall']:.1f} s au total)")
+    if result["rejected"]:
+        print(f"   refusées   : {len(result['rejected'])} en 503, réponse en {_ms(result['rejected'], 50):.1f} ms (p50)")
+    classes = result["scheduler"]["classes"]
+    waits = ", ".join(f"{name} {state['waited_seconds'] / max(1, state['calls']) * 1000:.0f} ms" for name, state in classes.items())
+    print(f"   statuts {dict(sorted(result['statuses'].items()))} ; attente moyenne d'une place : {waits}")
+
+async def main(args):
+    import main as app_module
+
+    app = app_module.app
+    fake = FakeOllama(PROFILE, parallel=args.parallel)
+    routes = {("GET", "/activities"): _supabase, ("GET", "/products"): _viator}
+    with run_fake_ollama(fake) as ollama, run_standin_server(routes) as external:
+        os.environ.update(
+            OLLAMA_BACKENDS=ollama.base_url,
+            OLLAMA_BACKEND_CONCURRENCY=str(args.parallel),
+            LLM_CACHE_SIZE="0",
+            LLM_CACHE_PATH="",
+            SESSION_STORE="memory",
+            SUPABASE_URL=external.base_url, SUPABASE_KEY="benchmark",
+            # Faux Supabase sans table à synchroniser : requêtes distantes, sans catalogue local
+            ACTIVITY_CATALOG="0",
+            VIATOR_API_KEY="benchmark", VIATOR_API_URL=external.base_url
+        )
+        phases = [
+            ("1. Sans ordonnanceur (LLM_CONCURRENCY=0)", {"LLM_CONCURRENCY": "0"}, 0),
+            ("2. Avec ordonnanceur (capacité du pool, une place réservée au chat)", {}, 0),
+            (f"3. Admission : LLM_BULK_MAX_WAIT={args.max_wait}, {args.extra_bulk} générations de plus en cours de route",
+             {"LLM_BULK_MAX_WAIT": str(args.max_wait)}, args.extra_bulk),
+        ]
+        for title, env, extra_bulk in phases:
+            for name in SCHEDULER_ENV:
+                os.environ.pop(name, None)
+            os.environ.update(env)
+            async with app.router.lifespan_context(app):
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+                    _print_phase(title, await run_phase(client, app, args, extra_bulk))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bulk", type=int, default=8, help="générations /generate-program-v2 simultanées")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--chat-interval", type=float, default=0.5)
+    parser.add_argument("--parallel", type=int, default=4, help="générations simultanées du faux Ollama")
+    parser.add_argument("--max-wait", type=float, default=0.4, help="attente maximale de la classe bulk (phase 3)")
+    parser.add_argument("--extra-bulk", type=int, default=8)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,114 @@
+"""
+Évaluation du prompt par type d'appel (agent.méthode) contre le faux Ollama, qui simule la
+réutilisation du cache KV sur le plus long préfixe commun avec ses derniers prompts.
+
+Rapporte, par type d'appel : appels, tokens de prompt évalués par appel, temps d'évaluation du
+prompt par appel et part des tokens servis par le cache. --compare affiche le temps gagné par
+type d'appel par rapport à une exécution précédente.
+
+Usage :
+  python -m benchmarks.prompt_cache --output avant.json
+  python -m benchmarks.prompt_cache --compare avant.json
+"""
+from typing import Any, Dict, List
+from benchmarks.fake_ollama import FakeOllama, LatencyProfile, run_fake_ollama
+from benchmarks.e2e import SCENARIOS, _chat_messages
+from utils.llm import OLLAMA_REQUESTS, OLLAMA_TOKENS, OLLAMA_SECONDS
+import argparse
+import asyncio
+import httpx
+import json
+import os
+
+def _by_caller(metric, phase: str = None) -> Dict[str, float]:
+    totals: Dict[str, float] = {}
+    for labels, value in metric.family()[3]:
+        if phase is not None and labels.get("phase") != phase:
+            continue
+        caller = f"{labels['agent']}.{labels['method']}"
+        totals[caller] = totals.get(caller, 0.0) + value
+    return totals
+
+async def run(args) -> Dict[str, Any]:
+    import main
+
+    # Évaluation du prompt lente (CPU) et génération rapide : le coût mesuré est celui du prompt
+    fake = FakeOllama(LatencyProfile(load_ms=0.0, prompt_rate=args.prompt_rate, token_rate=1e6, jitter=0.0), kv_slots=args.kv_slots)
+    with run_fake_ollama(fake) as ollama:
+        os.environ.update(
+            OLLAMA_BACKENDS=ollama.base_url,
+            OLLAMA_BACKEND_CONCURRENCY="0",
+            LLM_CACHE_SIZE="0",
+            SESSION_STORE="memory",
+            OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "benchmark")
+        )
+        async with main.app.router.lifespan_context(main.app):
+            calls_before = _by_caller(OLLAMA_REQUESTS)
+            tokens_before = _by_caller(OLLAMA_TOKENS, "prompt")
+            seconds_before = _by_caller(OLLAMA_SECONDS, "prompt")
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+                # Requêtes séquentielles : l'ordre des prompts reçus par le faux Ollama est reproductible
+                for name in args.scenarios:
+                    path, make_body = SCENARIOS[name]
+                    for index in range(args.requests):
+                        response = await client.post(path, json=make_body(index, args))
+                        response.raise_for_status()
+    counters = fake.snapshot()
+    calls = {key: value - calls_before.get(key, 0) for key, value in _by_caller(OLLAMA_REQUESTS).items()}
+    tokens = {key: value - tokens_before.get(key, 0) for key, value in _by_caller(OLLAMA_TOKENS, "prompt").items()}
+    seconds = {key: value - seconds_before.get(key, 0) for key, value in _by_caller(OLLAMA_SECONDS, "prompt").items()}
+    per_caller = {
+        caller: {
+            "calls": int(count),
+            "prompt_eval_tokens_per_call": round(tokens.get(caller, 0) / count, 1),
+            "prompt_eval_ms_per_call": round(seconds.get(caller, 0) / count * 1000, 2)
+        }
+        for caller, count in sorted(calls.items()) if count
+    }
+    return {
+        "config": {"requests": args.requests, "prompt_rate": args.prompt_rate, "kv_slots": args.kv_slots, "scenarios": args.scenarios},
+        "prompt_tokens": counters["prompt_tokens"],
+        "prompt_tokens_cached": counters["prompt_tokens_cached"],
+        "callers": per_caller
+    }
+
+def _print(result: Dict[str, Any], baseline: Dict[str, Any] = None):
+    cached = result["prompt_tokens_cached"] / result["prompt_tokens"] if result["prompt_tokens"] else 0.0
+    print(f"Tokens de prompt : {result['prompt_tokens']}, servis par le cache KV : {cached:.0%}")
+    header = f"{'type d appel':<46} {'appels':>6} {'tokens évalués':>15} {'ms/appel':>9}"
+    print(header + (f" {'avant':>9} {'gagné':>9}" if baseline else ""))
+    for caller, stats in result["callers"].items():
+        line = f"{caller:<46} {stats['calls']:6d} {stats['prompt_eval_tokens_per_call']:15.1f} {stats['prompt_eval_ms_per_call']:9.1f}"
+        reference = (baseline or {}).get("callers", {}).get(caller)
+        if reference:
+            saved = reference["prompt_eval_ms_per_call"] - stats["prompt_eval_ms_per_call"]
+            line += f" {reference['prompt_eval_ms_per_call']:9.1f} {saved:+9.1f}"
+        print(line)
+
+def main_cli(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--prompt-rate", type=float, default=150.0, help="tokens de prompt évalués par seconde")
+    parser.add_argument("--kv-slots", type=int, default=4, help="emplacements du cache KV (OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--cities", type=int, default=2)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--chat-sessions", type=int, default=2)
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    args = parser.parse_args(argv)
+    args.chat_messages = _chat_messages()
+
+    result = asyncio.run(run(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    _print(result, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main_cli()
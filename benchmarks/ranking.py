@@ -0,0 +1,192 @@
+"""
+Pré-classement local des candidates (utils/ranking.py) sur /generate-program-v2, hors ligne :
+le faux Supabase renvoie --supabase activités par ville, le faux Viator --viator produits complets
+(descriptions longues, images, avis, itinéraire, comme l'API produits), dont une partie reprend
+une activité Supabase sous un autre libellé.
+
+Chaque requête passe deux fois, sans puis avec pré-classement (V2_CANDIDATE_RANKING), en sélection
+groupée puis par jour : tokens de prompt évalués par le faux Ollama, temps d'évaluation du prompt
+correspondant au profil --profile (et extrapolé au profil "cpu", Mistral 7B sur CPU), latence, et
+estimation renvoyée par l'API (metadata.candidates). Le coût du pré-classement lui-même est mesuré à part.
+
+Usage : python -m benchmarks.ranking [--requests 4] [--cities 2] [--days 5] [--viator 60]
+"""
+from typing import Any, Dict, List
+from benchmarks.fake_ollama import FakeOllama, PROFILES, run_fake_ollama
+from benchmarks.standin import run_standin_server
+from benchmarks.e2e import percentile
+from utils.ranking import CandidateRanker, RankingStats
+from datetime import date, timedelta
+import argparse
+import asyncio
+import random
+import httpx
+import time
+import os
+
+CITIES = [("Paris", "France"), ("Rome", "Italie"), ("Lisbonne", "Portugal"), ("Barcelone", "Espagne")]
+CATEGORIES = ("musée", "monument", "randonnée", "plage", "restaurant", "marché", "concert", "atelier", "visite guidée", "spa")
+PLACES = ("Colisée", "Panthéon", "Vieille ville", "Cathédrale", "Port", "Marché central", "Belvédère", "Jardin botanique")
+
+def supabase_rows(city: str, count: int, rng: random.Random) -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": index,
+            "name": f"{rng.choice(CATEGORIES).capitalize()} : {PLACES[index % len(PLACES)]} n°{index}",
+            "description": f"Découverte de {PLACES[index % len(PLACES)]} à {city} avec un guide local. " * 3,
+            "city": city,
+            "category": rng.choice(CATEGORIES),
+            "cost": round(rng.uniform(0, 120), 2),
+            "duration_hours": rng.choice((1, 2, 3)),
+            "booking_url": f"https://example.com/{city}/{index}"
+        }
+        for index in range(count)
+    ]
+
+def viator_products(city: str, count: int, start: date, days: int, rows: List[Dict[str, Any]], rng: random.Random) -> List[Dict[str, Any]]:
+    products = []
+    for index in range(count):
+        # Un produit sur quatre reprend une activité Supabase sous un autre libellé
+        if index % 4 == 0 and rows:
+            title = " ".join(reversed(rows[index % len(rows)]["name"].split(" : ")))
+        else:
+            title = f"{PLACES[index % len(PLACES)]} : excursion {index} au départ de {city}"
+        products.append({
+            "productCode": f"{city[:3].upper()}{index:04d}",
+            "title": title,
+            "description": f"Une expérience inoubliable à {city}. " * rng.randint(15, 40),
+            "images": [{"url": f"https://cdn.example.com/{city}/{index}/{n}.jpg", "caption": "Photo"} for n in range(6)],
+            "reviews": {"combinedAverageRating": round(rng.uniform(3.5, 5.0), 1), "totalReviews": rng.randint(10, 5000)},
+            "price": {"fromPrice": round(rng.uniform(20, 400), 2), "currency": "EUR"},
+            "duration": {"fixedDurationInMinutes": rng.choice((60, 120, 180, 240))},
+            "itinerary": [{"stop": f"Étape {n}", "details": "Arrêt photo et temps libre."} for n in range(4)],
+            "inclusions": ["Guide", "Billets d'entrée", "Eau"],
+            "productUrl": f"https://viator.example.com/{city}/{index}",
+            "availableDates": [(start + timedelta(days=offset)).isoformat() for offset in range(days) if rng.random() < 0.6]
+        })
+    return products
+
+def program_request(index: int, args) -> Dict[str, Any]:
+    start = date(2024, 6, 1)
+    return {
+        "destinations": [
+            {"city": city, "country": country, "duration_days": args.days}
+            for city, country in (CITIES[(index + offset) % len(CITIES)] for offset in range(args.cities))
+        ],
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(days=args.cities * args.days - 1)).isoformat(),
+        "budget": args.daily_budget * args.cities * args.days + index,
+        "mood": "culture",
+        "group_size": 2,
+        "type": "multi" if args.cities > 1 else "mono"
+    }
+
+async def run_mode(client: httpx.AsyncClient, fake: FakeOllama, ranking: bool, batch: bool, args) -> Dict[str, Any]:
+    os.environ["V2_CANDIDATE_RANKING"] = "1" if ranking else "0"
+    before = fake.snapshot()
+    latencies, saved, seconds = [], 0, 0.0
+    for index in range(args.requests):
+        start = time.perf_counter()
+        response = await client.post(
+            f"/api/v1/generate-program-v2?batch={'true' if batch else 'false'}",
+            json=program_request(index + (1000 if ranking else 0), args)
+        )
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        candidates = response.json()["metadata"].get("candidates") or {}
+        saved += candidates.get("prompt_tokens_saved", 0)
+        seconds += candidates.get("prompt_eval_seconds_saved", 0.0)
+    delta = {key: value - before[key] for key, value in fake.snapshot().items()}
+    tokens = delta["prompt_tokens"] - delta["prompt_tokens_cached"]
+    latencies.sort()
+    return {
+        "prompt_tokens": tokens / args.requests,
+        "prompt_seconds": tokens / PROFILES[args.profile].prompt_rate / args.requests,
+        "cpu_seconds": tokens / PROFILES["cpu"].prompt_rate / args.requests,
+        "p50": percentile(latencies, 50),
+        "saved": saved / args.requests,
+        "seconds_saved": seconds / args.requests
+    }
+
+def ranking_cost(args, rng: random.Random) -> float:
+    """
+    Temps du pré-classement seul pour une destination de --days jours (candidates de tous les jours)
+    """
+    start = date(2024, 6, 1)
+    rows = supabase_rows("Rome", args.supabase, rng)
+    products = viator_products("Rome", args.viator, start, args.days, rows, rng)
+    by_day = {
+        start + timedelta(days=offset): rows + [p for p in products if (start + timedelta(days=offset)).isoformat() in p["availableDates"]]
+        for offset in range(args.days)
+    }
+    ranker = CandidateRanker.from_env()
+    timings = []
+    for _ in range(20):
+        begin = time.perf_counter()
+        ranker.rank_days(by_day, "culture", args.daily_budget, ranker.top_k_for(args.days), RankingStats(), {})
+        timings.append(time.perf_counter() - begin)
+    return min(timings)
+
+async def main(args):
+    import main as app_module
+
+    rng = random.Random(args.seed)
+    start = date(2024, 6, 1)
+    total_days = args.cities * args.days
+    rows = {city: supabase_rows(city, args.supabase, rng) for city, _ in CITIES}
+    products = {city: viator_products(city, args.viator, start, total_days, rows[city], rng) for city, _ in CITIES}
+
+    def supabase(path, params, body):
+        return 200, [row for row in rows.get(params["destination"], []) if row["cost"] <= float(params["max_budget"])]
+
+    def viator(path, params, body):
+        return 200, {"products": products.get(params["destId"], [])}
+
+    fake = FakeOllama(profile=PROFILES[args.profile], seed=args.seed)
+    routes = {("GET", "/activities"): supabase, ("GET", "/products"): viator}
+    with run_fake_ollama(fake) as ollama, run_standin_server(routes) as external:
+        os.environ.update(
+            OLLAMA_BACKENDS=ollama.base_url,
+            OLLAMA_BACKEND_CONCURRENCY="0",
+            LLM_CACHE_SIZE="0",
+            LLM_CACHE_PATH="",
+            SESSION_STORE="memory",
+            OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "benchmark"),
+            SUPABASE_URL=external.base_url, SUPABASE_KEY="benchmark",
+            # Faux Supabase sans table à synchroniser : requêtes distantes, sans catalogue local
+            ACTIVITY_CATALOG="0",
+            # Chaque requête interroge les faux services (pas de réponse en cache entre les modes)
+            EXTERNAL_CACHE_SIZE="0",
+            VIATOR_API_KEY="benchmark", VIATOR_API_URL=external.base_url
+        )
+        async with app_module.app.router.lifespan_context(app_module.app):
+            transport = httpx.ASGITransport(app=app_module.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+                print(f"{args.requests} requêtes de {args.cities} villes × {args.days} jours, {args.supabase} activités "
+                      f"Supabase et {args.viator} produits Viator par ville, budget {args.daily_budget:.0f} €/jour, "
+                      f"profil {args.profile}")
+                for batch in (True, False):
+                    results = {ranking: await run_mode(client, fake, ranking, batch, args) for ranking in (False, True)}
+                    off, on = results[False], results[True]
+                    print(f"Sélection {'groupée' if batch else 'par jour'} (par requête)")
+                    print(f"   tokens de prompt évalués : {off['prompt_tokens']:9.0f} sans, {on['prompt_tokens']:9.0f} avec "
+                          f"({100 * (1 - on['prompt_tokens'] / off['prompt_tokens']):.0f} % en moins)")
+                    print(f"   évaluation du prompt     : {off['prompt_seconds']:9.2f} s sans, {on['prompt_seconds']:9.2f} s avec "
+                          f"(profil {args.profile}) ; {off['cpu_seconds']:.0f} s -> {on['cpu_seconds']:.0f} s au profil cpu")
+                    print(f"   latence p50              : {off['p50'] * 1000:9.1f} ms sans, {on['p50'] * 1000:9.1f} ms avec")
+                    print(f"   estimation de l'API      : ~{on['saved']:.0f} tokens évités, ~{on['seconds_saved']:.2f} s "
+                          f"au débit observé (metadata.candidates)")
+    print(f"Pré-classement seul : {ranking_cost(args, rng) * 1000:.2f} ms pour une destination de {args.days} jours")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=4)
+    parser.add_argument("--cities", type=int, default=2)
+    parser.add_argument("--days", type=int, default=5)
+    parser.add_argument("--supabase", type=int, default=30, help="activités Supabase par ville")
+    parser.add_argument("--viator", type=int, default=60, help="produits Viator par ville")
+    parser.add_argument("--daily-budget", type=float, default=150.0)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="fast")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
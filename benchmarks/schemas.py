@@ -0,0 +1,192 @@
+"""
+Micro-benchmark des schémas de réponse sur un programme de --cities villes × --days jours
+(3 activités par jour), sans LLM : chaque étape est mesurée avant / après.
+
+1. activités : Activity avec __init__ surchargé (ancienne version), objet par objet, contre
+   validation de la liste entière (ACTIVITY_LIST) ;
+2. plan complet : DayPlan / DestinationPlan / TravelProgram construits et validés un à un, contre
+   jours validés en un appel (DAY_PLAN_LIST) et assemblage sans revalidation (model_construct) ;
+3. réponse : chemin par défaut de FastAPI (revalidation contre response_model, jsonable puis
+   json.dumps) contre ModelResponse (model_dump_json) ;
+4. prompt de sélection : candidates en json.dumps(indent=2) contre JSON compact (orjson).
+
+Usage : python -m benchmarks.schemas [--cities 5] [--days 30] [--repeat 20]
+"""
+from typing import Any, Callable, Dict, List, Optional
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from schemas.response import Activity, DayPlan, DestinationPlan, TravelProgram, ACTIVITY_LIST, DAY_PLAN_LIST
+from utils.serialization import ModelResponse, compact_json
+from datetime import date, datetime, timedelta
+import argparse
+import asyncio
+import gc
+import random
+import json
+import time
+
+CATEGORIES = ("culture", "nature", "gastronomie", "aventure", "détente")
+
+class LegacyActivity(Activity):
+    """
+    Activity avant le déplacement des valeurs par défaut dans le schéma (__init__ surchargé)
+    """
+    description: Optional[str] = None
+    location: Optional[str] = None
+
+    def __init__(self, **data):
+        if "description" not in data:
+            data["description"] = data.get("name", "")
+        if "location" not in data:
+            data["location"] = "Non spécifié"
+        super().__init__(**data)
+
+def llm_days(days: int, city: str, rng: random.Random) -> List[Dict[str, Any]]:
+    """
+    Jours tels que renvoyés par le LLM (réponse structurée du planner)
+    """
+    return [
+        {
+            "activities": [
+                {
+                    "name": f"Activité {day}-{slot} à {city}",
+                    "description": "Activité adaptée au style et au budget du voyage.",
+                    "duration_hours": rng.choice((1.0, 1.5, 2.0, 3.0)),
+                    "cost": float(rng.randint(0, 80)),
+                    "location": "Centre-ville",
+                    "category": rng.choice(CATEGORIES)
+                }
+                for slot in range(3)
+            ],
+            "meals": ["Petit-déjeuner", "Déjeuner", "Dîner"]
+        }
+        for day in range(days)
+    ]
+
+def _day_dicts(raw_days: List[Dict[str, Any]], start: date, city: str) -> List[Dict[str, Any]]:
+    return [
+        {
+            "date": start + timedelta(days=offset),
+            "activities": [
+                {
+                    "name": act.get("name", "Activité non spécifiée"),
+                    "description": act.get("description", act.get("name", "Activité non spécifiée")),
+                    "duration_hours": act.get("duration_hours", 1.0),
+                    "cost": act.get("cost", 0.0),
+                    "location": act.get("location", city),
+                    "category": act.get("category", "général")
+                }
+                for act in day.get("activities", [])
+            ],
+            "meals": day.get("meals", []),
+            "notes": day.get("notes")
+        }
+        for offset, day in enumerate(raw_days)
+    ]
+
+def build_before(responses: Dict[str, List[Dict[str, Any]]], start: date, activity_cls=Activity) -> TravelProgram:
+    plans = []
+    for city, raw_days in responses.items():
+        day_plans = []
+        current = start
+        for day in raw_days:
+            activities = []
+            for act in day.get("activities", []):
+                activities.append(activity_cls(
+                    name=act.get("name", "Activité non spécifiée"),
+                    description=act.get("description", act.get("name", "Activité non spécifiée")),
+                    duration_hours=float(act.get("duration_hours", 1.0)),
+                    cost=float(act.get("cost", 0.0)),
+                    location=act.get("location", city),
+                    category=act.get("category", "général")
+                ))
+            day_plans.append(DayPlan(date=current, activities=activities, meals=day.get("meals", []), notes=day.get("notes")))
+            current += timedelta(days=1)
+        plans.append(DestinationPlan(city=city, country="Pays", days=day_plans, accommodations=[], transportation=[]))
+    return TravelProgram(destinations=plans, total_cost=0.0, generated_at=datetime.now().isoformat(), metadata={})
+
+def build_after(responses: Dict[str, List[Dict[str, Any]]], start: date) -> TravelProgram:
+    plans = [
+        DestinationPlan.model_construct(
+            city=city, country="Pays", days=DAY_PLAN_LIST.validate_python(_day_dicts(raw_days, start, city)),
+            accommodations=[], transportation=[]
+        )
+        for city, raw_days in responses.items()
+    ]
+    return TravelProgram.model_construct(destinations=plans, total_cost=0.0, generated_at=datetime.now().isoformat(), metadata={})
+
+def best(func: Callable[[], Any], repeat: int) -> float:
+    """
+    Meilleur temps sur repeat exécutions, ramasse-miettes désactivé (comme timeit)
+    """
+    timings = []
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    return min(timings)
+
+def _line(label: str, before: float, after: float, unit: str = "ms"):
+    scale = 1000 if unit == "ms" else 1e6
+    print(f"   {label:<28} avant {before * scale:9.2f} {unit}   après {after * scale:9.2f} {unit}   x{before / after:5.1f}")
+
+def main(args):
+    rng = random.Random(args.seed)
+    start = date(2024, 6, 1)
+    responses = {f"Ville{index}": llm_days(args.days, f"Ville{index}", rng) for index in range(args.cities)}
+    raw_activities = [act for raw_days in responses.values() for day in raw_days for act in day["activities"]]
+    print(f"Programme de {args.cities} villes × {args.days} jours, {len(raw_activities)} activités (meilleur de {args.repeat})")
+
+    print("1. Activités")
+    legacy = best(lambda: [LegacyActivity(**act) for act in raw_activities], args.repeat)
+    one_by_one = best(lambda: [Activity(**act) for act in raw_activities], args.repeat)
+    bulk = best(lambda: ACTIVITY_LIST.validate_python(raw_activities), args.repeat)
+    _line("__init__ surchargé / liste", legacy, bulk)
+    _line("objet par objet / liste", one_by_one, bulk)
+
+    print("2. Plan complet (jours, destinations, programme)")
+    before = best(lambda: build_before(responses, start, LegacyActivity), args.repeat)
+    after = best(lambda: build_after(responses, start), args.repeat)
+    _line("construction", before, after)
+    same = build_before(responses, start).model_dump(exclude={"generated_at"}) == build_after(responses, start).model_dump(exclude={"generated_at"})
+    assert same, "programmes différents"
+
+    print("3. Réponse HTTP")
+    program = build_after(responses, start)
+    field = create_response_field("Response_generate_travel_program", TravelProgram)
+    loop = asyncio.new_event_loop()
+
+    def fastapi_default() -> bytes:
+        content = loop.run_until_complete(serialize_response(field=field, response_content=program, is_coroutine=True))
+        return JSONResponse(content).body
+
+    def model_response() -> bytes:
+        return ModelResponse(program).body
+
+    before_body, after_body = fastapi_default(), model_response()
+    assert json.loads(before_body) == json.loads(after_body), "corps de réponse différents"
+    _line("sérialisation", best(fastapi_default, args.repeat), best(model_response, args.repeat))
+    print(f"   taille : {len(before_body)} o avant, {len(after_body)} o après (corps identiques une fois décodés)")
+    loop.close()
+
+    print("4. Prompt de sélection (candidates d'une journée)")
+    candidates = raw_activities[:args.candidates]
+    indented, compact = json.dumps(candidates, indent=2), compact_json(candidates)
+    _line("encodage", best(lambda: json.dumps(candidates, indent=2), args.repeat * 10),
+          best(lambda: compact_json(candidates), args.repeat * 10), unit="µs")
+    print(f"   {len(candidates)} candidates : {len(indented)} caractères avant, {len(compact)} après "
+          f"({100 * (1 - len(compact) / len(indented)):.0f} % de prompt en moins, ~{(len(indented) - len(compact)) // 4} tokens)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cities", type=int, default=5)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--candidates", type=int, default=40, help="activités candidates du prompt de sélection")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=3)
+    main(parser.parse_args())
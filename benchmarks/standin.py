@@ -0,0 +1,118 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Tuple, Optional, Iterator
+from urllib.parse import urlparse, parse_qs
+import threading
+import socket
+import sys
+import json
+
+# Une route renvoie (code HTTP, corps JSON) à partir du chemin, des paramètres et du corps de la requête ;
+# un itérateur de dictionnaires comme corps produit une réponse NDJSON streamée
+Route = Callable[[str, Dict[str, Any], Optional[Dict[str, Any]]], Tuple[int, Any]]
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Serveur HTTP local (keep-alive HTTP/1.1) qui remplace Ollama, Supabase ou Viator pendant les benchmarks
+    """
+    daemon_threads = True
+
+    def __init__(self, routes: Dict[Tuple[str, str], Route]):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.routes = routes
+        self.connections = 0
+        self.requests = 0
+        self.aborted = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle_error(self, request, client_address):
+        # Un client qui abandonne sa requête (annulation) n'est pas une erreur du serveur
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def count(self, connection: bool = False, aborted: bool = False):
+        with self._lock:
+            if aborted:
+                self.aborted += 1
+            elif connection:
+                self.connections += 1
+            else:
+                self.requests += 1
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # Évite les 40 ms de Nagle/ACK retardé entre l'en-tête et le corps de la réponse
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.count(connection=True)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _dispatch(self, method: str):
+        self.server.count()
+        parsed = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        body = None
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            body = json.loads(self.rfile.read(length))
+        route = self.server.routes.get((method, parsed.path))
+        if route is None:
+            status, payload = 404, {"error": "not found"}
+        else:
+            status, payload = route(parsed.path, params, body)
+        if isinstance(payload, Iterator):
+            self._stream(status, payload)
+            return
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, status: int, chunks: Iterator):
+        """
+        Réponse NDJSON en transfert chunked (mode "stream" d'Ollama)
+        """
+        self.send_response(status)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for chunk in chunks:
+                line = json.dumps(chunk).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            self.wfile.write(b"0\r\n\r\n")
+        except ConnectionError:
+            # Client déconnecté : on arrête de générer
+            self.server.count(aborted=True)
+            self.close_connection = True
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+@contextmanager
+def run_standin_server(routes: Dict[Tuple[str, str], Route]):
+    """
+    Démarre le serveur dans un thread et l'arrête à la sortie du bloc
+    """
+    server = StandInServer(routes)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1,12 +1,75 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from routers import generator, chat
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
+from routers import generator, chat, jobs
+from agents.router import RouterAgent
+from agents.manager import AgentManager, CHAT_SYSTEM_MESSAGE
+from agents.planner import PLAN_SYSTEM_MESSAGE
+from utils.llm import LLMService
+from utils.backends import BackendPool
+from utils.scheduler import LLMOverloaded
+from utils.services import ExternalServices
+from utils.http import create_http_client
+from utils.cache import LLMResponseCache
+from utils.sessions import create_session_store
+from utils.jobs import JobRunner
+from utils.warmup import Warmup
+from utils.metrics import REGISTRY, MetricsMiddleware, service_families
 import os
 
+# Messages système évalués au démarrage (cache KV d'Ollama) : chat, puis premier appel de toute génération
+WARMUP_SYSTEM_MESSAGES = (CHAT_SYSTEM_MESSAGE, PLAN_SYSTEM_MESSAGE)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Construit les services partagés au démarrage et libère le pool HTTP à l'arrêt
+    """
+    http_client = create_http_client()
+    llm_cache = LLMResponseCache.from_env()
+    # Serveurs Ollama (OLLAMA_BACKENDS) et leurs contrôles de santé en tâche de fond
+    backend_pool = BackendPool.from_env(client=http_client)
+    backend_pool.start()
+    llm_service = LLMService(client=http_client, cache=llm_cache, pool=backend_pool)
+    # Chargement du modèle et des messages système en tâche de fond ; /ready répond 503 jusque-là
+    warmup = Warmup.from_env(llm_service, WARMUP_SYSTEM_MESSAGES)
+    warmup.start()
+    app.state.warmup = warmup
+    app.state.http_client = http_client
+    app.state.llm_service = llm_service
+    app.state.router_agent = RouterAgent(llm_service)
+    session_store = create_session_store()
+    app.state.agent_manager = AgentManager(llm_service, session_store)
+    external_services = ExternalServices(client=http_client)
+    # Copie locale du catalogue d'activités Supabase, synchronisée en tâche de fond
+    external_services.start()
+    app.state.external_services = external_services
+    # Travaux de génération asynchrones (file bornée, stockage SQLite local)
+    job_runner = JobRunner.from_env(
+        jobs.job_handlers(app.state.router_agent, llm_service, app.state.external_services)
+    )
+    await job_runner.start()
+    app.state.job_runner = job_runner
+    try:
+        yield
+    finally:
+        await warmup.close()
+        await job_runner.close()
+        await external_services.close()
+        await backend_pool.close()
+        await http_client.aclose()
+        if llm_cache is not None:
+            await llm_cache.close()
+        session_store.close()
+
 app = FastAPI(
     title="Odys.ai Travel API",
     description="API de génération de programmes de voyage IA",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # Réponses JSON encodées par orjson
+    default_response_class=ORJSONResponse
 )
 
 # Configuration CORS
@@ -17,16 +80,85 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Latence par route et requêtes en cours (/metrics)
+app.add_middleware(MetricsMiddleware)
 
 # Inclusion des routers
 app.include_router(generator.router, prefix="/api/v1", tags=["generator"])
 app.include_router(chat.router, prefix="/api/v1", tags=["chat"])
+app.include_router(jobs.router, prefix="/api/v1", tags=["jobs"])
+
+@app.exception_handler(LLMOverloaded)
+async def llm_overloaded_handler(request: Request, exc: LLMOverloaded):
+    """
+    Requête refusée à l'admission : 503 immédiat, le client réessaie après Retry-After secondes
+    """
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc), "priority": exc.priority, "reason": exc.reason, "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 @app.get("/")
 async def root():
     return {"message": "Bienvenue sur l'API Odys.ai Travel"}
 
+@app.get("/health")
+async def health():
+    """
+    Processus vivant (contrôle de santé de la plateforme) : ne dépend ni d'Ollama ni des sources externes
+    """
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready(request: Request):
+    """
+    Prêt à recevoir du trafic : services construits et modèle chargé sur au moins un backend Ollama
+    (503 sinon, tant que le démarrage n'est pas terminé)
+    """
+    warmup = request.app.state.warmup
+    return JSONResponse(warmup.status(), status_code=200 if warmup.ready else 503)
+
+@app.get("/status/external")
+async def external_status(request: Request):
+    """
+    État des sources externes (disjoncteurs, caches, requêtes fusionnées)
+    """
+    return request.app.state.external_services.status()
+
+@app.get("/status/ollama")
+async def ollama_status(request: Request):
+    """
+    État des backends Ollama : santé, appels en cours, limite de concurrence, modèles installés et chargés
+    """
+    return request.app.state.llm_service.pool.status()
+
+@app.get("/status/jobs")
+async def jobs_status(request: Request):
+    """
+    Travaux de génération de ce worker : en cours, en file, durée moyenne, compteurs
+    """
+    return request.app.state.job_runner.status()
+
+@app.get("/status/llm")
+async def llm_status(request: Request):
+    """
+    Ordonnanceur des appels LLM : appels en cours et en file par classe de priorité, attente estimée,
+    durée moyenne d'un appel, requêtes admises et refusées
+    """
+    return request.app.state.llm_service.scheduler.status()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    """
+    Métriques au format Prometheus : appels, tokens et durées Ollama par agent, latence HTTP par route,
+    caches, analyse JSON, disjoncteurs et requêtes en cours
+    """
+    state = request.app.state
+    body = REGISTRY.render(service_families(state.llm_service, state.agent_manager, state.external_services, state.warmup))
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=port)
@@ -1,16 +1,12 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Query
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
 from agents.manager import AgentManager
-from utils.llm import LLMService
+from routers.dependencies import get_agent_manager
 import uuid
 
 router = APIRouter()
 
-# Initialisation des services
-llm_service = LLMService()
-agent_manager = AgentManager(llm_service)
-
 class ChatMessage(BaseModel):
     message: str
     session_id: Optional[str] = None
@@ -21,39 +17,51 @@ class ChatResponse(BaseModel):
     session_id: str
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(message: ChatMessage):
+async def chat(message: ChatMessage, agent_manager: AgentManager = Depends(get_agent_manager)):
     """
     Endpoint pour interagir avec l'agent manager via le chat
     """
-    try:
-        # Générer un nouveau session_id si non fourni
-        session_id = message.session_id or str(uuid.uuid4())
-        
-        # Traiter le message
-        response = await agent_manager.process_message(
-            session_id=session_id,
-            message=message.message,
-            context=message.context
-        )
-        
-        return ChatResponse(
-            response=response,
-            session_id=session_id
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erreur lors du traitement du message : {str(e)}"
-        )
+    # Classe interactive : servie avant les générations de programme en cours
+    with agent_manager.llm_service.priority("interactive"):
+        try:
+            # Générer un nouveau session_id si non fourni
+            session_id = message.session_id or str(uuid.uuid4())
+
+            # Traiter le message
+            response = await agent_manager.process_message(
+                session_id=session_id,
+                message=message.message,
+                context=message.context
+            )
+
+            return ChatResponse(
+                response=response,
+                session_id=session_id
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Erreur lors du traitement du message : {str(e)}"
+            )
 
 @router.get("/chat/history/{session_id}")
-async def get_chat_history(session_id: str):
+async def get_chat_history(
+    session_id: str,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Nombre maximal de messages (tout l'historique si absent)"),
+    agent_manager: AgentManager = Depends(get_agent_manager)
+):
     """
-    Récupère l'historique des conversations pour une session donnée
+    Récupère l'historique des conversations pour une session donnée, page par page avec offset/limit
     """
     try:
-        history = agent_manager.get_conversation_history(session_id)
-        return {"history": history}
+        history = await agent_manager.get_conversation_history(session_id, offset, limit)
+        return {
+            "history": history,
+            "total": await agent_manager.sessions.count(session_id),
+            "offset": offset,
+            "limit": limit
+        }
     except Exception as e:
         raise HTTPException(
             status_code=500,
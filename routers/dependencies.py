@@ -0,0 +1,23 @@
+from fastapi import Request
+from agents.router import RouterAgent
+from agents.manager import AgentManager
+from utils.llm import LLMService
+from utils.services import ExternalServices
+from utils.jobs import JobRunner
+
+# Les services sont construits une seule fois par le lifespan (main.py) et stockés dans app.state
+
+def get_llm_service(request: Request) -> LLMService:
+    return request.app.state.llm_service
+
+def get_router_agent(request: Request) -> RouterAgent:
+    return request.app.state.router_agent
+
+def get_agent_manager(request: Request) -> AgentManager:
+    return request.app.state.agent_manager
+
+def get_external_services(request: Request) -> ExternalServices:
+    return request.app.state.external_services
+
+def get_job_runner(request: Request) -> JobRunner:
+    return request.app.state.job_runner
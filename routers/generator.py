@@ -1,113 +1,220 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 from schemas.request import TravelRequest, ProgramRequest
-from schemas.response import TravelProgram, ProgramResponse, Activity
+from schemas.response import TravelProgram, ProgramResponse, DestinationPlan, ACTIVITY_LIST
+from schemas.structured import ACTIVITIES_RESPONSE_SCHEMA, day_activities_response_schema
 from agents.router import RouterAgent
-from utils.llm import LLMService
+from utils.llm import LLMService, structured_system_message
+from utils.scheduler import LLMOverloaded
+from utils.jobs import ProgressCallback
 from utils.services import ExternalServices
-from datetime import datetime, timedelta
+from utils.ranking import CandidateRanker, RankingStats, name_key
+from utils.context import estimate_tokens
+from utils.serialization import ModelResponse, compact_json, dumps
+from routers.dependencies import get_llm_service, get_router_agent, get_external_services
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Literal, Optional
+import logging
+import time
 import os
-import json
 import traceback
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Tokens de sortie prévus par jour dans un prompt de sélection groupé (3 activités enrichies)
+BATCH_TOKENS_PER_DAY = 300
+
+# Consignes fixes des prompts de sélection, en message système (préfixe réutilisé par le cache KV
+# d'Ollama) ; la destination, les critères et les candidates suivent dans le prompt
+GENERATE_ACTIVITIES_SYSTEM_MESSAGE = structured_system_message(
+    "Génère 3 activités pour la destination et la date de la demande, adaptées à son style et à son budget."
+)
+SELECT_ACTIVITIES_SYSTEM_MESSAGE = structured_system_message(
+    "Sélectionne et enrichis 3 activités parmi les activités candidates de la demande, "
+    "selon son style, son budget par jour et sa date."
+)
+BATCH_SELECTION_SYSTEM_MESSAGE = structured_system_message("""
+Sélectionne et enrichis 3 activités par jour pour la destination de la demande, parmi les activités
+disponibles tous les jours et celles propres à chaque jour. Si aucune activité n'est disponible pour
+un jour, propose 3 activités.
+Critères : style et budget par jour de la demande, pas deux fois la même activité sur le séjour.
+Réponds avec une entrée par jour dans "days" (champ "date" au format AAAA-MM-JJ).
+""")
 
-# Initialisation des services
-llm_service = LLMService()
-router_agent = RouterAgent(llm_service)
-external_services = ExternalServices()
+router = APIRouter()
 
 @router.post("/generate-program", response_model=TravelProgram)
-async def generate_travel_program(request: TravelRequest):
+async def generate_travel_program(
+    request: TravelRequest,
+    stream: bool = Query(False, description="Renvoie le programme en NDJSON, une destination par ligne"),
+    mode: Optional[Literal["pipeline", "fused"]] = Query(None, description="Mode de génération (défaut : AGENT_GENERATION_MODE)"),
+    deadline: Optional[float] = Query(None, ge=0, le=3600, description="Échéance (s) de la génération, 0 pour aucune (défaut : GENERATION_DEADLINE_SECONDS)"),
+    router_agent: RouterAgent = Depends(get_router_agent)
+):
     """
-    Génère un programme de voyage personnalisé basé sur les critères fournis
+    Génère un programme de voyage personnalisé basé sur les critères fournis.
+    À l'échéance, le programme est renvoyé avec les étapes terminées, les autres remplacées
+    par leur repli (metadata.partial, metadata.degraded_stages).
     """
-    try:
-        # Vérification de la clé API
-        if not os.getenv("OPENAI_API_KEY"):
+    # Génération de masse : passe après le chat, refusée (503) si la file est saturée
+    with router_agent.llm_service.priority("bulk"):
+        try:
+            # Vérification de la clé API
+            if not os.getenv("OPENAI_API_KEY"):
+                raise HTTPException(
+                    status_code=500,
+                    detail="La clé API OpenAI n'est pas configurée"
+                )
+
+            if stream:
+                return StreamingResponse(
+                    _stream_travel_program(request, router_agent, mode, deadline),
+                    media_type="application/x-ndjson"
+                )
+
+            # Génération du programme (sérialisé tel quel, sans revalidation par FastAPI)
+            program = await router_agent.generate_travel_program(request, mode, deadline=deadline)
+            return ModelResponse(program)
+
+        except Exception as e:
             raise HTTPException(
                 status_code=500,
-                detail="La clé API OpenAI n'est pas configurée"
+                detail=f"Erreur lors de la génération du programme: {str(e)}"
             )
 
-        # Génération du programme
-        program = await router_agent.generate_travel_program(request)
-        return program
+async def _stream_travel_program(
+    request: TravelRequest,
+    router_agent: RouterAgent,
+    mode: Optional[str] = None,
+    deadline: Optional[float] = None
+):
+    """
+    Une ligne {"type": "destination"} par destination terminée, puis une ligne {"type": "summary"}
+    avec le coût total et les métadonnées (ou {"type": "error"} en cas d'échec)
+    """
+    total_cost = 0.0
+    completed = 0
+    deadline = router_agent.deadline_seconds if deadline is None else deadline
+    degraded: List[Dict[str, Any]] = []
+    plans = router_agent.iter_destination_plans(request, mode, deadline, degraded)
+    # Le flux est lu après le retour de l'endpoint : la classe est rétablie ici (déjà admise)
+    with router_agent.llm_service.priority("bulk", admit=False):
+        try:
+            async for index, plan in plans:
+                total_cost += RouterAgent.plan_cost(plan)
+                completed += 1
+                line = {"type": "destination", "index": index, "destination": plan.model_dump()}
+                yield dumps(line) + b"\n"
+            summary = {
+                "type": "summary",
+                "total_cost": total_cost,
+                "currency": "EUR",
+                "generated_at": datetime.now().isoformat(),
+                "version": "1.0",
+                "metadata": {
+                    "destinations_count": completed,
+                    **RouterAgent.program_metadata(mode or router_agent.generation_mode, deadline, degraded)
+                }
+            }
+            yield dumps(summary) + b"\n"
+        except Exception as e:
+            error = {"type": "error", "detail": f"Erreur lors de la génération du programme: {str(e)}"}
+            yield dumps(error) + b"\n"
+        finally:
+            await plans.aclose()
+
+@router.post("/generate-program-v2", response_model=ProgramResponse)
+async def generate_program(
+    request: ProgramRequest,
+    batch: Optional[bool] = Query(None, description="Un prompt de sélection par destination plutôt que par jour (défaut : V2_BATCH_SELECTION)"),
+    router_agent: RouterAgent = Depends(get_router_agent),
+    llm_service: LLMService = Depends(get_llm_service),
+    external_services: ExternalServices = Depends(get_external_services)
+):
+    """
+    Nouvelle version de la génération de programme avec orchestration des services externes
+    """
+    try:
+        # Génération de masse : passe après le chat, refusée (503) si la file est saturée
+        with llm_service.priority("bulk"):
+            return ModelResponse(await build_program_v2(request, batch, router_agent, llm_service, external_services))
 
+    except LLMOverloaded:
+        raise
     except Exception as e:
+        print(traceback.format_exc())
         raise HTTPException(
             status_code=500,
             detail=f"Erreur lors de la génération du programme: {str(e)}"
         )
 
-@router.post("/generate-program-v2", response_model=ProgramResponse)
-async def generate_program(request: ProgramRequest):
+async def build_program_v2(
+    request: ProgramRequest,
+    batch: Optional[bool],
+    router_agent: RouterAgent,
+    llm_service: LLMService,
+    external_services: ExternalServices,
+    on_progress: Optional[ProgressCallback] = None
+) -> ProgramResponse:
     """
-    Nouvelle version de la génération de programme avec orchestration des services externes
+    Pipeline de /generate-program-v2 (également exécuté par les travaux asynchrones) ;
+    on_progress(étape, ville, étapes terminées, étapes au total) suit l'avancement
     """
-    try:
+    if batch is None:
+        batch = os.getenv("V2_BATCH_SELECTION", "1") != "0"
+    ranker = CandidateRanker.from_env()
+    ranking = RankingStats()
+    start = time.perf_counter()
+
+    # Étapes : itinéraire, puis activités, hébergement (et transports) par destination
+    total_steps = 1 + len(request.destinations) * (3 if request.type == "multi" else 2)
+    completed = 0
+
+    def progress(stage: str, destination: Optional[str] = None):
+        nonlocal completed
+        completed += 1
+        if on_progress is not None:
+            on_progress(stage, destination, completed, total_steps)
+
+    with llm_service.track_calls() as llm_calls:
         # 1. Génération de l'itinéraire de base
-        itinerary = await router_agent.planner.create_itinerary(request)
-        
+        plans = await router_agent.planner.create_itinerary(request, router_agent.max_concurrency)
+        itinerary = {"destinations": [_destination_dict(plan) for plan in plans]}
+        progress("plan")
+        daily_budget = request.budget / sum(d.duration_days for d in request.destinations)
+
+        # Activités externes de toutes les destinations : une requête Supabase et une requête Viator
+        # par destination, destinations interrogées en parallèle, répartition par jour en local
+        external_activities = await external_services.get_activities_for_destinations(
+            [
+                (destination["name"], {day["date"]: daily_budget for day in destination["days"]})
+                for destination in itinerary["destinations"]
+            ],
+            request.mood
+        )
+
         # 2. Enrichissement des activités pour chaque destination
-        for destination in itinerary["destinations"]:
-            # Calcul du budget par jour pour cette destination
+        for destination, activities_by_day in zip(itinerary["destinations"], external_activities):
             days_count = len(destination["days"])
-            daily_budget = request.budget / sum(d.duration_days for d in request.destinations)
-            
-            # Pour chaque jour
-            for day in destination["days"]:
-                # Récupération des activités depuis les sources externes
-                supabase_activities = await external_services.get_supabase_activities(
-                    destination["name"],
-                    request.mood,
-                    daily_budget
+            # Lien de réservation et source des candidates retenues, par nom (non envoyés au LLM)
+            details: Dict[Any, Dict[str, Any]] = {}
+            if ranker.enabled:
+                activities_by_day = _rank_candidates(
+                    ranker, ranking, llm_service, destination, activities_by_day, request.mood, daily_budget, batch, details
                 )
-                
-                viator_activities = await external_services.get_viator_activities(
-                    destination["name"],
-                    day["date"]
+
+            if batch:
+                # Un seul prompt pour tous les jours de la destination
+                await _select_destination_activities(
+                    llm_service, destination, activities_by_day, request.mood, daily_budget, details
                 )
-                
-                # Fusion des activités
-                all_activities = supabase_activities + viator_activities
-                
-                # Si pas d'activités trouvées, on utilise le LLM pour en générer
-                if not all_activities:
-                    prompt = f"""
-                    Génère 3 activités pour {destination["name"]} le {day["date"]}
-                    Style: {request.mood}
-                    Budget: {daily_budget}
-                    """
-                    llm_activities = await llm_service.generate_structured_response(prompt)
-                    all_activities = llm_activities.get("activities", [])
-                
-                # Sélection et enrichissement des activités via LLM
-                if all_activities:
-                    prompt = f"""
-                    Sélectionne et enrichis 3 activités parmi la liste suivante pour {destination["name"]}:
-                    {json.dumps(all_activities, indent=2)}
-                    
-                    Critères:
-                    - Style: {request.mood}
-                    - Budget par jour: {daily_budget}
-                    - Date: {day["date"]}
-                    """
-                    
-                    selected_activities = await llm_service.generate_structured_response(prompt)
-                    day["activities"] = [
-                        Activity(
-                            name=act["name"],
-                            description=act["description"],
-                            duration_hours=act["duration_hours"],
-                            cost=act["cost"],
-                            location=act["location"],
-                            category=act["category"],
-                            booking_url=act.get("booking_url"),
-                            source=act.get("source", "llm")
-                        )
-                        for act in selected_activities.get("activities", [])
-                    ]
-            
+            else:
+                for day in destination["days"]:
+                    await _select_day_activities(
+                        llm_service, destination["name"], day, activities_by_day[day["date"]], request.mood, daily_budget, details
+                    )
+            progress("activities", destination["name"])
+
             # 3. Ajout de l'hébergement
             lodging = await external_services.find_lodging(
                 destination["name"],
@@ -116,7 +223,8 @@ async def generate_program(request: ProgramRequest):
                 daily_budget * days_count
             )
             destination["accommodation"] = lodging
-            
+            progress("accommodations", destination["name"])
+
             # 4. Ajout des transports
             if request.type == "multi":
                 # Transport d'arrivée
@@ -126,7 +234,7 @@ async def generate_program(request: ProgramRequest):
                     destination["start_date"]
                 )
                 destination["transport_in"] = transport_in
-                
+
                 # Transport de départ
                 transport_out = await external_services.find_transport(
                     destination["name"],
@@ -134,51 +242,295 @@ async def generate_program(request: ProgramRequest):
                     destination["end_date"]
                 )
                 destination["transport_out"] = transport_out
-        
-        # 5. Calcul du coût total
-        total_cost = sum(
-            sum(act["cost"] for act in day["activities"])
-            for dest in itinerary["destinations"]
-            for day in dest["days"]
-        ) + sum(
-            dest["accommodation"]["price_per_night"] * len(dest["days"])
-            for dest in itinerary["destinations"]
+                progress("transportation", destination["name"])
+
+    # 5. Calcul du coût total
+    total_cost = sum(
+        sum(act["cost"] for act in day["activities"])
+        for dest in itinerary["destinations"]
+        for day in dest["days"]
+    ) + sum(
+        dest["accommodation"]["price_per_night"] * len(dest["days"])
+        for dest in itinerary["destinations"]
+    )
+
+    elapsed = time.perf_counter() - start
+    selection = "batch" if batch else "per_day"
+    logger.info(
+        "generate-program-v2 selection=%s appels_llm=%d hits_cache=%d temps_llm=%.2fs total=%.2fs "
+        "candidates=%d->%d tokens_prompt_evites=%d",
+        selection, llm_calls.calls, llm_calls.cache_hits, llm_calls.llm_seconds, elapsed,
+        ranking.received, ranking.kept, ranking.prompt_tokens_saved
+    )
+
+    # 6. Création de la réponse (destinations déjà construites : pas de revalidation)
+    return ProgramResponse.model_construct(
+        destinations=itinerary["destinations"],
+        total_cost=total_cost,
+        currency="EUR",
+        generated_at=datetime.now().isoformat(),
+        version="2.0",
+        metadata={
+            "sources_used": ["supabase", "viator", "llm"],
+            "activities_count": sum(
+                len(day["activities"])
+                for dest in itinerary["destinations"]
+                for day in dest["days"]
+            ),
+            "selection": selection,
+            "candidates": ranking.as_dict() if ranker.enabled else None,
+            "llm": llm_calls.as_dict(),
+            "latency_seconds": round(elapsed, 3)
+        }
+    )
+
+def _rank_candidates(
+    ranker: CandidateRanker,
+    ranking: RankingStats,
+    llm_service: LLMService,
+    destination: Dict[str, Any],
+    activities_by_day: Dict[date, List[Dict[str, Any]]],
+    mood: str,
+    daily_budget: float,
+    batch: bool,
+    details: Dict[Any, Dict[str, Any]]
+) -> Dict[date, List[Dict[str, Any]]]:
+    """
+    Pré-classement local des candidates de chaque jour (budget, mood, doublons, K meilleures
+    projetées) ; les tokens de prompt évités sont mesurés sur les prompts de sélection eux-mêmes
+    """
+    prompt_days = min(len(destination["days"]), _batch_max_days()) if batch else 1
+    ranked = ranker.rank_days(activities_by_day, mood, daily_budget, ranker.top_k_for(prompt_days), ranking, details)
+    saved = (
+        _selection_prompt_tokens(destination, activities_by_day, mood, daily_budget, batch)
+        - _selection_prompt_tokens(destination, ranked, mood, daily_budget, batch)
+    )
+    before = ranking.prompt_eval_seconds_saved
+    ranker.record_saved(ranking, saved, llm_service.prompt_seconds_per_token)
+    logger.info(
+        "Pré-classement %s : %d -> %d candidates sur %d jours, ~%d tokens de prompt évités (~%.2fs d'évaluation)",
+        destination["name"],
+        sum(len(candidates) for candidates in activities_by_day.values()),
+        sum(len(candidates) for candidates in ranked.values()),
+        len(ranked), max(0, saved), ranking.prompt_eval_seconds_saved - before
+    )
+    return ranked
+
+def _selection_prompt_tokens(
+    destination: Dict[str, Any],
+    activities_by_day: Dict[date, List[Dict[str, Any]]],
+    mood: str,
+    daily_budget: float,
+    batch: bool
+) -> int:
+    """
+    Tokens estimés des candidates dans les prompts de sélection d'une destination
+    """
+    if batch:
+        return sum(
+            estimate_tokens(_batched_selection_prompt(destination["name"], chunk, activities_by_day, mood, daily_budget))
+            for chunk in _batch_chunks(destination["days"])
         )
-        
-        # 6. Création de la réponse
-        return ProgramResponse(
-            destinations=itinerary["destinations"],
-            total_cost=total_cost,
-            currency="EUR",
-            generated_at=datetime.now().isoformat(),
-            version="2.0",
-            metadata={
-                "sources_used": ["supabase", "viator", "llm"],
-                "activities_count": sum(
-                    len(day["activities"])
-                    for dest in itinerary["destinations"]
-                    for day in dest["days"]
-                )
-            }
+    return sum(estimate_tokens(compact_json(activities_by_day[day["date"]])) for day in destination["days"])
+
+def _to_activities(
+    activities: List[Dict[str, Any]],
+    details: Optional[Dict[Any, Dict[str, Any]]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Activités renvoyées par le LLM, validées puis remises en dictionnaires en un appel à pydantic-core ;
+    une activité reprise d'une candidate pré-classée retrouve sa source et son lien de réservation
+    """
+    activities = ACTIVITY_LIST.dump_python(ACTIVITY_LIST.validate_python(activities))
+    if details:
+        for activity in activities:
+            candidate = details.get(name_key(activity["name"]))
+            if candidate is not None:
+                activity["source"] = candidate["source"]
+                activity["booking_url"] = activity["booking_url"] or candidate["booking_url"]
+    return activities
+
+async def _select_day_activities(
+    llm_service: LLMService,
+    destination_name: str,
+    day: Dict[str, Any],
+    all_activities: List[Dict[str, Any]],
+    mood: str,
+    daily_budget: float,
+    details: Optional[Dict[Any, Dict[str, Any]]] = None
+):
+    """
+    Sélection des activités d'un jour (jusqu'à deux appels LLM : génération puis sélection)
+    """
+    # Si pas d'activités trouvées, on utilise le LLM pour en générer
+    if not all_activities:
+        prompt = f"Destination : {destination_name}\nStyle : {mood}\nBudget : {daily_budget}\nDate : {day['date']}"
+        llm_activities = await llm_service.generate_structured_response(
+            prompt, GENERATE_ACTIVITIES_SYSTEM_MESSAGE, schema=ACTIVITIES_RESPONSE_SCHEMA, caller="generator.generate_activities"
         )
+        all_activities = llm_activities.get("activities", [])
 
-    except Exception as e:
-        print(traceback.format_exc())
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erreur lors de la génération du programme: {str(e)}"
+    # Sélection et enrichissement des activités via LLM
+    if all_activities:
+        # Candidates (souvent identiques d'un jour à l'autre) avant la date : seul le dernier
+        # segment diffère entre les jours d'une même destination
+        prompt = (
+            f"Destination : {destination_name}\n"
+            f"Style : {mood}\n"
+            f"Budget par jour : {daily_budget}\n"
+            f"Activités candidates :\n{compact_json(all_activities)}\n"
+            f"Date : {day['date']}"
+        )
+        selected_activities = await llm_service.generate_structured_response(
+            prompt, SELECT_ACTIVITIES_SYSTEM_MESSAGE, schema=ACTIVITIES_RESPONSE_SCHEMA, caller="generator.select_activities"
         )
+        day["activities"] = _to_activities(selected_activities.get("activities", []), details)
+
+async def _select_destination_activities(
+    llm_service: LLMService,
+    destination: Dict[str, Any],
+    activities_by_day: Dict[date, List[Dict[str, Any]]],
+    mood: str,
+    daily_budget: float,
+    details: Optional[Dict[Any, Dict[str, Any]]] = None
+):
+    """
+    Sélection groupée : un prompt structuré couvre tous les jours de la destination (par tranches
+    de V2_BATCH_MAX_DAYS jours) et renvoie les activités par date, redistribuées dans destination["days"].
+    Un jour absent de la réponse (sortie tronquée) repasse par la sélection par jour.
+    """
+    for chunk in _batch_chunks(destination["days"]):
+        dates = [day["date"].isoformat() for day in chunk]
+        result = await llm_service.generate_structured_response(
+            _batched_selection_prompt(destination["name"], chunk, activities_by_day, mood, daily_budget),
+            BATCH_SELECTION_SYSTEM_MESSAGE,
+            schema=day_activities_response_schema(dates),
+            max_tokens=max(llm_service.options["num_predict"], BATCH_TOKENS_PER_DAY * len(chunk)),
+            caller="generator.select_destination_activities"
+        )
+        selected = _activities_by_date(result)
+        for day, iso in zip(chunk, dates):
+            if iso in selected:
+                day["activities"] = _to_activities(selected[iso], details)
+            else:
+                await _select_day_activities(
+                    llm_service, destination["name"], day, activities_by_day[day["date"]], mood, daily_budget, details
+                )
+
+def _batch_max_days() -> int:
+    return int(os.getenv("V2_BATCH_MAX_DAYS", "7"))
+
+def _batch_chunks(days: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    Tranches de V2_BATCH_MAX_DAYS jours couvertes chacune par un prompt de sélection groupé
+    """
+    max_days = _batch_max_days()
+    return [days[offset:offset + max_days] for offset in range(0, len(days), max_days)]
+
+def _batched_selection_prompt(
+    destination_name: str,
+    days: List[Dict[str, Any]],
+    activities_by_day: Dict[date, List[Dict[str, Any]]],
+    mood: str,
+    daily_budget: float
+) -> str:
+    candidates = [activities_by_day[day["date"]] for day in days]
+    keys = [[compact_json(act, sort_keys=True) for act in day_candidates] for day_candidates in candidates]
+    # Les activités proposées tous les jours (catalogue Supabase) ne sont listées qu'une fois
+    common_keys = set(keys[0]).intersection(*keys[1:]) if keys else set()
+    common = [act for act, key in zip(candidates[0], keys[0]) if key in common_keys] if keys else []
+
+    lines = []
+    for day, day_candidates, day_keys in zip(days, candidates, keys):
+        specific = [act for act, key in zip(day_candidates, day_keys) if key not in common_keys]
+        if specific:
+            lines.append(f"- {day['date'].isoformat()} : activités propres à ce jour {compact_json(specific)}")
+        elif common:
+            lines.append(f"- {day['date'].isoformat()} : activités disponibles tous les jours uniquement")
+        else:
+            lines.append(f"- {day['date'].isoformat()} : aucune activité disponible, propose 3 activités")
+    days_text = "\n".join(lines)
+    common_text = f"Activités disponibles tous les jours : {compact_json(common)}\n" if common else ""
+    return (
+        f"Destination : {destination_name}\n"
+        f"Style : {mood}\n"
+        f"Budget par jour : {daily_budget}\n"
+        f"{common_text}"
+        f"Jours :\n{days_text}"
+    )
+
+def _activities_by_date(result: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Carte date ISO -> activités ; accepte aussi un objet indexé par date si le modèle s'écarte du schéma
+    """
+    days = result.get("days", [])
+    if isinstance(days, dict):
+        return {str(key)[:10]: value for key, value in days.items() if isinstance(value, list)}
+    return {
+        str(entry.get("date"))[:10]: entry["activities"]
+        for entry in days
+        if isinstance(entry, dict) and isinstance(entry.get("activities"), list)
+    }
+
+def _destination_dict(plan: DestinationPlan) -> Dict[str, Any]:
+    """
+    Structure flexible (dictionnaires) d'une destination pour la réponse v2
+    """
+    return {
+        "name": plan.city,
+        "country": plan.country,
+        "start_date": plan.days[0].date if plan.days else None,
+        "end_date": plan.days[-1].date if plan.days else None,
+        "days": [
+            {
+                "date": day.date,
+                "activities": ACTIVITY_LIST.dump_python(day.activities),
+                "meals": day.meals,
+                "notes": day.notes
+            }
+            for day in plan.days
+        ]
+    }
 
 @router.post("/generate-structured-text")
-async def generate_structured_text(request: TravelRequest):
+async def generate_structured_text(request: TravelRequest, router_agent: RouterAgent = Depends(get_router_agent)):
     """
     Génère un programme de voyage structuré (texte/Markdown) pour la première destination
     """
-    try:
-        program_text = await router_agent.generate_structured_text_program(request)
-        return {"program": program_text}
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Erreur lors de la génération du programme structuré : {str(e)}"
-        ) 
\ No newline at end of file
+    with router_agent.llm_service.priority("bulk"):
+        try:
+            program_text = await router_agent.generate_structured_text_program(request)
+            return {"program": program_text}
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Erreur lors de la génération du programme structuré : {str(e)}"
+            )
+
+@router.post("/generate-structured-text/stream")
+async def stream_structured_text(request: TravelRequest, router_agent: RouterAgent = Depends(get_router_agent)):
+    """
+    Variante Server-Sent Events de /generate-structured-text : chaque fragment généré par Ollama
+    est transmis dès sa réception. Une déconnexion du client annule la génération en amont.
+    """
+    # Admission avant l'envoi des en-têtes : un refus reste un 503 plutôt qu'un événement d'erreur
+    router_agent.llm_service.scheduler.admit("bulk")
+
+    async def event_stream():
+        tokens = router_agent.stream_structured_text_program(request)
+        with router_agent.llm_service.priority("bulk", admit=False):
+            try:
+                async for token in tokens:
+                    yield f"data: {compact_json({'token': token})}\n\n"
+                yield "event: done\ndata: {}\n\n"
+            except Exception as e:
+                detail = f"Erreur lors de la génération du programme structuré : {str(e)}"
+                yield f"event: error\ndata: {compact_json({'detail': detail})}\n\n"
+            finally:
+                await tokens.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,95 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from pydantic import BaseModel
+from typing import Any, Dict, Literal, Optional
+from schemas.request import TravelRequest, ProgramRequest
+from agents.router import RouterAgent
+from utils.llm import LLMService
+from utils.services import ExternalServices
+from utils.jobs import JobRunner, JobHandler, JobQueueFull, ProgressCallback
+from routers.generator import build_program_v2
+from routers.dependencies import get_job_runner
+
+router = APIRouter()
+
+class JobResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str
+    progress: Optional[Dict[str, Any]] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    version: int
+
+def job_handlers(router_agent: RouterAgent, llm_service: LLMService, external_services: ExternalServices) -> Dict[str, JobHandler]:
+    """
+    Exécution des travaux de génération : mêmes pipelines que les endpoints synchrones, en classe bulk
+    (la file des travaux tient lieu d'admission)
+    """
+    async def generate_program(params: Dict[str, Any], on_progress: ProgressCallback) -> Dict[str, Any]:
+        request = TravelRequest.model_validate(params["request"])
+        with llm_service.priority("bulk", admit=False):
+            # Pas d'échéance : le client n'attend pas la réponse, le programme est généré en entier
+            program = await router_agent.generate_travel_program(request, params.get("mode"), on_progress, deadline=0)
+        return program.model_dump(mode="json")
+
+    async def generate_program_v2(params: Dict[str, Any], on_progress: ProgressCallback) -> Dict[str, Any]:
+        request = ProgramRequest.model_validate(params["request"])
+        with llm_service.priority("bulk", admit=False):
+            program = await build_program_v2(
+                request, params.get("batch"), router_agent, llm_service, external_services, on_progress
+            )
+        return program.model_dump(mode="json")
+
+    return {"generate-program": generate_program, "generate-program-v2": generate_program_v2}
+
+async def _submit(job_runner: JobRunner, kind: str, params: Dict[str, Any], http_request: Request, response: Response) -> JobResponse:
+    try:
+        job_id = await job_runner.submit(kind, params)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    response.headers["Location"] = str(http_request.url_for("get_job", job_id=job_id))
+    return JobResponse(**JobRunner.describe(await job_runner.store.get(job_id)))
+
+@router.post("/jobs/generate-program", response_model=JobResponse, status_code=202)
+async def submit_travel_program(
+    request: TravelRequest,
+    http_request: Request,
+    response: Response,
+    mode: Optional[Literal["pipeline", "fused"]] = Query(None, description="Mode de génération (défaut : AGENT_GENERATION_MODE)"),
+    job_runner: JobRunner = Depends(get_job_runner)
+):
+    """
+    Soumet une génération /generate-program : renvoie immédiatement l'identifiant du travail
+    """
+    return await _submit(job_runner, "generate-program", {"request": request.model_dump(mode="json"), "mode": mode}, http_request, response)
+
+@router.post("/jobs/generate-program-v2", response_model=JobResponse, status_code=202)
+async def submit_program_v2(
+    request: ProgramRequest,
+    http_request: Request,
+    response: Response,
+    batch: Optional[bool] = Query(None, description="Un prompt de sélection par destination plutôt que par jour (défaut : V2_BATCH_SELECTION)"),
+    job_runner: JobRunner = Depends(get_job_runner)
+):
+    """
+    Soumet une génération /generate-program-v2 : renvoie immédiatement l'identifiant du travail
+    """
+    return await _submit(job_runner, "generate-program-v2", {"request": request.model_dump(mode="json"), "batch": batch}, http_request, response)
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(
+    job_id: str,
+    wait: float = Query(0, ge=0, le=60, description="Attente longue (s) d'un changement de statut ou de progression"),
+    after: Optional[int] = Query(None, ge=0, description="Version déjà connue du client (défaut : version actuelle)"),
+    job_runner: JobRunner = Depends(get_job_runner)
+):
+    """
+    Statut, progression (étape, destination) et résultat d'un travail
+    """
+    job = await job_runner.wait(job_id, after, wait) if wait else await job_runner.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Travail inconnu : {job_id}")
+    return JobResponse(**JobRunner.describe(job))
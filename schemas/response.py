@@ -1,25 +1,22 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, TypeAdapter, ValidationInfo, field_validator
 from typing import List, Optional, Dict, Any
 from datetime import date, time
 
 class Activity(BaseModel):
     name: str
-    description: Optional[str] = None
+    # Par défaut, le nom de l'activité
+    description: Optional[str] = Field(None, validate_default=True)
     duration_hours: Optional[float] = 1.0
     cost: Optional[float] = 0.0
-    location: Optional[str] = None
+    location: Optional[str] = "Non spécifié"
     category: Optional[str] = "général"
     booking_url: Optional[str] = None
     source: str = "llm"  # llm, supabase, viator
 
-    def __init__(self, **data):
-        # Si description n'est pas fournie, utiliser le nom
-        if "description" not in data:
-            data["description"] = data.get("name", "")
-        # Si location n'est pas fournie, utiliser une valeur par défaut
-        if "location" not in data:
-            data["location"] = "Non spécifié"
-        super().__init__(**data)
+    @field_validator("description")
+    @classmethod
+    def _default_description(cls, value: Optional[str], info: ValidationInfo) -> str:
+        return info.data.get("name", "") if value is None else value
 
 class Accommodation(BaseModel):
     name: str
@@ -58,6 +55,7 @@ class TravelProgram(BaseModel):
     currency: str = "EUR"
     generated_at: str
     version: str = "1.0"
+    metadata: Dict[str, Any] = {}  # Mode, échéance, étapes dégradées ou omises
 
 class ProgramResponse(BaseModel):
     destinations: List[Dict[str, Any]]  # Structure flexible pour le frontend
@@ -65,4 +63,7 @@ class ProgramResponse(BaseModel):
     currency: str = "EUR"
     generated_at: str
     version: str = "1.0"
-    metadata: Dict[str, Any] = {}  # Informations supplémentaires (statistiques, sources, etc.) 
\ No newline at end of file
+    metadata: Dict[str, Any] = {}  # Informations supplémentaires (statistiques, sources, etc.) 
+# Validation et sérialisation de listes entières en un appel à pydantic-core
+ACTIVITY_LIST = TypeAdapter(List[Activity])
+DAY_PLAN_LIST = TypeAdapter(List[DayPlan])
@@ -0,0 +1,71 @@
+from typing import Dict, Any, List
+
+# Schémas JSON transmis à Ollama (paramètre "format") pour contraindre la sortie des agents
+
+def _object(properties: Dict[str, Any], required: List[str] = None) -> Dict[str, Any]:
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": required if required is not None else list(properties)
+    }
+
+def _list_of(key: str, item: Dict[str, Any]) -> Dict[str, Any]:
+    return _object({key: {"type": "array", "items": item}})
+
+ACTIVITY_SCHEMA = _object({
+    "name": {"type": "string"},
+    "description": {"type": "string"},
+    "duration_hours": {"type": "number"},
+    "cost": {"type": "number"},
+    "location": {"type": "string"},
+    "category": {"type": "string"},
+    "booking_url": {"type": "string"},
+    "source": {"type": "string"}
+}, ["name", "description", "duration_hours", "cost", "location", "category"])
+
+ACCOMMODATION_SCHEMA = _object({
+    "name": {"type": "string"},
+    "type": {"type": "string"},
+    "location": {"type": "string"},
+    "check_in": {"type": "string", "format": "date"},
+    "check_out": {"type": "string", "format": "date"},
+    "price_per_night": {"type": "number"},
+    "booking_url": {"type": "string"}
+}, ["name", "type", "location", "check_in", "check_out", "price_per_night"])
+
+TRANSPORTATION_SCHEMA = _object({
+    "type": {"type": "string"},
+    "from_location": {"type": "string"},
+    "to_location": {"type": "string"},
+    "departure_time": {"type": "string", "pattern": "^[0-2][0-9]:[0-5][0-9]$"},
+    "arrival_time": {"type": "string", "pattern": "^[0-2][0-9]:[0-5][0-9]$"},
+    "cost": {"type": "number"},
+    "booking_url": {"type": "string"}
+}, ["type", "from_location", "to_location", "departure_time", "arrival_time", "cost"])
+
+DAY_SCHEMA = _object({
+    "date": {"type": "string"},
+    "activities": {"type": "array", "items": ACTIVITY_SCHEMA},
+    "meals": {"type": "array", "items": {"type": "string"}},
+    "notes": {"type": "string"}
+}, ["date", "activities"])
+
+ACTIVITIES_RESPONSE_SCHEMA = _list_of("activities", ACTIVITY_SCHEMA)
+ACCOMMODATIONS_RESPONSE_SCHEMA = _list_of("accommodations", ACCOMMODATION_SCHEMA)
+TRANSPORTATION_RESPONSE_SCHEMA = _list_of("transportation", TRANSPORTATION_SCHEMA)
+DAYS_RESPONSE_SCHEMA = _list_of("days", DAY_SCHEMA)
+# Mode fusionné du RouterAgent : itinéraire, activités et hébergement d'une destination en une réponse
+PLAN_AND_CURATE_RESPONSE_SCHEMA = _object({
+    "days": {"type": "array", "items": DAY_SCHEMA},
+    "accommodation": ACCOMMODATION_SCHEMA
+})
+
+def day_activities_response_schema(dates: List[str]) -> Dict[str, Any]:
+    """
+    Activités de plusieurs jours d'une destination en une réponse : une entrée par date demandée
+    (dates contraintes par enum, la grammaire d'Ollama ne gérant pas les clés d'objet dynamiques)
+    """
+    return _list_of("days", _object({
+        "date": {"type": "string", "enum": dates},
+        "activities": {"type": "array", "items": ACTIVITY_SCHEMA}
+    }))
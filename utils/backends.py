@@ -0,0 +1,231 @@
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+import httpx
+import os
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OLLAMA_URL = "http://localhost:11434"
+
+class NoBackendAvailable(Exception):
+    """
+    Aucun backend Ollama sain ne propose le modèle demandé
+    """
+
+def _model_names(model: str) -> Set[str]:
+    # Sans étiquette, Ollama désigne la variante "latest" ("mistral" = "mistral:latest")
+    return {model, model if ":" in model else f"{model}:latest"}
+
+class OllamaBackend:
+    """
+    Serveur Ollama du pool : appels en cours, limite de concurrence, santé, modèles installés
+    (/api/tags) et modèles chargés en mémoire (/api/ps)
+    """
+    def __init__(self, url: str, max_concurrency: int = 0):
+        self.url = url.rstrip("/")
+        # 0 : pas de limite côté API (Ollama met lui-même en file au-delà d'OLLAMA_NUM_PARALLEL)
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.calls = 0
+        self.healthy = True
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        # None tant qu'aucun contrôle de santé n'a répondu : le backend est supposé tout servir
+        self.models: Optional[Set[str]] = None
+        self.loaded: Set[str] = set()
+
+    def has_capacity(self) -> bool:
+        return not self.max_concurrency or self.in_flight < self.max_concurrency
+
+    def serves(self, model: str) -> bool:
+        return self.models is None or bool(self.models & _model_names(model))
+
+    def has_loaded(self, model: str) -> bool:
+        return bool(self.loaded & _model_names(model))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency or None,
+            "calls": self.calls,
+            "consecutive_failures": self.failures,
+            "last_error": self.last_error,
+            "models": sorted(self.models) if self.models is not None else None,
+            "loaded": sorted(self.loaded)
+        }
+
+class BackendPool:
+    """
+    Répartit les appels LLM entre plusieurs serveurs Ollama : backend sain proposant le modèle,
+    ayant le moins d'appels en cours (modèle déjà chargé en mémoire à égalité), dans la limite de
+    concurrence de chacun ; au-delà, l'appel attend qu'une place se libère.
+    Après failure_threshold échecs consécutifs (appels ou contrôles) un backend est retiré ;
+    le contrôle de santé périodique le réintègre dès qu'il répond.
+    """
+    def __init__(
+        self,
+        backends: Iterable[OllamaBackend],
+        client: Optional[httpx.AsyncClient] = None,
+        health_interval: float = 0,
+        failure_threshold: int = 0,
+        health_timeout: float = 2.0
+    ):
+        self.backends: List[OllamaBackend] = list(backends)
+        if not self.backends:
+            raise ValueError("Le pool Ollama doit contenir au moins un backend")
+        self.client = client
+        # 0 : pas de contrôle périodique / backend jamais retiré (backend unique par défaut)
+        self.health_interval = health_interval
+        self.failure_threshold = failure_threshold
+        self.health_timeout = health_timeout
+        # Appels en attente d'une place, réveillés à chaque libération ou changement de santé
+        self._waiters: List[asyncio.Future] = []
+        self._health_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, client: Optional[httpx.AsyncClient] = None) -> "BackendPool":
+        """
+        OLLAMA_BACKENDS : URLs séparées par des virgules, chacune suivie en option de "=limite"
+        (ex. "http://gpu:11434=8,http://cpu:11434=2") ; OLLAMA_BACKEND_CONCURRENCY s'applique sinon
+        """
+        default_limit = int(os.getenv("OLLAMA_BACKEND_CONCURRENCY", "4"))
+        backends = []
+        for entry in os.getenv("OLLAMA_BACKENDS", DEFAULT_OLLAMA_URL).split(","):
+            entry = entry.strip()
+            if not entry:
+                continue
+            url, _, limit = entry.partition("=")
+            backends.append(OllamaBackend(url.strip(), int(limit) if limit else default_limit))
+        return cls(
+            backends,
+            client=client,
+            health_interval=float(os.getenv("OLLAMA_HEALTH_INTERVAL", "10")),
+            failure_threshold=int(os.getenv("OLLAMA_BACKEND_FAILURES", "3"))
+        )
+
+    def capacity(self) -> int:
+        """
+        Appels simultanés acceptés par l'ensemble des backends (0 : au moins un backend sans limite)
+        """
+        if any(not backend.max_concurrency for backend in self.backends):
+            return 0
+        return sum(backend.max_concurrency for backend in self.backends)
+
+    def _candidates(self, model: str, exclude: Set[str] = frozenset()) -> List[OllamaBackend]:
+        return [b for b in self.backends if b.healthy and b.serves(model) and b.url not in exclude]
+
+    def available(self, model: str, exclude: Set[str] = frozenset()) -> bool:
+        return bool(self._candidates(model, exclude))
+
+    def _pick(self, model: str, exclude: Set[str]) -> Optional[OllamaBackend]:
+        candidates = self._candidates(model, exclude)
+        if not candidates:
+            raise NoBackendAvailable(f"Aucun backend Ollama disponible pour le modèle {model}")
+        free = [b for b in candidates if b.has_capacity()]
+        if not free:
+            return None
+        # Moins d'appels en cours, puis modèle déjà en mémoire (pas de chargement), puis rotation
+        return min(free, key=lambda b: (b.in_flight, not b.has_loaded(model), b.calls))
+
+    @asynccontextmanager
+    async def lease(self, model: str, exclude: Set[str] = frozenset()) -> AsyncIterator[OllamaBackend]:
+        """
+        Réserve un backend pour un appel. Une erreur de transport ou un statut 5xx levés dans le bloc
+        comptent comme un échec du backend ; un 404 retire le modèle de ceux qu'il propose.
+        """
+        backend = self._pick(model, exclude)
+        while backend is None:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            await waiter
+            backend = self._pick(model, exclude)
+        backend.in_flight += 1
+        backend.calls += 1
+        try:
+            yield backend
+        except httpx.HTTPStatusError as error:
+            if error.response.status_code == 404 and backend.models is not None:
+                backend.models -= _model_names(model)
+            elif error.response.status_code >= 500:
+                self._record_failure(backend, error)
+            raise
+        except httpx.TransportError as error:
+            self._record_failure(backend, error)
+            raise
+        else:
+            backend.failures = 0
+        finally:
+            backend.in_flight -= 1
+            self._wake()
+
+    def _wake(self):
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _record_failure(self, backend: OllamaBackend, error: Exception):
+        backend.failures += 1
+        backend.last_error = f"{type(error).__name__}: {error}"
+        if self.failure_threshold and backend.healthy and backend.failures >= self.failure_threshold:
+            backend.healthy = False
+            logger.warning("Backend Ollama %s retiré après %d échecs : %s", backend.url, backend.failures, backend.last_error)
+
+    async def _get_json(self, url: str) -> Dict[str, Any]:
+        if self.client is not None:
+            response = await self.client.get(url, timeout=self.health_timeout)
+        else:
+            async with httpx.AsyncClient(timeout=self.health_timeout) as client:
+                response = await client.get(url)
+        response.raise_for_status()
+        return response.json()
+
+    async def check(self, backend: OllamaBackend):
+        """
+        Contrôle de santé : modèles installés et chargés ; un backend retiré qui répond est réintégré
+        """
+        try:
+            tags = await self._get_json(f"{backend.url}/api/tags")
+            running = await self._get_json(f"{backend.url}/api/ps")
+        except (httpx.HTTPError, ValueError) as error:
+            self._record_failure(backend, error)
+        else:
+            backend.models = {model["name"] for model in tags.get("models", []) if "name" in model}
+            backend.loaded = {model["name"] for model in running.get("models", []) if "name" in model}
+            backend.failures = 0
+            if not backend.healthy:
+                backend.healthy = True
+                logger.info("Backend Ollama %s réintégré", backend.url)
+        # Des appels en attente peuvent désormais être servis (ou échouer faute de backend)
+        self._wake()
+
+    async def check_all(self):
+        await asyncio.gather(*(self.check(backend) for backend in self.backends))
+
+    async def _health_loop(self):
+        while True:
+            await self.check_all()
+            await asyncio.sleep(self.health_interval)
+
+    def start(self):
+        if self.health_interval > 0 and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "health_interval": self.health_interval,
+            "failure_threshold": self.failure_threshold,
+            "backends": {backend.url: backend.snapshot() for backend in self.backends}
+        }
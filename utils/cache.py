@@ -0,0 +1,221 @@
+from typing import Any, Dict, List, Optional, Set
+from collections import OrderedDict
+import threading
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import time
+import json
+import os
+
+logger = logging.getLogger(__name__)
+
+_MISS = object()
+
+class TTLCache:
+    """
+    Cache mémoire LRU borné dont chaque entrée a sa propre durée de vie
+    (permet un TTL court pour les réponses vides ou en échec)
+    """
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Any, value: Any, ttl: float):
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries
+        }
+
+class LLMResponseCache:
+    """
+    Cache des réponses LLM adressé par contenu (modèle, prompt, message système, options).
+    Niveau mémoire LRU borné + niveau SQLite optionnel partagé entre les workers gunicorn.
+    Le niveau mémoire est consulté directement ; la lecture du niveau SQLite passe par un thread
+    (asyncio.to_thread) et l'écriture est faite en tâche de fond : une base verrouillée par un autre
+    worker (jusqu'à 5 s) ne bloque ni la boucle d'évènements ni la réponse.
+    """
+    def __init__(self, max_entries: int = 512, ttl: float = 3600, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Accès au niveau SQLite (depuis les threads), distinct du verrou du niveau mémoire
+        self._db_lock = threading.Lock()
+        self._write_tasks: Set[asyncio.Task] = set()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    @classmethod
+    def from_env(cls) -> Optional["LLMResponseCache"]:
+        """
+        Construit le cache à partir des variables d'environnement (None si LLM_CACHE_SIZE=0)
+        """
+        max_entries = int(os.getenv("LLM_CACHE_SIZE", "512"))
+        if max_entries <= 0:
+            return None
+        return cls(
+            max_entries=max_entries,
+            ttl=float(os.getenv("LLM_CACHE_TTL", "3600")),
+            path=os.getenv("LLM_CACHE_PATH") or None
+        )
+
+    @staticmethod
+    def make_key(
+        kind: str,
+        model: str,
+        prompt: str,
+        system_message: Optional[str],
+        options: Dict[str, Any],
+        history: Optional[List[Dict[str, str]]] = None
+    ) -> str:
+        """
+        Clé SHA-256 stable : kind distingue les réponses texte des réponses JSON déjà parsées.
+        L'historique (messages de chat précédents) n'entre dans la clé que s'il est fourni.
+        """
+        parts = [kind, model, prompt, system_message, options]
+        if history:
+            parts.append(history)
+        material = json.dumps(
+            parts,
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        """
+        Renvoie la valeur en cache (partagée : à traiter en lecture seule) ou default
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+        value = await asyncio.to_thread(self._disk_get, key, now) if self._db is not None else _MISS
+        with self._lock:
+            if value is _MISS:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.disk_hits += 1
+        return value
+
+    def set(self, key: str, value: Any):
+        """
+        Met la valeur en cache : aussitôt en mémoire, en tâche de fond sur disque
+        """
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+        if self._db is not None:
+            task = asyncio.get_running_loop().create_task(self._write_back(key, value, expires_at))
+            self._write_tasks.add(task)
+            task.add_done_callback(self._write_tasks.discard)
+
+    async def _write_back(self, key: str, value: Any, expires_at: float):
+        try:
+            await asyncio.to_thread(self._disk_set, key, value, expires_at)
+        except sqlite3.Error as e:
+            # Entrée perdue pour les autres workers seulement : le niveau mémoire la garde
+            logger.warning("Écriture du cache LLM sur disque impossible : %s", e)
+
+    def _disk_set(self, key: str, value: Any, expires_at: float):
+        with self._db_lock:
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at)
+            )
+            self._writes += 1
+            # Purge périodique des entrées expirées du niveau disque
+            if self._writes % 100 == 0:
+                self._db.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+
+    def _remember(self, key: str, value: Any, expires_at: float):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str, now: float) -> Any:
+        with self._db_lock:
+            if self._db is None:
+                return _MISS
+            row = self._db.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        if row is None:
+            return _MISS
+        value = json.loads(row[0])
+        # Promotion dans le niveau mémoire
+        with self._lock:
+            self._remember(key, value, row[1])
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "disk": bool(self._db)
+        }
+
+    async def close(self):
+        """
+        Termine les écritures en cours puis ferme la base
+        """
+        if self._write_tasks:
+            await asyncio.gather(*self._write_tasks, return_exceptions=True)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+                self._db = None
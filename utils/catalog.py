@@ -0,0 +1,317 @@
+from typing import Any, Callable, Awaitable, Dict, Iterable, List, Optional, Set, Tuple
+from array import array
+import bisect
+import asyncio
+import logging
+import math
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# Page de synchronisation : (curseur (updated_at, id) exclu ou None, taille) -> lignes triées par (updated_at, id)
+FetchPage = Callable[[Optional[Tuple[str, Any]], int], Awaitable[List[Dict[str, Any]]]]
+
+def _key(value: Any) -> str:
+    return str(value).strip().casefold()
+
+def _keys(value: Any) -> Tuple[str, ...]:
+    """
+    Clés d'index d'un champ texte ou liste (une activité peut avoir plusieurs moods)
+    """
+    if value is None or value == "":
+        return ()
+    if isinstance(value, (list, tuple, set)):
+        return tuple(dict.fromkeys(_key(item) for item in value if item not in (None, "")))
+    return (_key(value),)
+
+def activity_cost(activity: Dict[str, Any]) -> Optional[float]:
+    """
+    Coût d'une activité Supabase ou d'un produit Viator (cost, price ou prix, éventuellement
+    {"amount"} ou {"fromPrice"}) ; None s'il est inconnu ou illisible
+    """
+    for key in ("cost", "price", "prix"):
+        value = activity.get(key)
+        if isinstance(value, dict):
+            value = value.get("amount") or value.get("fromPrice")
+        if value is not None:
+            try:
+                return float(value)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+class ActivityCatalog:
+    """
+    Copie locale de la table activities de Supabase, interrogée dans le processus.
+
+    Stockage en colonnes (coût dans un array de flottants, ville, moods et catégories par ligne),
+    index inversés ville, mood et catégorie (ensembles de positions) et index trié des coûts :
+    une requête (destination, mood, budget) croise la plus petite liste de positions avec les autres
+    et le préfixe de l'index des coûts, en quelques microsecondes.
+
+    La synchronisation est incrémentale : seules les lignes postérieures au filigrane (updated_at, id)
+    de la dernière ligne reçue sont relues, page par page sur ce même curseur, puis appliquées par
+    identifiant (insertion, mise à jour ou suppression si deleted / deleted_at est renseigné).
+    """
+    def __init__(
+        self,
+        fetch_page: FetchPage,
+        cost: Callable[[Dict[str, Any]], Optional[float]],
+        page_size: int = 5000,
+        sync_interval: float = 300,
+        max_staleness: float = 900
+    ):
+        self.fetch_page = fetch_page
+        # Lecture du coût d'une activité (None : inconnu)
+        self.cost = cost
+        self.page_size = page_size
+        self.sync_interval = sync_interval
+        # Au-delà, la copie n'est plus utilisée : les requêtes repartent vers Supabase
+        self.max_staleness = max_staleness
+        self.watermark: Optional[Tuple[str, Any]] = None
+        self.synced_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.counts = {"syncs": 0, "sync_errors": 0, "rows_fetched": 0, "queries": 0}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # Colonnes (une position par ligne ; une ligne supprimée laisse un trou)
+        self._positions: Dict[Any, int] = {}
+        self._rows: List[Optional[Dict[str, Any]]] = []
+        self._costs = array("d")
+        self._cities: List[Tuple[str, ...]] = []
+        self._moods: List[Tuple[str, ...]] = []
+        self._categories: List[Tuple[str, ...]] = []
+        self._size = 0
+        # Index inversés
+        self._by_city: Dict[str, Set[int]] = {}
+        self._by_mood: Dict[str, Set[int]] = {}
+        self._by_category: Dict[str, Set[int]] = {}
+        # Index des coûts connus, trié ; reconstruit à la première requête après une synchronisation
+        self._cost_keys: List[float] = []
+        self._cost_positions: List[int] = []
+        self._cost_dirty = False
+        self._unknown_cost: Set[int] = set()
+
+    @classmethod
+    def from_env(cls, fetch_page: FetchPage, cost: Callable[[Dict[str, Any]], Optional[float]]) -> "ActivityCatalog":
+        sync_interval = float(os.getenv("CATALOG_SYNC_INTERVAL", "300"))
+        return cls(
+            fetch_page,
+            cost,
+            page_size=int(os.getenv("CATALOG_PAGE_SIZE", "5000")),
+            sync_interval=sync_interval,
+            max_staleness=float(os.getenv("CATALOG_MAX_STALENESS", str(sync_interval * 3)))
+        )
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def ready(self) -> bool:
+        """
+        Copie non vide et synchronisée récemment : les requêtes peuvent être servies localement.
+        Une copie vide (table vide, ou filtrée par erreur côté Supabase) laisse passer les requêtes
+        vers Supabase plutôt que de répondre sans activité.
+        """
+        return self._size > 0 and self.synced_at is not None and time.monotonic() - self.synced_at <= self.max_staleness
+
+    def _index(self, index: Dict[str, Set[int]], keys: Iterable[str], position: int):
+        for key in keys:
+            index.setdefault(key, set()).add(position)
+
+    def _unindex(self, index: Dict[str, Set[int]], keys: Iterable[str], position: int):
+        for key in keys:
+            positions = index.get(key)
+            if positions is not None:
+                positions.discard(position)
+                if not positions:
+                    del index[key]
+
+    def _remove(self, position: int):
+        self._unindex(self._by_city, self._cities[position], position)
+        self._unindex(self._by_mood, self._moods[position], position)
+        self._unindex(self._by_category, self._categories[position], position)
+        self._rows[position] = None
+        self._costs[position] = math.nan
+        self._unknown_cost.discard(position)
+        self._cities[position] = self._moods[position] = self._categories[position] = ()
+        self._size -= 1
+
+    def apply(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Applique des lignes reçues de Supabase (insertion, mise à jour, suppression) ;
+        renvoie le nombre de lignes appliquées
+        """
+        applied = 0
+        for row in rows:
+            row_id = row.get("id")
+            if row_id is None:
+                continue
+            position = self._positions.get(row_id)
+            if position is not None and self._rows[position] is not None:
+                self._remove(position)
+            if row.get("deleted") or row.get("deleted_at"):
+                self._positions.pop(row_id, None)
+                applied += 1
+                continue
+            if position is None:
+                position = len(self._rows)
+                self._positions[row_id] = position
+                self._rows.append(None)
+                self._costs.append(math.nan)
+                self._cities.append(())
+                self._moods.append(())
+                self._categories.append(())
+            self._rows[position] = row
+            cost = self.cost(row)
+            if cost is None:
+                self._costs[position] = math.nan
+                self._unknown_cost.add(position)
+            else:
+                self._costs[position] = cost
+            self._cities[position] = _keys(row.get("city") or row.get("destination"))
+            self._moods[position] = _keys(row.get("mood"))
+            self._categories[position] = _keys(row.get("category"))
+            self._index(self._by_city, self._cities[position], position)
+            self._index(self._by_mood, self._moods[position], position)
+            self._index(self._by_category, self._categories[position], position)
+            self._size += 1
+            applied += 1
+        if applied:
+            self._cost_dirty = True
+        return applied
+
+    def _cost_index(self) -> Tuple[List[float], List[int]]:
+        if self._cost_dirty:
+            costs = self._costs
+            # cost == cost écarte les NaN (coût inconnu ou ligne supprimée)
+            self._cost_positions = sorted(
+                (position for position, cost in enumerate(costs) if cost == cost), key=costs.__getitem__
+            )
+            self._cost_keys = [costs[position] for position in self._cost_positions]
+            self._cost_dirty = False
+        return self._cost_keys, self._cost_positions
+
+    def query(
+        self,
+        city: str,
+        mood: Optional[str] = None,
+        max_cost: Optional[float] = None,
+        category: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Activités d'une ville, d'un mood et d'une catégorie (facultatifs) dont le coût ne dépasse pas
+        max_cost ; une activité de coût inconnu est conservée, comme dans le filtrage par jour.
+        Ordre de chargement dans le catalogue.
+        """
+        self.counts["queries"] += 1
+        postings = [self._by_city.get(_key(city), set())]
+        if mood:
+            postings.append(self._by_mood.get(_key(mood), set()))
+        if category:
+            postings.append(self._by_category.get(_key(category), set()))
+        postings.sort(key=len)
+        matched = postings[0].intersection(*postings[1:])
+        if not matched:
+            return []
+        if max_cost is not None and not math.isnan(max_cost):
+            cost_keys, cost_positions = self._cost_index()
+            within = bisect.bisect_right(cost_keys, max_cost)
+            if within < len(matched):
+                # Peu d'activités dans le budget : on part du préfixe de l'index des coûts,
+                # complété par les activités de coût inconnu
+                candidates = [position for position in cost_positions[:within] if position in matched]
+                candidates += matched & self._unknown_cost
+            else:
+                costs = self._costs
+                candidates = [position for position in matched if not costs[position] > max_cost]
+        else:
+            candidates = list(matched)
+        candidates.sort()
+        rows = self._rows
+        return [rows[position] for position in candidates]
+
+    async def sync(self) -> int:
+        """
+        Relit les lignes modifiées depuis le filigrane, page par page ; renvoie le nombre de lignes reçues.
+        Le filigrane avance après chaque page appliquée : une synchronisation interrompue reprend là
+        où elle s'est arrêtée. Une page qui ne le fait pas avancer (curseur ignoré par le serveur)
+        interrompt la synchronisation en erreur au lieu de relire indéfiniment les mêmes lignes.
+        """
+        async with self._lock:
+            start = time.perf_counter()
+            fetched = 0
+            try:
+                while True:
+                    page = await self.fetch_page(self.watermark, self.page_size)
+                    if page:
+                        last = page[-1]
+                        watermark = (str(last.get("updated_at") or ""), last.get("id"))
+                        if self.watermark is not None and not watermark > self.watermark:
+                            raise RuntimeError(
+                                f"le filigrane n'avance pas ({self.watermark} puis {watermark}) : "
+                                "curseur (updated_after, after_id) ignoré par le serveur ?"
+                            )
+                    self.apply(page)
+                    fetched += len(page)
+                    if page:
+                        self.watermark = watermark
+                    if len(page) < self.page_size:
+                        break
+            except Exception as e:
+                self.counts["sync_errors"] += 1
+                self.last_error = str(e)
+                logger.warning("Synchronisation du catalogue d'activités en échec : %s", e)
+                raise
+            self._cost_index()
+            self.synced_at = time.monotonic()
+            self.last_error = None
+            self.counts["syncs"] += 1
+            self.counts["rows_fetched"] += fetched
+            if not self._size:
+                logger.warning("Catalogue d'activités vide après synchronisation : les requêtes restent servies par Supabase")
+            logger.info(
+                "Catalogue d'activités synchronisé : %d lignes reçues, %d activités, %.2f s",
+                fetched, self._size, time.perf_counter() - start
+            )
+            return fetched
+
+    async def _sync_loop(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception:
+                pass
+            await asyncio.sleep(self.sync_interval)
+
+    def start(self):
+        """
+        Chargement initial puis synchronisation périodique en tâche de fond ; en attendant,
+        les requêtes passent par Supabase
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._sync_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "activities": self._size,
+            "cities": len(self._by_city),
+            "moods": len(self._by_mood),
+            "categories": len(self._by_category),
+            "watermark": self.watermark[0] if self.watermark else None,
+            "sync_age_seconds": round(time.monotonic() - self.synced_at, 3) if self.synced_at is not None else None,
+            "sync_interval": self.sync_interval,
+            "last_error": self.last_error,
+            **self.counts
+        }
@@ -0,0 +1,78 @@
+from typing import Awaitable, Callable, Dict, List, Tuple
+from utils.sessions import SessionStore
+import os
+
+# Résumeur : (résumé précédent, messages sortant de la fenêtre) -> nouveau résumé
+Summarizer = Callable[[str, List[Dict[str, str]]], Awaitable[str]]
+
+ROLE_LABELS = {"user": "Utilisateur", "assistant": "Assistant", "system": "Système"}
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimation rapide du nombre de tokens (~4 caractères par token pour Mistral)
+    """
+    return (len(text) + 3) // 4
+
+def _truncate(text: str, max_tokens: int) -> str:
+    max_chars = max_tokens * 4
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + "…"
+
+class ConversationContextBuilder:
+    """
+    Construit le contexte de conversation envoyé au LLM dans un budget de tokens fixe :
+    les derniers messages sont gardés (tronqués à une taille fixe), les plus anciens sont repliés
+    dans un résumé glissant qui n'est recalculé que lorsque des messages sortent de la fenêtre.
+    Entre deux résumés, le contexte ne fait que s'allonger : les tours précédents restent un préfixe
+    identique, que le cache KV d'Ollama n'a pas à réévaluer.
+    """
+    def __init__(
+        self,
+        sessions: SessionStore,
+        summarize: Summarizer,
+        token_budget: int = None,
+        keep_last: int = None,
+        fold_batch: int = None,
+        summary_tokens: int = 256
+    ):
+        self.sessions = sessions
+        self.summarize = summarize
+        self.token_budget = token_budget or int(os.getenv("CHAT_CONTEXT_TOKENS", "1024"))
+        self.keep_last = keep_last or int(os.getenv("CHAT_CONTEXT_TURNS", "6"))
+        # Les messages sortis de la fenêtre sont résumés par lots pour limiter les appels LLM
+        self.fold_batch = fold_batch or int(os.getenv("CHAT_SUMMARY_BATCH", "8"))
+        self.summary_tokens = summary_tokens
+        # Taille fixe par message (et non répartie selon le nombre de messages) : un message
+        # est tronqué de la même façon à chaque tour, le préfixe envoyé reste stable
+        window = self.keep_last + self.fold_batch - 1
+        self.message_tokens = max(32, (self.token_budget - summary_tokens) // window)
+        self.summaries = 0
+
+    async def build_messages(self, session_id: str, exclude_last: int = 1) -> Tuple[str, List[Dict[str, str]]]:
+        """
+        Résumé et messages récents (rôle, contenu) de la session, sans les exclude_last derniers
+        messages (le message en cours)
+        """
+        prior = await self.sessions.count(session_id) - exclude_last
+        if prior <= 0:
+            return "", []
+        summary, covered = await self.sessions.get_summary(session_id)
+        window_start = max(0, prior - self.keep_last)
+        if window_start - covered >= self.fold_batch:
+            aged = await self.sessions.history(session_id, covered, window_start - covered)
+            summary = _truncate(await self.summarize(summary, aged), self.summary_tokens)
+            covered = window_start
+            await self.sessions.set_summary(session_id, summary, covered)
+            self.summaries += 1
+        recent = await self.sessions.history(session_id, covered, prior - covered)
+        return summary, self._fit(summary, recent)
+
+    def _fit(self, summary: str, recent: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        budget = self.token_budget - estimate_tokens(summary)
+        messages = [
+            {"role": message["role"], "content": _truncate(message["content"], self.message_tokens)}
+            for message in recent
+        ]
+        # Si le budget est encore dépassé, les messages les plus anciens de la fenêtre sont retirés
+        while messages and sum(estimate_tokens(message["content"]) for message in messages) > budget:
+            messages.pop(0)
+        return messages
@@ -0,0 +1,14 @@
+import httpx
+import os
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    Crée le client HTTP mutualisé (pool de connexions + keep-alive) partagé par les services du processus
+    """
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    )
+    timeout = httpx.Timeout(float(os.getenv("HTTP_TIMEOUT", "10")))
+    return httpx.AsyncClient(limits=limits, timeout=timeout)
@@ -0,0 +1,95 @@
+from typing import Dict, Tuple
+import unicodedata
+import re
+
+INTENTS = ("PROGRAM", "INFO", "BOOKING", "OTHER")
+
+# Mots et radicaux pondérés (français/anglais, sans accents). Un radical, terminé par "*", reconnaît
+# aussi ses dérivés ("reserv*" couvre réserver, réservation...) ; un mot sans "*" n'est reconnu
+# qu'entier ("pay" ne reconnaît ni "pays" ni "payant", "rent" pas "rentrer") : pluriels explicites.
+INTENT_KEYWORDS: Dict[str, Dict[str, float]] = {
+    "PROGRAM": {
+        "program*": 3, "itinerai*": 3, "itinerar*": 3, "planifi*": 3, "planning": 2,
+        "plan de voyage": 3, "plan": 1, "plans": 1, "organis*": 2, "organiz*": 2, "sejour*": 2,
+        "circuit*": 2, "road trip": 3, "trip": 1, "trips": 1, "jours a": 2, "jour par jour": 3,
+        "day by day": 3, "days in": 2, "modifi*": 2, "remplace*": 2, "ajoute*": 2, "add": 1,
+        "enleve*": 2, "supprime*": 2, "remove": 1, "change": 1, "changer": 1, "swap": 2,
+        "week-end*": 1, "weekend*": 1, "prepare*": 2, "genere*": 3, "generate*": 3, "schedule*": 2,
+        "emploi du temps": 3, "vacances": 1
+    },
+    "INFO": {
+        "info*": 3, "renseign*": 3, "quel": 1, "quelle": 1, "quels": 1, "quelles": 1, "quoi": 1,
+        "comment": 1, "pourquoi": 2, "combien": 1, "est-ce que": 1, "what": 1, "which": 1,
+        "where": 1, "why": 2, "how": 1, "is it": 1, "meteo": 3, "weather": 3, "climat*": 3,
+        "climate": 3, "temperature*": 2, "saison*": 2, "season*": 2, "meilleur moment": 3,
+        "best time": 3, "conseil*": 2, "advice": 2, "tips": 2, "recommand*": 2, "recommend*": 2,
+        "a voir": 3, "to see": 2, "visiter": 2, "visit*": 1, "musee*": 1, "museum*": 1,
+        "securit*": 2, "safe": 2, "safety": 2, "visa*": 3, "monnaie*": 3, "currency": 3,
+        "langue*": 2, "language*": 2, "histoire*": 2, "history": 2, "specialit*": 2, "cultur*": 1,
+        "prix moyen": 2, "cout de la vie": 3, "decouvrir": 1, "parle*": 1, "tell me": 2,
+        "explique*": 2, "explain*": 2
+    },
+    "BOOKING": {
+        "reserv*": 4, "book": 4, "booking*": 4, "booked": 4, "billet*": 3, "ticket*": 3,
+        "vol": 2, "vols": 2, "flight*": 3, "chambre*": 2, "room": 2, "rooms": 2, "payer": 3,
+        "paiement*": 3, "pay": 2, "payment*": 3, "annul*": 3, "cancel*": 3, "rembours*": 3,
+        "refund*": 3, "confirm*": 2, "disponibilit*": 3, "availab*": 3, "place": 1, "places": 1,
+        "seat*": 2, "check-in": 2, "enregistrement": 2, "louer": 3, "location de": 3, "rent": 3,
+        "rental*": 3, "commander": 2, "acheter": 2, "buy": 2, "tarif*": 1
+    },
+    "OTHER": {
+        "bonjour": 3, "salut": 3, "hello": 3, "hey": 2, "coucou": 3, "merci": 3, "thanks": 3,
+        "thank you": 3, "au revoir": 3, "bye": 3, "qui es-tu": 4, "who are you": 4, "blague*": 3,
+        "joke*": 3, "ca va": 2, "how are you": 3, "aide": 1, "help": 1, "test": 1, "ok": 1,
+        "super": 1, "parfait": 2, "genial": 2, "cool": 1
+    }
+}
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+class IntentClassifier:
+    """
+    Classifieur d'intention local (règles pondérées FR/EN), sans appel LLM.
+    classify() renvoie l'intention et une confiance entre 0 et 1 : en dessous du seuil,
+    l'appelant se rabat sur la classification par LLM.
+    """
+    def __init__(self, keywords: Dict[str, Dict[str, float]] = None, min_score: float = 3.0):
+        self.keywords = keywords or INTENT_KEYWORDS
+        # Score en dessous duquel la confiance est réduite proportionnellement
+        self.min_score = min_score
+        # Une expression régulière par intention ; chaque groupe nommé correspond à un radical
+        self._patterns = {}
+        self._weights = {}
+        for intent, stems in self.keywords.items():
+            alternatives = []
+            for i, (stem, weight) in enumerate(stems.items()):
+                group = f"k{i}"
+                self._weights[(intent, group)] = weight
+                # Mot entier sauf pour un radical ("*") : pas de lettre après la correspondance
+                if stem.endswith("*"):
+                    alternatives.append(f"(?P<{group}>{re.escape(stem[:-1])})")
+                else:
+                    alternatives.append(f"(?P<{group}>{re.escape(stem)})(?!\\w)")
+            self._patterns[intent] = re.compile(r"(?<!\w)(?:" + "|".join(alternatives) + ")")
+
+    def scores(self, message: str) -> Dict[str, float]:
+        text = _normalize(message)
+        scores = {}
+        for intent, pattern in self._patterns.items():
+            score = 0.0
+            for match in pattern.finditer(text):
+                score += self._weights[(intent, match.lastgroup)]
+            scores[intent] = score
+        return scores
+
+    def classify(self, message: str) -> Tuple[str, float]:
+        scores = self.scores(message)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        (best, top), (_, second) = ranked[0], ranked[1]
+        if top <= 0:
+            return "OTHER", 0.0
+        # Confiance : marge sur l'intention suivante, atténuée pour les messages peu caractérisés
+        confidence = (top - second) / top * min(1.0, top / self.min_score)
+        return best, round(confidence, 3)
@@ -0,0 +1,383 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from datetime import datetime
+from utils.serialization import dumps, loads
+import threading
+import asyncio
+import logging
+import sqlite3
+import socket
+import time
+import uuid
+import os
+
+logger = logging.getLogger(__name__)
+
+# queued -> running -> done | failed
+FINISHED = ("done", "failed")
+
+# Progression : (étape, destination ou None, étapes terminées, étapes au total)
+ProgressCallback = Callable[[str, Optional[str], int, int], None]
+# Exécution d'un type de travail : (paramètres, progression) -> résultat sérialisable en JSON
+JobHandler = Callable[[Dict[str, Any], ProgressCallback], Awaitable[Dict[str, Any]]]
+
+class JobQueueFull(Exception):
+    """
+    File des travaux pleine : la soumission est refusée
+    """
+    def __init__(self, retry_after: float):
+        self.retry_after = max(1, int(retry_after + 0.5))
+        super().__init__(f"File des travaux pleine : réessayer dans {self.retry_after} s")
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+class JobStore:
+    """
+    Travaux de génération dans SQLite (mode WAL), partagés par les workers gunicorn d'une même
+    machine : un programme terminé survit au redémarrage du worker qui l'a produit (le fichier doit
+    donc être sur un disque persistant). version augmente à chaque changement (statut, progression),
+    pour l'attente longue. Un worker signale régulièrement (heartbeat_at) les travaux qu'il détient ;
+    passé le bail sans signal, un autre worker peut les reprendre.
+    Les requêtes s'exécutent dans un thread (asyncio.to_thread) : une écriture qui attend le verrou
+    d'un autre worker (jusqu'à 10 s) ne bloque pas la boucle d'évènements.
+    """
+    COLUMNS = ("job_id", "kind", "status", "params", "progress", "result", "error",
+               "created_at", "started_at", "finished_at", "version", "worker")
+
+    def __init__(self, path: str, ttl: float = 86400, lease: float = 60):
+        self.path = path
+        self.ttl = ttl
+        # Délai sans signal de son worker au-delà duquel un travail non terminé est repris
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                params TEXT NOT NULL,
+                progress TEXT,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                version INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                heartbeat_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+        """)
+        # Base créée avant l'introduction du bail
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "heartbeat_at" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+
+    async def create(self, kind: str, params: Dict[str, Any], worker: str) -> str:
+        return await asyncio.to_thread(self._create, kind, params, worker)
+
+    def _create(self, kind: str, params: Dict[str, Any], worker: str) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (job_id, kind, status, params, created_at, worker, heartbeat_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, kind, dumps(params).decode(), now, worker, now)
+            )
+        return job_id
+
+    async def update(self, job_id: str, **fields: Any):
+        await asyncio.to_thread(self._update, job_id, fields)
+
+    def _update(self, job_id: str, fields: Dict[str, Any]):
+        for key in ("progress", "result"):
+            if fields.get(key) is not None:
+                fields[key] = dumps(fields[key]).decode()
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock:
+            self._db.execute(
+                f"UPDATE jobs SET {assignments}, version = version + 1 WHERE job_id = ?",
+                (*fields.values(), job_id)
+            )
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._get, job_id)
+
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        for key in ("params", "progress", "result"):
+            job[key] = loads(job[key]) if job[key] else None
+        return job
+
+    async def heartbeat(self, worker: str) -> int:
+        """
+        Prolonge le bail des travaux non terminés détenus par worker ; renvoie leur nombre
+        """
+        return await asyncio.to_thread(self._heartbeat, worker)
+
+    def _heartbeat(self, worker: str) -> int:
+        with self._lock:
+            cursor = self._db.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE worker = ? AND status IN ('queued', 'running')",
+                (time.time(), worker)
+            )
+        return cursor.rowcount
+
+    async def claim_orphans(self, worker: str) -> List[str]:
+        """
+        Reprend les travaux non terminés rendus à l'arrêt d'un worker, ou dont le worker n'a plus
+        prolongé le bail depuis lease secondes (arrêt brutal, sur cette machine ou une autre) ;
+        la mise à jour conditionnelle évite que deux workers reprennent le même travail
+        """
+        return await asyncio.to_thread(self._claim_orphans, worker)
+
+    def _claim_orphans(self, worker: str) -> List[str]:
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT job_id, worker, heartbeat_at FROM jobs WHERE status IN ('queued', 'running') "
+                "AND (worker IS NULL OR (worker != ? AND (heartbeat_at IS NULL OR heartbeat_at < ?))) "
+                "ORDER BY created_at",
+                (worker, now - self.lease)
+            ).fetchall()
+        claimed = []
+        for job_id, owner, heartbeat_at in rows:
+            with self._lock:
+                cursor = self._db.execute(
+                    "UPDATE jobs SET status = 'queued', worker = ?, heartbeat_at = ?, version = version + 1 "
+                    "WHERE job_id = ? AND worker IS ? AND heartbeat_at IS ?",
+                    (worker, now, job_id, owner, heartbeat_at)
+                )
+            if cursor.rowcount:
+                claimed.append(job_id)
+        return claimed
+
+    async def purge(self):
+        await asyncio.to_thread(self._purge)
+
+    def _purge(self):
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at <= ?", (time.time() - self.ttl,)
+            )
+
+    def close(self):
+        self._db.close()
+
+class JobRunner:
+    """
+    Exécute les travaux soumis sur un nombre borné de tâches de fond (workers), file d'attente
+    bornée : au-delà, la soumission est refusée plutôt que de laisser la file grossir sans fin
+    """
+    def __init__(self, store: JobStore, handlers: Dict[str, JobHandler], workers: int = 2, max_queue: int = 100):
+        self.store = store
+        self.handlers = handlers
+        self.workers = workers
+        self.max_queue = max_queue
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._running: Dict[str, str] = {}
+        # Attentes longues en cours, réveillées à chaque changement d'un travail de ce worker
+        self._waiters: List[asyncio.Future] = []
+        # Durée moyenne d'un travail, pour Retry-After
+        self.avg_seconds = 60.0
+        self.counts = {"submitted": 0, "done": 0, "failed": 0, "rejected": 0, "recovered": 0}
+
+    @classmethod
+    def from_env(cls, handlers: Dict[str, JobHandler]) -> "JobRunner":
+        store = JobStore(
+            os.getenv("JOBS_DB_PATH", "jobs.db"),
+            ttl=float(os.getenv("JOBS_TTL", "86400")),
+            lease=float(os.getenv("JOBS_LEASE_SECONDS", "60"))
+        )
+        return cls(
+            store,
+            handlers,
+            workers=int(os.getenv("JOBS_WORKERS", "2")),
+            max_queue=int(os.getenv("JOBS_QUEUE_MAX", "100"))
+        )
+
+    async def _recover(self):
+        recovered = await self.store.claim_orphans(self.worker_id)
+        for job_id in recovered:
+            self._queue.put_nowait(job_id)
+        self.counts["recovered"] += len(recovered)
+        if recovered:
+            logger.info("%d travaux interrompus repris", len(recovered))
+
+    async def _heartbeat(self):
+        """
+        Prolonge le bail des travaux de ce worker et reprend ceux dont le bail a expiré, trois fois par bail
+        """
+        while True:
+            await asyncio.sleep(self.store.lease / 3)
+            try:
+                await self.store.heartbeat(self.worker_id)
+                await self._recover()
+            except sqlite3.Error as e:
+                logger.warning("Bail des travaux non prolongé : %s", e)
+
+    async def start(self):
+        await self.store.purge()
+        await self._recover()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+
+    async def close(self):
+        tasks = self._tasks + ([self._heartbeat_task] if self._heartbeat_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._heartbeat_task = None
+        # Travaux en file rendus : le prochain démarrage d'un worker les reprend
+        for job_id in self._drain():
+            await self.store.update(job_id, worker=None)
+        self.store.close()
+
+    def _drain(self) -> List[str]:
+        pending = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        return pending
+
+    async def submit(self, kind: str, params: Dict[str, Any]) -> str:
+        if kind not in self.handlers:
+            raise ValueError(f"Type de travail inconnu : {kind}")
+        if self._queue.qsize() >= self.max_queue:
+            self.counts["rejected"] += 1
+            raise JobQueueFull(self._queue.qsize() * self.avg_seconds / max(1, self.workers))
+        job_id = await self.store.create(kind, params, self.worker_id)
+        self._queue.put_nowait(job_id)
+        self.counts["submitted"] += 1
+        if self.counts["submitted"] % 100 == 0:
+            await self.store.purge()
+        return job_id
+
+    def _wake(self):
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def _update(self, job_id: str, **fields: Any):
+        await self.store.update(job_id, **fields)
+        self._wake()
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            job = await self.store.get(job_id)
+            if job is None or job["status"] in FINISHED:
+                continue
+            await self._run(job)
+
+    async def _run(self, job: Dict[str, Any]):
+        job_id = job["job_id"]
+        self._running[job_id] = job["kind"]
+        start = time.time()
+        await self._update(job_id, status="running", started_at=start, worker=self.worker_id, heartbeat_at=start)
+
+        # La progression (rappel synchrone du pipeline) est écrite en tâche de fond, dans l'ordre ;
+        # la plus récente remplace celles qui attendent encore leur écriture
+        pending: Dict[str, Any] = {}
+        writer: Optional[asyncio.Task] = None
+
+        async def write_progress():
+            while pending:
+                await self._update(job_id, progress=pending.pop("progress"))
+
+        def on_progress(stage: str, destination: Optional[str], completed: int, total: int):
+            nonlocal writer
+            pending["progress"] = {"stage": stage, "destination": destination, "completed": completed, "total": total}
+            if writer is None or writer.done():
+                writer = asyncio.create_task(write_progress())
+
+        async def flush_progress():
+            if writer is not None:
+                await asyncio.gather(writer, return_exceptions=True)
+
+        try:
+            result = await self.handlers[job["kind"]](job["params"], on_progress)
+        except asyncio.CancelledError:
+            # Arrêt du worker : le travail repart de zéro au prochain démarrage
+            if writer is not None:
+                writer.cancel()
+            await self.store.update(job_id, status="queued", progress=None, worker=None)
+            raise
+        except Exception as e:
+            logger.warning("Travail %s (%s) en échec : %s", job_id, job["kind"], e)
+            await flush_progress()
+            await self._update(job_id, status="failed", error=str(e), finished_at=time.time())
+            self.counts["failed"] += 1
+        else:
+            await flush_progress()
+            await self._update(job_id, status="done", result=result, finished_at=time.time())
+            self.counts["done"] += 1
+            self.avg_seconds = 0.8 * self.avg_seconds + 0.2 * (time.time() - start)
+        finally:
+            self._running.pop(job_id, None)
+
+    async def wait(self, job_id: str, after: Optional[int], timeout: float, poll_interval: float = 0.5) -> Optional[Dict[str, Any]]:
+        """
+        Attente longue : renvoie le travail dès que sa version dépasse after (à défaut la version
+        actuelle) ou qu'il est terminé, au plus tard après timeout secondes. Les changements faits
+        par un autre worker sont vus en relisant le stockage toutes les poll_interval secondes.
+        """
+        deadline = time.monotonic() + timeout
+        job = await self.store.get(job_id)
+        if job is None:
+            return None
+        after = job["version"] if after is None else after
+        while job["version"] <= after and job["status"] not in FINISHED:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, min(remaining, poll_interval))
+            except asyncio.TimeoutError:
+                pass
+            job = await self.store.get(job_id)
+        return job
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "running": dict(self._running),
+            "queued": self._queue.qsize(),
+            "max_queue": self.max_queue,
+            "avg_job_seconds": round(self.avg_seconds, 3),
+            **self.counts
+        }
+
+    @staticmethod
+    def describe(job: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Représentation publique d'un travail (réponse de l'API)
+        """
+        return {
+            "job_id": job["job_id"],
+            "kind": job["kind"],
+            "status": job["status"],
+            "progress": job["progress"],
+            "result": job["result"],
+            "error": job["error"],
+            "created_at": _iso(job["created_at"]),
+            "started_at": _iso(job["started_at"]),
+            "finished_at": _iso(job["finished_at"]),
+            "version": job["version"]
+        }
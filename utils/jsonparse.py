@@ -0,0 +1,122 @@
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import re
+
+_FENCE = re.compile(r"```(?:json)?")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_CLOSERS = {"{": "}", "[": "]"}
+
+class PartialJSONParser:
+    """
+    Parseur JSON incrémental : les fragments sont fournis au fil de l'eau via feed(), et value()
+    renvoie l'objet complet ou, pour une sortie tronquée (num_predict atteint), le plus long
+    préfixe valide refermé proprement
+    """
+    def __init__(self):
+        self.buffer: List[str] = []
+        self.stack: List[str] = []
+        self.started = False
+        self.complete = False
+        self.in_string = False
+        self.escape = False
+        # Positions où le préfixe est un document valide une fois les conteneurs ouverts refermés
+        self.safe_points: List[Tuple[int, str]] = []
+
+    def feed(self, text: str):
+        for char in text:
+            if self.complete:
+                return
+            if not self.started:
+                if char != "{":
+                    continue
+                self.started = True
+            self.buffer.append(char)
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in _CLOSERS:
+                self.stack.append(char)
+                # Un tableau vide est valide ; un objet vide seulement à la racine
+                if char == "[" or len(self.stack) == 1:
+                    self._mark(len(self.buffer))
+            elif char in "}]":
+                if self.stack:
+                    self.stack.pop()
+                if not self.stack:
+                    self.complete = True
+                elif self._cuttable():
+                    self._mark(len(self.buffer))
+            elif char == "," and self._cuttable():
+                # L'élément précédant la virgule est complet
+                self._mark(len(self.buffer) - 1)
+
+    def _cuttable(self) -> bool:
+        # On ne coupe que dans un tableau ou dans l'objet racine : un objet imbriqué
+        # tronqué (champs manquants) serait pire qu'absent
+        return self.stack[-1] == "[" or len(self.stack) == 1
+
+    def _mark(self, position: int):
+        closers = "".join(_CLOSERS[c] for c in reversed(self.stack))
+        self.safe_points.append((position, closers))
+
+    def value(self) -> Optional[Any]:
+        if not self.started:
+            return None
+        text = "".join(self.buffer)
+        if self.complete:
+            return json.loads(text)
+        for position, closers in reversed(self.safe_points):
+            candidate = _TRAILING_COMMA.sub(r"\1", text[:position].rstrip().rstrip(",") + closers)
+            try:
+                return json.loads(candidate)
+            except json.JSONDecodeError:
+                continue
+        return None
+
+def _has_content(data: Dict[str, Any]) -> bool:
+    """
+    Au moins une valeur récupérée qui ne soit pas un conteneur vide
+    """
+    return any(value not in (None, "", [], {}) for value in data.values())
+
+def parse_llm_json(text: str) -> Tuple[Dict[str, Any], str]:
+    """
+    Extrait l'objet JSON d'une réponse LLM et renvoie (données, statut) où statut vaut
+    "ok" (JSON valide), "repaired" (réparation légère) ou "partial" (préfixe d'une sortie tronquée).
+    Lève ValueError si rien n'est récupérable, y compris un préfixe sans aucune valeur non vide.
+    """
+    start = text.find("{")
+    if start == -1:
+        raise ValueError("Aucun objet JSON dans la réponse")
+    decoder = json.JSONDecoder()
+    try:
+        data, _ = decoder.raw_decode(text, start)
+        return data, "ok"
+    except json.JSONDecodeError:
+        pass
+    # Réparation légère : blocs de code Markdown, virgules finales, guillemets typographiques
+    cleaned = _FENCE.sub("", text[start:])
+    cleaned = cleaned.replace("“", '"').replace("”", '"')
+    cleaned = _TRAILING_COMMA.sub(r"\1", cleaned)
+    try:
+        data, _ = decoder.raw_decode(cleaned)
+        return data, "repaired"
+    except json.JSONDecodeError:
+        pass
+    parser = PartialJSONParser()
+    parser.feed(cleaned)
+    data = parser.value()
+    if isinstance(data, dict):
+        if parser.complete:
+            return data, "repaired"
+        # Troncature avant le premier élément complet ('{"days', '{"activities": [{"name": …') :
+        # rien d'exploitable, une nouvelle génération vaut mieux qu'un objet vide
+        if _has_content(data):
+            return data, "partial"
+    raise ValueError("La réponse n'est pas un JSON valide")
@@ -1,44 +1,550 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, AsyncIterator, Awaitable, Callable, Iterator, Set, Tuple, Union
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from utils.cache import LLMResponseCache
+from utils.backends import BackendPool, OllamaBackend, DEFAULT_OLLAMA_URL
+from utils.scheduler import LLMScheduler, current_priority
+from utils.singleflight import SingleFlight
+from utils.jsonparse import parse_llm_json
+from utils.metrics import REGISTRY
+from utils.context import estimate_tokens
+import asyncio
+import logging
 import httpx
-import re
+import json
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYSTEM_MESSAGE = "Tu es un assistant spécialisé dans la génération de programmes de voyage. Réponds toujours en JSON valide."
+
+class LLMCallStats:
+    """
+    Appels LLM d'une requête HTTP : appels réellement envoyés à Ollama, réponses servies
+    par le cache et temps passé à attendre Ollama (appels parallèles cumulés)
+    """
+    def __init__(self):
+        self.calls = 0
+        self.cache_hits = 0
+        self.llm_seconds = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "llm_seconds": round(self.llm_seconds, 3)
+        }
+
+# Statistiques de la requête en cours, héritées par les tâches créées pendant la requête
+_call_stats: ContextVar[Optional[LLMCallStats]] = ContextVar("llm_call_stats", default=None)
+
+# Échéance (horloge monotone) de la requête en cours, héritée de la même façon
+_deadline: ContextVar[Optional[float]] = ContextVar("llm_deadline", default=None)
+
+class DeadlineExceeded(Exception):
+    """
+    Échéance de la requête atteinte avant ou pendant un appel LLM
+    """
+
+# Métriques par agent et méthode appelante (caller "agent.méthode")
+OLLAMA_REQUESTS = REGISTRY.counter("ollama_requests_total", "Appels à Ollama par résultat", ("agent", "method", "outcome"))
+OLLAMA_DURATION = REGISTRY.histogram("ollama_request_duration_seconds", "Durée des appels à Ollama vue par l'API", ("agent", "method"))
+OLLAMA_IN_FLIGHT = REGISTRY.gauge("ollama_requests_in_flight", "Appels à Ollama en cours", ("agent", "method"))
+OLLAMA_TOKENS = REGISTRY.counter("ollama_tokens_total", "Tokens évalués par Ollama (phase prompt ou eval)", ("agent", "method", "phase"))
+OLLAMA_SECONDS = REGISTRY.counter("ollama_seconds_total", "Temps déclaré par Ollama (phase load, prompt ou eval)", ("agent", "method", "phase"))
+OLLAMA_COLD_LOADS = REGISTRY.counter("ollama_cold_loads_total", "Appels ayant attendu le chargement du modèle", ("agent", "method"))
+OLLAMA_PROMPT_REUSED = REGISTRY.counter(
+    "ollama_prompt_tokens_reused_total",
+    "Tokens de prompt repris du cache KV d'Ollama (estimation : tokens envoyés - prompt_eval_count)",
+    ("agent", "method")
+)
+OLLAMA_PROMPT_SAVED = REGISTRY.counter(
+    "ollama_prompt_eval_saved_seconds_total",
+    "Temps d'évaluation du prompt évité grâce au cache KV (estimation au débit d'évaluation de l'appel)",
+    ("agent", "method")
+)
+
+def structured_system_message(instructions: str) -> str:
+    """
+    Message système d'un type d'appel structuré : consigne générale puis instructions fixes.
+    Identique d'un appel à l'autre, il forme le préfixe que le cache KV d'Ollama réutilise ;
+    les données variables (ville, dates, budget, candidats) vont dans le prompt, après lui.
+    """
+    return f"{DEFAULT_SYSTEM_MESSAGE}\n\n{instructions.strip()}"
+
+# Message de chat Ollama : {"role": "system" | "user" | "assistant", "content": ...}
+Message = Dict[str, str]
+
+def _keep_alive(value: str) -> Union[str, int]:
+    # Ollama attend une durée ("30m") ou un nombre de secondes (-1 : modèle jamais déchargé)
+    value = value.strip()
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+def _caller_labels(caller: Optional[str]):
+    agent, _, method = (caller or "inconnu").partition(".")
+    return agent, method or "-"
 
 class LLMService:
-    def __init__(self, base_url: str = "http://localhost:11434", model: str = "mistral"):
-        self.base_url = base_url
+    def __init__(
+        self,
+        base_url: str = DEFAULT_OLLAMA_URL,
+        model: str = "mistral",
+        client: Optional[httpx.AsyncClient] = None,
+        timeout: float = 120,
+        cache: Optional[LLMResponseCache] = None,
+        pool: Optional[BackendPool] = None,
+        scheduler: Optional[LLMScheduler] = None
+    ):
+        # Serveurs Ollama (BackendPool.from_env dans le lifespan) ; à défaut, base_url seul
+        self.pool = pool or BackendPool([OllamaBackend(base_url)], client=client)
+        # Priorité chat / génération et admission, dans la limite de capacité du pool
+        self.scheduler = scheduler or LLMScheduler.from_env(self.pool.capacity())
         self.model = model
+        # Client HTTP mutualisé (injecté par le lifespan de l'application)
+        self.client = client
+        self.timeout = timeout
+        self.cache = cache
+        self.flights = SingleFlight()
+        self.options = {
+            "temperature": 0.7,
+            "num_predict": 2000
+        }
+        # Nouvelles générations complètes tentées quand la sortie JSON est irrécupérable
+        self.max_parse_retries = int(os.getenv("LLM_PARSE_RETRIES", "1"))
+        self.parse_counts = {"ok": 0, "repaired": 0, "partial": 0, "failed": 0, "errors": 0}
+        # Au-delà de cette durée de chargement (load_duration), l'appel compte comme un chargement à froid
+        self.cold_load_seconds = float(os.getenv("OLLAMA_COLD_LOAD_SECONDS", "0.5"))
+        # /api/chat par défaut ; "generate" conserve l'ancien prompt aplati
+        self.api = os.getenv("OLLAMA_API", "chat")
+        if self.api not in ("chat", "generate"):
+            raise ValueError(f"OLLAMA_API inconnu : {self.api} (chat ou generate)")
+        # Durée de maintien du modèle (et de son cache KV) en mémoire après chaque appel
+        self.keep_alive = _keep_alive(os.getenv("OLLAMA_KEEP_ALIVE", "30m"))
+        # Débit d'évaluation de prompt observé (secondes par token, moyenne glissante), None avant le premier appel
+        self.prompt_seconds_per_token: Optional[float] = None
+
+    async def _send(self, url: str, payload: Dict[str, Any], timeout: Optional[float] = None) -> httpx.Response:
+        """
+        Envoie une requête POST via le client partagé (ou un client éphémère à défaut)
+        """
+        timeout = timeout or self.timeout
+        if self.client is not None:
+            return await self.client.post(url, json=payload, timeout=timeout)
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            return await client.post(url, json=payload)
+
+    async def preload(self, backend: OllamaBackend, timeout: Optional[float] = None):
+        """
+        Charge le modèle en mémoire sur un backend, sans générer (requête sans prompt), pour la durée
+        keep_alive ; la durée de chargement est comptée comme celle d'un appel (startup.preload)
+        """
+        with self._instrument("startup.preload") as call:
+            response = await self._send(
+                f"{backend.url}/api/generate", {"model": self.model, "keep_alive": self.keep_alive}, timeout
+            )
+            response.raise_for_status()
+            call["usage"] = response.json()
+        backend.loaded |= {self.model if ":" in self.model else f"{self.model}:latest"}
+
+    async def prime(self, backend: OllamaBackend, system_message: str, timeout: Optional[float] = None):
+        """
+        Évalue un message système sur un backend (un seul token généré) : les appels qui commencent
+        par ce message reprennent son évaluation dans le cache KV d'Ollama
+        """
+        path, payload = self._request("", system_message, None, stream=False, options={**self.options, "num_predict": 1})
+        with self._instrument("startup.prime") as call:
+            response = await self._send(f"{backend.url}{path}", payload, timeout)
+            response.raise_for_status()
+            call["usage"] = response.json()
+
+    async def _post(self, path: str, payload: Dict[str, Any]) -> httpx.Response:
+        """
+        Envoie une requête POST au backend Ollama choisi par le pool. Une connexion refusée est
+        rejouée sur un autre backend : la requête n'a pas été reçue, la rejouer est sans risque.
+        """
+        tried: Set[str] = set()
+        while True:
+            backend = None
+            try:
+                async with self.pool.lease(self.model, tried) as backend:
+                    response = await self._send(f"{backend.url}{path}", payload)
+                    response.raise_for_status()
+                    return response
+            except httpx.ConnectError:
+                tried.add(backend.url)
+                if not self.pool.available(self.model, tried):
+                    raise
+
+    @contextmanager
+    def track_calls(self) -> Iterator[LLMCallStats]:
+        """
+        Compte les appels LLM effectués dans ce contexte (y compris par les tâches qu'il lance)
+        """
+        stats = LLMCallStats()
+        token = _call_stats.set(stats)
+        try:
+            yield stats
+        finally:
+            _call_stats.reset(token)
 
-    async def generate_response(self, prompt: str, system_message: str = None) -> str:
+    @contextmanager
+    def deadline(self, seconds: Optional[float]) -> Iterator[None]:
         """
-        Génère une réponse à partir d'un prompt en utilisant Ollama (Mistral 7B)
+        Échéance des appels LLM effectués dans ce contexte (y compris par les tâches qu'il lance) :
+        chaque appel ne dispose que du temps restant. Sans durée (None ou 0), pas d'échéance ;
+        une échéance englobante plus proche est conservée.
         """
-        full_prompt = (system_message + "\n" if system_message else "") + prompt
+        if not seconds:
+            yield
+            return
+        current = _deadline.get()
+        deadline = time.monotonic() + seconds
+        token = _deadline.set(deadline if current is None else min(current, deadline))
+        try:
+            yield
+        finally:
+            _deadline.reset(token)
+
+    @staticmethod
+    def remaining() -> Optional[float]:
+        """
+        Secondes restantes avant l'échéance de la requête en cours (None sans échéance)
+        """
+        deadline = _deadline.get()
+        return None if deadline is None else deadline - time.monotonic()
+
+    @asynccontextmanager
+    async def _within_deadline(self, caller: Optional[str]) -> AsyncIterator[None]:
+        remaining = self.remaining()
+        if remaining is None:
+            yield
+            return
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Échéance dépassée avant l'appel {caller or ''}".rstrip())
+        try:
+            # Attente d'une place comprise : l'appel est annulé (connexion fermée) à l'échéance
+            async with asyncio.timeout(remaining):
+                yield
+        except TimeoutError:
+            raise DeadlineExceeded(f"Échéance atteinte pendant l'appel {caller or ''}".rstrip())
+
+    @contextmanager
+    def priority(self, name: str, admit: bool = True) -> Iterator[None]:
+        """
+        Classe de priorité ("interactive" ou "bulk") des appels LLM effectués dans ce contexte.
+        Avec admit, la requête passe d'abord le contrôle d'admission (LLMOverloaded si refusée).
+        """
+        if admit:
+            self.scheduler.admit(name)
+        token = current_priority.set(name)
+        try:
+            yield
+        finally:
+            current_priority.reset(token)
+
+    @contextmanager
+    def _instrument(self, caller: Optional[str]) -> Iterator[Dict[str, Any]]:
+        """
+        Mesure un appel à Ollama : appels en cours, durée, résultat, statistiques renvoyées par
+        Ollama (à placer dans call["usage"]) et compteurs de la requête HTTP en cours
+        """
+        agent, method = _caller_labels(caller)
+        stats = _call_stats.get()
+        call = {"outcome": "error", "usage": None}
+        OLLAMA_IN_FLIGHT.inc(agent=agent, method=method)
+        start = time.perf_counter()
+        try:
+            yield call
+            call["outcome"] = "ok"
+        except (asyncio.CancelledError, GeneratorExit):
+            call["outcome"] = "cancelled"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            OLLAMA_IN_FLIGHT.dec(agent=agent, method=method)
+            OLLAMA_REQUESTS.inc(agent=agent, method=method, outcome=call["outcome"])
+            OLLAMA_DURATION.observe(elapsed, agent=agent, method=method)
+            if stats is not None:
+                stats.calls += 1
+                stats.llm_seconds += elapsed
+            if call["usage"]:
+                self._observe_usage(agent, method, call["usage"], call.get("prompt_tokens", 0))
+
+    def _observe_usage(self, agent: str, method: str, usage: Dict[str, Any], prompt_tokens: int = 0):
+        # Compteurs et durées (nanosecondes) renvoyés par Ollama avec la réponse finale
+        evaluated = usage.get("prompt_eval_count") or 0
+        OLLAMA_TOKENS.inc(evaluated, agent=agent, method=method, phase="prompt")
+        if evaluated and usage.get("prompt_eval_duration"):
+            rate = usage["prompt_eval_duration"] / 1e9 / evaluated
+            previous = self.prompt_seconds_per_token
+            self.prompt_seconds_per_token = rate if previous is None else 0.8 * previous + 0.2 * rate
+        # prompt_eval_count n'inclut pas le préfixe repris du cache KV : l'écart avec la taille
+        # estimée du prompt envoyé donne les tokens réutilisés, valorisés au débit de l'appel
+        reused = max(0, prompt_tokens - evaluated)
+        if reused:
+            OLLAMA_PROMPT_REUSED.inc(reused, agent=agent, method=method)
+            if evaluated and usage.get("prompt_eval_duration"):
+                saved = reused * usage["prompt_eval_duration"] / 1e9 / evaluated
+                OLLAMA_PROMPT_SAVED.inc(saved, agent=agent, method=method)
+        OLLAMA_TOKENS.inc(usage.get("eval_count") or 0, agent=agent, method=method, phase="eval")
+        load = (usage.get("load_duration") or 0) / 1e9
+        OLLAMA_SECONDS.inc(load, agent=agent, method=method, phase="load")
+        OLLAMA_SECONDS.inc((usage.get("prompt_eval_duration") or 0) / 1e9, agent=agent, method=method, phase="prompt")
+        OLLAMA_SECONDS.inc((usage.get("eval_duration") or 0) / 1e9, agent=agent, method=method, phase="eval")
+        if load >= self.cold_load_seconds:
+            OLLAMA_COLD_LOADS.inc(agent=agent, method=method)
+            logger.warning("Chargement du modèle %s à froid : %.1fs (%s.%s)", self.model, load, agent, method)
+
+    def _record_cache_hit(self):
+        stats = _call_stats.get()
+        if stats is not None:
+            stats.cache_hits += 1
+
+    def _request(
+        self,
+        prompt: str,
+        system_message: Optional[str],
+        history: Optional[List[Message]],
+        stream: bool,
+        output_format: Union[str, Dict[str, Any]] = None,
+        options: Optional[Dict[str, Any]] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """
+        Chemin et corps de l'appel à Ollama. Les messages sont ordonnés du plus stable au plus
+        variable (système, historique, demande) : Ollama ne réévalue que la partie qui suit le plus
+        long préfixe déjà présent dans son cache KV.
+        """
+        messages = [{"role": "system", "content": system_message}] if system_message else []
+        messages += list(history or []) + [{"role": "user", "content": prompt}]
         payload = {
             "model": self.model,
-            "prompt": full_prompt,
-            "stream": False,
-            "options": {
-                "temperature": 0.7,
-                "num_predict": 2000
-            }
+            "stream": stream,
+            "options": options or self.options,
+            "keep_alive": self.keep_alive
         }
-        async with httpx.AsyncClient(timeout=120) as client:
-            response = await client.post(f"{self.base_url}/api/generate", json=payload)
-            response.raise_for_status()
-            return response.json()["response"]
+        if output_format:
+            # "json" ou schéma JSON : Ollama contraint la génération par grammaire
+            payload["format"] = output_format
+        if self.api == "chat":
+            payload["messages"] = messages
+            return "/api/chat", payload
+        payload["prompt"] = "\n".join(message["content"] for message in messages)
+        return "/api/generate", payload
+
+    @staticmethod
+    def _prompt_tokens(payload: Dict[str, Any]) -> int:
+        if "messages" in payload:
+            return sum(estimate_tokens(message["content"]) for message in payload["messages"])
+        return estimate_tokens(payload["prompt"])
+
+    @staticmethod
+    def _text(data: Dict[str, Any]) -> str:
+        # /api/chat renvoie {"message": {"content": ...}}, /api/generate {"response": ...}
+        if "message" in data:
+            return data["message"].get("content") or ""
+        return data.get("response") or ""
 
-    async def generate_structured_response(self, prompt: str, system_message: str = None) -> Dict[str, Any]:
+    async def _generate(
+        self,
+        prompt: str,
+        system_message: str = None,
+        output_format: Union[str, Dict[str, Any]] = None,
+        options: Optional[Dict[str, Any]] = None,
+        caller: Optional[str] = None,
+        history: Optional[List[Message]] = None
+    ) -> str:
+        path, payload = self._request(prompt, system_message, history, False, output_format, options)
+        # L'attente d'une place n'entre pas dans la durée mesurée de l'appel
+        async with self.scheduler.slot():
+            with self._instrument(caller) as call:
+                call["prompt_tokens"] = self._prompt_tokens(payload)
+                response = await self._post(path, payload)
+                call["usage"] = data = response.json()
+        return self._text(data)
+
+    async def _stream(self, path: str, payload: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Lit le flux NDJSON d'Ollama ligne par ligne. Fermer le générateur ferme la connexion,
+        ce qui interrompt la génération côté Ollama.
         """
-        Génère une réponse structurée en JSON à partir d'un prompt
+        client = self.client or httpx.AsyncClient(timeout=self.timeout)
+        try:
+            async with self.pool.lease(self.model) as backend:
+                async with client.stream("POST", f"{backend.url}{path}", json=payload, timeout=self.timeout) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if line.strip():
+                            yield json.loads(line)
+        finally:
+            if client is not self.client:
+                await client.aclose()
+
+    def _cache_key(
+        self,
+        kind: str,
+        prompt: str,
+        system_message: Optional[str],
+        output_format: Union[str, Dict[str, Any]] = None,
+        options: Optional[Dict[str, Any]] = None,
+        history: Optional[List[Message]] = None
+    ) -> str:
+        options = options or self.options
+        if output_format:
+            options = {**options, "format": output_format}
+        return LLMResponseCache.make_key(kind, self.model, prompt, system_message, options, history)
+
+    async def _shared(self, key: str, caller: Optional[str], func: Callable[[], Awaitable[Any]]) -> Any:
         """
-        system_msg = system_message or "Tu es un assistant spécialisé dans la génération de programmes de voyage. Réponds toujours en JSON valide."
-        response = await self.generate_response(prompt, system_msg)
-        import json
-        # Extraction du premier bloc JSON valide
-        match = re.search(r'({[\s\S]*})', response)
-        if match:
-            json_str = match.group(1)
+        Exécute func une seule fois pour les appels identiques simultanés de même classe de priorité.
+        L'échéance s'applique à chaque appelant (il cesse d'attendre à la sienne), pas à l'opération
+        partagée : elle n'est annulée que lorsque tous ses appelants l'ont abandonnée.
+        """
+        async def run():
+            # La tâche partagée hérite du contexte du premier appelant : son échéance ne vaut pas pour les autres
+            _deadline.set(None)
+            return await func()
+
+        async with self._within_deadline(caller):
+            return await self.flights.do((key, current_priority.get()), run)
+
+    async def generate_response(
+        self,
+        prompt: str,
+        system_message: str = None,
+        use_cache: bool = True,
+        caller: Optional[str] = None,
+        history: Optional[List[Message]] = None
+    ) -> str:
+        """
+        Génère une réponse à partir d'un prompt en utilisant Ollama (Mistral 7B).
+        caller ("agent.méthode") étiquette les métriques de l'appel ; history (messages user/assistant
+        précédents) est envoyé entre le message système et le prompt.
+        """
+        key = self._cache_key("text", prompt, system_message, history=history)
+        if self.cache is not None and use_cache:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                self._record_cache_hit()
+                return cached
+        # Un prompt identique déjà en cours n'est pas renvoyé à Ollama : on attend son résultat
+        return await self._shared(key, caller, lambda: self._generate_text(key, prompt, system_message, caller, history))
+
+    async def _generate_text(
+        self,
+        key: str,
+        prompt: str,
+        system_message: Optional[str],
+        caller: Optional[str] = None,
+        history: Optional[List[Message]] = None
+    ) -> str:
+        response = await self._generate(prompt, system_message, caller=caller, history=history)
+        if self.cache is not None:
+            self.cache.set(key, response)
+        return response
+
+    async def stream_response(
+        self,
+        prompt: str,
+        system_message: str = None,
+        use_cache: bool = True,
+        caller: Optional[str] = None,
+        history: Optional[List[Message]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Variante streamée de generate_response : renvoie les fragments de texte au fil de la génération
+        """
+        key = self._cache_key("text", prompt, system_message, history=history)
+        if self.cache is not None and use_cache:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                self._record_cache_hit()
+                yield cached
+                return
+        path, payload = self._request(prompt, system_message, history, True)
+        parts = []
+        # Pas d'échéance : les fragments arrivent au fil de la génération et la déconnexion du client l'interrompt
+        async with self.scheduler.slot():
+            with self._instrument(caller) as call:
+                call["prompt_tokens"] = self._prompt_tokens(payload)
+                async for chunk in self._stream(path, payload):
+                    if chunk.get("error"):
+                        raise Exception(chunk["error"])
+                    text = self._text(chunk)
+                    if text:
+                        parts.append(text)
+                        yield text
+                    if chunk.get("done"):
+                        call["usage"] = chunk
+                        break
+        # Seule une génération complète est mise en cache
+        if self.cache is not None:
+            self.cache.set(key, "".join(parts))
+
+    async def generate_structured_response(
+        self,
+        prompt: str,
+        system_message: str = None,
+        use_cache: bool = True,
+        schema: Optional[Dict[str, Any]] = None,
+        max_tokens: Optional[int] = None,
+        caller: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Génère une réponse structurée en JSON à partir d'un prompt.
+        schema (JSON Schema) contraint la sortie d'Ollama ; à défaut le mode "json" est utilisé.
+        max_tokens remplace num_predict pour les réponses longues (prompts groupés).
+        En cas de hit, le JSON déjà parsé est renvoyé tel quel (à ne pas modifier).
+        """
+        system_msg = system_message or DEFAULT_SYSTEM_MESSAGE
+        output_format = schema or "json"
+        options = {**self.options, "num_predict": max_tokens} if max_tokens else self.options
+        key = self._cache_key("structured", prompt, system_msg, output_format, options)
+        if self.cache is not None and use_cache:
+            cached = await self.cache.get(key)
+            if cached is not None:
+                self._record_cache_hit()
+                return cached
+        return await self._shared(key, caller, lambda: self._generate_structured(key, prompt, system_msg, output_format, options, caller))
+
+    async def _generate_structured(
+        self,
+        key: str,
+        prompt: str,
+        system_message: str,
+        output_format: Union[str, Dict[str, Any]],
+        options: Optional[Dict[str, Any]] = None,
+        caller: Optional[str] = None
+    ) -> Dict[str, Any]:
+        for attempt in range(self.max_parse_retries + 1):
+            response = await self._generate(prompt, system_message, output_format, options, caller)
             try:
-                return json.loads(json_str)
-            except json.JSONDecodeError:
-                pass
-        raise Exception("La réponse n'est pas un JSON valide") 
\ No newline at end of file
+                # Réparation légère puis récupération du préfixe valide avant toute régénération
+                data, status = parse_llm_json(response)
+            except ValueError:
+                self.parse_counts["failed"] += 1
+                logger.warning("Réponse JSON irrécupérable (tentative %d) : %.200s", attempt + 1, response)
+                continue
+            self.parse_counts[status] += 1
+            # Une sortie tronquée n'est pas mise en cache : la prochaine demande retentera une génération complète
+            if self.cache is not None and status != "partial":
+                self.cache.set(key, data)
+            return data
+        self.parse_counts["errors"] += 1
+        raise Exception("La réponse n'est pas un JSON valide")
+
+    def parse_stats(self) -> Dict[str, Any]:
+        """
+        Compteurs d'analyse des réponses structurées : taux de sorties irrécupérables
+        et taux de sorties sauvées par la réparation ou le préfixe valide
+        """
+        counts = self.parse_counts
+        total = counts["ok"] + counts["repaired"] + counts["partial"] + counts["failed"]
+        return {
+            **counts,
+            "failure_rate": round(counts["failed"] / total, 3) if total else 0.0,
+            "repair_rate": round((counts["repaired"] + counts["partial"]) / total, 3) if total else 0.0
+        }
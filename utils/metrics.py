@@ -0,0 +1,262 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import threading
+import bisect
+import time
+import math
+
+# Métriques au format texte Prometheus (0.0.4), sans dépendance externe.
+# Une famille exportée : (nom, type, aide, [(labels, valeur)]) ; les histogrammes produisent
+# leurs séries _bucket/_sum/_count.
+Sample = Tuple[Dict[str, str], float]
+Family = Tuple[str, str, str, List[Sample]]
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def render_families(families: Iterable[Family]) -> str:
+    lines = []
+    for name, kind, documentation, samples in families:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            sample_name = labels.pop("__name__", name)
+            if labels:
+                label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+                lines.append(f"{sample_name}{{{label_text}}} {_format_value(value)}")
+            else:
+                lines.append(f"{sample_name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def family(self) -> Family:
+        with self._lock:
+            samples = [(self._labels(key), value) for key, value in self._values.items()]
+        return self.name, self.kind, self.documentation, samples
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [compteurs par borne (non cumulés), somme, nombre]
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def family(self) -> Family:
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append(({"__name__": f"{self.name}_bucket", **labels, "le": _format_value(bound)}, cumulative))
+                samples.append(({"__name__": f"{self.name}_bucket", **labels, "le": "+Inf"}, count))
+                samples.append(({"__name__": f"{self.name}_sum", **labels}, total))
+                samples.append(({"__name__": f"{self.name}_count", **labels}, count))
+        return self.name, self.kind, self.documentation, samples
+
+class MetricsRegistry:
+    """
+    Métriques de l'application ; les collecteurs ajoutent à chaque lecture des familles calculées
+    à partir de compteurs existants (caches, analyse JSON, disjoncteurs)
+    """
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self, extra: Iterable[Family] = ()) -> str:
+        return render_families([metric.family() for metric in self._metrics] + list(extra))
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "http_request_duration_seconds", "Durée des requêtes HTTP jusqu'au dernier octet de la réponse",
+    ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "Requêtes HTTP en cours", ("method",))
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI : histogramme de latence par route (modèle de chemin, pas l'URL brute)
+    et jauge des requêtes en cours ; les réponses streamées sont mesurées jusqu'au dernier fragment
+    """
+    def __init__(self, app: Callable):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        status = {"code": 500}
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc(method=method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec(method=method)
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                method=method,
+                route=getattr(route, "path", "non_routé"),
+                status=status["code"]
+            )
+
+def service_families(
+    llm_service: Any,
+    agent_manager: Optional[Any] = None,
+    external_services: Optional[Any] = None,
+    warmup: Optional[Any] = None
+) -> List[Family]:
+    """
+    Familles calculées à la lecture depuis les compteurs des services (aucune double comptabilité)
+    """
+    families: List[Family] = [
+        ("llm_parse_total", "counter", "Réponses structurées par résultat d'analyse JSON",
+         [({"outcome": outcome}, count) for outcome, count in llm_service.parse_counts.items()]),
+        ("llm_singleflight_total", "counter", "Appels LLM exécutés ou fusionnés avec un appel identique en cours",
+         [({"result": "executed"}, llm_service.flights.executed), ({"result": "coalesced"}, llm_service.flights.coalesced)]),
+    ]
+    backends = llm_service.pool.status()["backends"]
+    families += [
+        ("ollama_backend_healthy", "gauge", "1 si le backend Ollama est sain (0 : retiré du pool)",
+         [({"backend": url}, int(state["healthy"])) for url, state in backends.items()]),
+        ("ollama_backend_in_flight", "gauge", "Appels en cours par backend Ollama",
+         [({"backend": url}, state["in_flight"]) for url, state in backends.items()]),
+        ("ollama_backend_calls_total", "counter", "Appels attribués à chaque backend Ollama",
+         [({"backend": url}, state["calls"]) for url, state in backends.items()]),
+    ]
+    classes = llm_service.scheduler.status()["classes"]
+    families += [
+        ("llm_queue_depth", "gauge", "Appels LLM en attente d'une place par classe de priorité",
+         [({"priority": name}, state["queued"]) for name, state in classes.items()]),
+        ("llm_running", "gauge", "Appels LLM en cours par classe de priorité",
+         [({"priority": name}, state["running"]) for name, state in classes.items()]),
+        ("llm_estimated_wait_seconds", "gauge", "Attente estimée d'un nouvel appel LLM par classe de priorité",
+         [({"priority": name}, state["estimated_wait_seconds"]) for name, state in classes.items()]),
+        ("llm_admission_total", "counter", "Requêtes admises ou refusées (file pleine, attente trop longue) par classe",
+         [({"priority": name, "result": "admitted"}, state["admitted"]) for name, state in classes.items()]
+         + [({"priority": name, "result": reason}, count)
+            for name, state in classes.items() for reason, count in state["rejected"].items()]),
+    ]
+    if llm_service.cache is not None:
+        stats = llm_service.cache.stats()
+        families += [
+            ("llm_cache_requests_total", "counter", "Consultations du cache des réponses LLM",
+             [({"result": "hit"}, stats["hits"] - stats["disk_hits"]), ({"result": "disk_hit"}, stats["disk_hits"]),
+              ({"result": "miss"}, stats["misses"])]),
+            ("llm_cache_entries", "gauge", "Entrées du niveau mémoire du cache LLM", [({}, stats["memory_entries"])]),
+        ]
+    if warmup is not None:
+        status = warmup.status()
+        families += [
+            ("app_ready", "gauge", "1 si le worker est prêt (modèle chargé sur au moins un backend)", [({}, int(status["ready"]))]),
+            ("app_warmup_seconds", "gauge", "Durée du démarrage jusqu'au modèle chargé",
+             [({}, status["warm_seconds"])] if status["warm_seconds"] is not None else []),
+        ]
+    if agent_manager is not None:
+        families.append(("chat_intent_total", "counter", "Intentions du chat classées localement ou par le LLM",
+                         [({"classifier": path}, count) for path, count in agent_manager.intent_stats.items()]))
+    if external_services is not None:
+        external = external_services.status()
+        status = external["sources"]
+        families += [
+            ("external_cache_requests_total", "counter", "Consultations du cache des sources externes",
+             [({"source": source, "result": result}, state["cache"][key])
+              for source, state in status.items() for result, key in (("hit", "hits"), ("miss", "misses"))]),
+            ("external_breaker_open", "gauge", "1 si le disjoncteur de la source est ouvert ou en test",
+             [({"source": source}, 0 if state["breaker"]["state"] == "closed" else 1) for source, state in status.items()]),
+            ("external_breaker_rejected_total", "counter", "Appels refusés par le disjoncteur",
+             [({"source": source}, state["breaker"]["rejected"]) for source, state in status.items()]),
+        ]
+        catalog = external["catalog"]
+        if catalog is not None:
+            families += [
+                ("activity_catalog_activities", "gauge", "Activités dans la copie locale du catalogue",
+                 [({}, catalog["activities"])]),
+                ("activity_catalog_ready", "gauge", "1 si les requêtes d'activités sont servies par la copie locale",
+                 [({}, 1 if catalog["ready"] else 0)]),
+                ("activity_catalog_sync_total", "counter", "Synchronisations du catalogue par résultat",
+                 [({"result": "ok"}, catalog["syncs"]), ({"result": "error"}, catalog["sync_errors"])]),
+                ("activity_catalog_queries_total", "counter", "Requêtes servies par la copie locale du catalogue",
+                 [({}, catalog["queries"])]),
+            ]
+    return families
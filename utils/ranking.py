@@ -0,0 +1,279 @@
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+from datetime import date
+from utils.metrics import REGISTRY
+from utils.catalog import activity_cost
+import unicodedata
+import re
+import os
+
+# Mots associés à chaque mood (sans accents), cherchés dans la catégorie, le nom et la description
+MOOD_KEYWORDS: Dict[str, Tuple[str, ...]] = {
+    "culture": ("musee", "museum", "monument", "histoire", "history", "art", "patrimoine", "architecture", "cathedrale", "chateau", "exposition", "visite"),
+    "aventure": ("randonnee", "hiking", "kayak", "escalade", "vtt", "rafting", "plongee", "parapente", "quad", "trek", "aventure"),
+    "nature": ("parc", "park", "jardin", "garden", "randonnee", "foret", "lac", "montagne", "plage", "nature", "croisiere"),
+    "detente": ("spa", "hammam", "plage", "beach", "massage", "bien-etre", "croisiere", "jardin", "thermes", "detente"),
+    "romantique": ("croisiere", "coucher", "sunset", "diner", "spa", "vin", "wine", "panorama", "romantique", "balade"),
+    "gastronomie": ("gastronomie", "food", "cuisine", "degustation", "tasting", "marche", "market", "restaurant", "vin", "wine", "atelier"),
+    "fete": ("bar", "nightlife", "concert", "club", "soiree", "festival", "pub", "cabaret", "fete"),
+    "famille": ("zoo", "aquarium", "parc", "famille", "family", "enfants", "kids", "atelier", "plage"),
+}
+
+# Mots ignorés pour reconnaître une même activité sous deux libellés
+STOPWORDS = frozenset((
+    "de", "du", "des", "la", "le", "les", "l", "d", "a", "au", "aux", "et", "en", "the", "of", "and", "to", "in", "with", "avec"
+))
+
+SELECTION_CANDIDATES = REGISTRY.counter(
+    "selection_candidates_total", "Activités candidates des prompts de sélection par issue du pré-classement local", ("outcome",)
+)
+SELECTION_TOKENS_SAVED = REGISTRY.counter(
+    "selection_prompt_tokens_saved_total", "Tokens de prompt de sélection évités par le pré-classement local (estimation)"
+)
+SELECTION_SECONDS_SAVED = REGISTRY.counter(
+    "selection_prompt_eval_saved_seconds_total", "Temps d'évaluation de prompt évité par le pré-classement local (estimation)"
+)
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode()
+    return text.casefold()
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+(?:-[a-z0-9]+)*", _normalize(text))
+
+def name_key(name: str) -> FrozenSet[str]:
+    """
+    Mots significatifs d'un nom d'activité : "Visite guidée du Colisée" et "Colisée : visite guidée"
+    ont la même clé
+    """
+    return frozenset(word for word in _words(name) if word not in STOPWORDS)
+
+def _first(raw: Dict[str, Any], *keys: str) -> Any:
+    for key in keys:
+        value = raw.get(key)
+        if value not in (None, "", [], {}):
+            return value
+    return None
+
+def _duration_hours(raw: Dict[str, Any]) -> Optional[float]:
+    value = _first(raw, "duration_hours", "duration", "duree")
+    if isinstance(value, dict):
+        minutes = _first(value, "fixedDurationInMinutes", "variableDurationFromMinutes", "minutes")
+        return round(float(minutes) / 60, 2) if isinstance(minutes, (int, float)) else None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return None
+
+def _rating(raw: Dict[str, Any]) -> float:
+    value = _first(raw, "rating", "note")
+    reviews = raw.get("reviews")
+    if value is None and isinstance(reviews, dict):
+        value = reviews.get("combinedAverageRating")
+    try:
+        return min(5.0, max(0.0, float(value))) if value is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+def _source(raw: Dict[str, Any]) -> str:
+    if raw.get("source"):
+        return str(raw["source"])
+    # Produits Viator : code produit ou titre (les lignes Supabase ont un nom)
+    return "viator" if "productCode" in raw or ("title" in raw and "name" not in raw) else "supabase"
+
+class RankingStats:
+    """
+    Compteurs du pré-classement d'une requête (candidates reçues, écartées, gardées, prompt évité)
+    """
+    def __init__(self):
+        self.received = 0
+        self.over_budget = 0
+        self.duplicates = 0
+        self.kept = 0
+        self.prompt_tokens_saved = 0
+        self.prompt_eval_seconds_saved = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "over_budget": self.over_budget,
+            "duplicates": self.duplicates,
+            "kept": self.kept,
+            "prompt_tokens_saved": self.prompt_tokens_saved,
+            "prompt_eval_seconds_saved": round(self.prompt_eval_seconds_saved, 3)
+        }
+
+class CandidateRanker:
+    """
+    Pré-classement local des activités candidates (Supabase et Viator) avant le prompt de sélection :
+    filtre sur le budget du jour, score selon le mood (catégorie, mots du nom et de la description,
+    note), doublons entre sources retirés, K meilleures gardées et réduites aux champs utiles au LLM.
+    Le lien de réservation n'est pas envoyé au LLM : il est repris après la sélection (details).
+    """
+    def __init__(self, top_k: int = 12, description_chars: int = 160, enabled: bool = True):
+        self.top_k = top_k
+        self.description_chars = description_chars
+        self.enabled = enabled
+
+    @classmethod
+    def from_env(cls) -> "CandidateRanker":
+        return cls(
+            top_k=int(os.getenv("V2_CANDIDATES_TOP_K", "12")),
+            description_chars=int(os.getenv("V2_CANDIDATE_DESCRIPTION_CHARS", "160")),
+            enabled=os.getenv("V2_CANDIDATE_RANKING", "1") != "0"
+        )
+
+    def top_k_for(self, days: int) -> int:
+        """
+        Candidates gardées pour un prompt couvrant days jours : au moins 3 par jour (pas deux fois
+        la même activité sur le séjour)
+        """
+        return max(self.top_k, 3 * days)
+
+    def _truncate(self, text: str) -> str:
+        if len(text) <= self.description_chars:
+            return text
+        return text[:self.description_chars].rsplit(" ", 1)[0].rstrip(",;:.") + "…"
+
+    def _prepare(self, raw: Dict[str, Any], terms: FrozenSet[str], budget: float) -> Optional[Tuple[float, bool, FrozenSet[str], Dict[str, Any], Dict[str, Any]]]:
+        """
+        (score, dans le budget, clé du nom, projection, détails) d'une candidate, None si elle est inexploitable
+        """
+        if not isinstance(raw, dict):
+            return None
+        name = _first(raw, "name", "title", "productName", "nom")
+        if not isinstance(name, str):
+            return None
+        cost = activity_cost(raw)
+        description = _first(raw, "description", "shortDescription", "summary", "desc")
+        category = _first(raw, "category", "type")
+        if isinstance(category, list):
+            category = category[0]
+        location = _first(raw, "location", "lieu", "address")
+        projected = {
+            "name": name,
+            "description": self._truncate(str(description)) if description else None,
+            "cost": cost,
+            "duration_hours": _duration_hours(raw),
+            "category": str(category) if category else None,
+            "location": location if isinstance(location, str) else None,
+            "source": _source(raw)
+        }
+        projected = {key: value for key, value in projected.items() if value is not None}
+        text = set(_words(f"{name} {description or ''} {category or ''}"))
+        score = min(3, len(terms & text))
+        if category and terms & set(_words(str(category))):
+            score += 3
+        score += _rating(raw) / 5
+        if cost is None:
+            # Budget incertain : passe après une activité équivalente de coût connu
+            score -= 0.5
+        details = {
+            "booking_url": _first(raw, "booking_url", "bookingUrl", "productUrl", "webURL", "url"),
+            "source": projected["source"]
+        }
+        return score, cost is None or cost <= budget, name_key(name), projected, details
+
+    def rank(
+        self,
+        candidates: List[Dict[str, Any]],
+        mood: str,
+        budget: float,
+        k: int,
+        stats: Optional[RankingStats] = None,
+        memo: Optional[Dict[int, Any]] = None,
+        details: Optional[Dict[FrozenSet[str], Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        K meilleures candidates projetées, par score décroissant (ordre d'origine à égalité).
+        memo (par identité d'objet) évite de recalculer une candidate proposée plusieurs jours ;
+        details reçoit, par clé de nom, le lien de réservation et la source des candidates gardées.
+        """
+        terms = self._terms(mood)
+        memo = {} if memo is None else memo
+        prepared = []
+        over_budget = 0
+        for index, raw in enumerate(candidates):
+            entry = memo.get(id(raw))
+            if entry is None:
+                entry = memo[id(raw)] = (raw, self._prepare(raw, terms, budget))
+            result = entry[1]
+            if result is None:
+                continue
+            if not result[1]:
+                over_budget += 1
+                continue
+            prepared.append((-result[0], index, result))
+        prepared.sort(key=lambda item: item[:2])
+        kept: List[Dict[str, Any]] = []
+        kept_keys: List[FrozenSet[str]] = []
+        duplicates = 0
+        for _, _, (_, _, key, projected, extra) in prepared:
+            if len(kept) >= k:
+                break
+            if any(_near_duplicate(key, other) for other in kept_keys):
+                duplicates += 1
+                continue
+            kept.append(projected)
+            kept_keys.append(key)
+            if details is not None:
+                details.setdefault(key, extra)
+        if stats is not None:
+            stats.received += len(candidates)
+            stats.over_budget += over_budget
+            stats.duplicates += duplicates
+            stats.kept += len(kept)
+        SELECTION_CANDIDATES.inc(len(kept), outcome="kept")
+        SELECTION_CANDIDATES.inc(over_budget, outcome="over_budget")
+        SELECTION_CANDIDATES.inc(duplicates, outcome="duplicate")
+        SELECTION_CANDIDATES.inc(len(candidates) - len(kept) - over_budget - duplicates, outcome="dropped")
+        return kept
+
+    def rank_days(
+        self,
+        activities_by_day: Dict[date, List[Dict[str, Any]]],
+        mood: str,
+        budget: float,
+        k: int,
+        stats: Optional[RankingStats] = None,
+        details: Optional[Dict[FrozenSet[str], Dict[str, Any]]] = None
+    ) -> Dict[date, List[Dict[str, Any]]]:
+        """
+        Pré-classement de chaque jour d'une destination ; une candidate proposée tous les jours
+        (catalogue Supabase) n'est évaluée qu'une fois et garde la même projection d'un jour à l'autre
+        """
+        memo: Dict[int, Any] = {}
+        return {
+            day: self.rank(candidates, mood, budget, k, stats, memo, details)
+            for day, candidates in activities_by_day.items()
+        }
+
+    @staticmethod
+    def _terms(mood: str) -> FrozenSet[str]:
+        words = _words(mood)
+        terms = set(words)
+        for word in words:
+            terms.update(MOOD_KEYWORDS.get(word, ()))
+        return frozenset(terms)
+
+    @staticmethod
+    def record_saved(stats: RankingStats, tokens: int, seconds_per_token: Optional[float]):
+        """
+        Prompt évité (tokens estimés), valorisé au débit d'évaluation de prompt observé sur Ollama
+        """
+        tokens = max(0, tokens)
+        seconds = tokens * seconds_per_token if seconds_per_token else 0.0
+        stats.prompt_tokens_saved += tokens
+        stats.prompt_eval_seconds_saved += seconds
+        SELECTION_TOKENS_SAVED.inc(tokens)
+        SELECTION_SECONDS_SAVED.inc(seconds)
+
+def _near_duplicate(key: FrozenSet[str], other: FrozenSet[str]) -> bool:
+    """
+    Même activité sous deux libellés : mêmes mots significatifs, ou l'un contenu dans l'autre
+    avec au plus un mot d'écart ("Colisée visite guidée" / "Visite guidée du Colisée et forum")
+    """
+    if key == other:
+        return True
+    if not key or not other:
+        return False
+    small, large = (key, other) if len(key) <= len(other) else (other, key)
+    return len(small) >= 2 and small <= large and len(large) - len(small) <= 1
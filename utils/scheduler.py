@@ -0,0 +1,208 @@
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Sequence
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from collections import deque
+from utils.metrics import REGISTRY
+import asyncio
+import math
+import time
+import os
+
+# Classes de priorité, dans l'ordre de service : une place libérée va d'abord au chat
+PRIORITIES = ("interactive", "bulk")
+
+# Classe des appels LLM de la requête en cours (héritée par les tâches qu'elle lance)
+current_priority: ContextVar[Optional[str]] = ContextVar("llm_priority", default=None)
+
+LLM_QUEUE_WAIT = REGISTRY.histogram("llm_queue_wait_seconds", "Attente d'une place d'appel LLM par classe de priorité", ("priority",))
+
+class LLMOverloaded(Exception):
+    """
+    Requête refusée à l'admission : file d'attente pleine ou attente estimée trop longue.
+    retry_after (secondes) est renvoyé au client dans l'en-tête Retry-After.
+    """
+    def __init__(self, priority: str, reason: str, retry_after: float):
+        self.priority = priority
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(
+            f"Service LLM saturé ({priority}, {reason}) : réessayer dans {self.retry_after} s"
+        )
+
+class PriorityClass:
+    """
+    Classe de priorité : limite d'appels simultanés, file d'attente bornée, attente maximale
+    acceptée à l'admission et durée moyenne d'un appel (moyenne mobile exponentielle)
+    """
+    def __init__(self, name: str, limit: int = 0, max_queue: int = 0, max_wait: float = 0, initial_seconds: float = 0):
+        self.name = name
+        # 0 : pas de limite propre (seule la capacité totale s'applique)
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.running = 0
+        self.waiting: Deque[asyncio.Future] = deque()
+        # Estimation de départ, remplacée par la mesure dès la fin du premier appel
+        self.avg_seconds = initial_seconds
+        self.calls = 0
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "wait": 0}
+        self.waited_seconds = 0.0
+
+    def observe(self, seconds: float, alpha: float):
+        self.avg_seconds = seconds if not self.calls else alpha * seconds + (1 - alpha) * self.avg_seconds
+        self.calls += 1
+
+class LLMScheduler:
+    """
+    Ordonnanceur des appels LLM : au plus capacity appels simultanés au total (et limit par classe),
+    les autres attendent dans la file de leur classe. À chaque place libérée, les files sont servies
+    par ordre de priorité : un message de chat passe devant les appels d'une génération de programme
+    en cours. Par défaut la classe bulk n'occupe jamais toute la capacité, une place reste au chat.
+
+    L'admission (admit) refuse une requête quand la file de sa classe est pleine ou que l'attente
+    estimée de son premier appel dépasse max_wait : le client reçoit un 503 immédiat plutôt qu'une
+    connexion tenue plusieurs minutes. Une requête admise n'est plus refusée en cours de route,
+    ses appels suivants attendent leur tour.
+    """
+    def __init__(self, classes: Sequence[PriorityClass], capacity: int = 0, alpha: float = 0.2):
+        self.classes: Dict[str, PriorityClass] = {cls.name: cls for cls in classes}
+        # 0 : pas de limite totale
+        self.capacity = capacity
+        self.alpha = alpha
+
+    @classmethod
+    def from_env(cls, pool_capacity: int = 0) -> "LLMScheduler":
+        """
+        LLM_CONCURRENCY : appels simultanés au total (par défaut la capacité du pool de backends) ;
+        LLM_<CLASSE>_CONCURRENCY, LLM_<CLASSE>_QUEUE et LLM_<CLASSE>_MAX_WAIT par classe ;
+        LLM_CALL_SECONDS : durée supposée d'un appel avant la première mesure
+        """
+        capacity = int(os.getenv("LLM_CONCURRENCY", str(pool_capacity)))
+        initial_seconds = float(os.getenv("LLM_CALL_SECONDS", "10"))
+        defaults = {
+            "interactive": (0, 32, 20.0),
+            # Une place réservée au chat quand la capacité est bornée
+            "bulk": (capacity - 1 if capacity > 1 else capacity, 128, 120.0),
+        }
+        classes = []
+        for name in PRIORITIES:
+            limit, max_queue, max_wait = defaults[name]
+            prefix = f"LLM_{name.upper()}_"
+            classes.append(PriorityClass(
+                name,
+                int(os.getenv(prefix + "CONCURRENCY", str(limit))),
+                int(os.getenv(prefix + "QUEUE", str(max_queue))),
+                float(os.getenv(prefix + "MAX_WAIT", str(max_wait))),
+                initial_seconds
+            ))
+        return cls(classes, capacity)
+
+    def _running(self) -> int:
+        return sum(cls.running for cls in self.classes.values())
+
+    def _can_start(self, cls: PriorityClass) -> bool:
+        if cls.limit and cls.running >= cls.limit:
+            return False
+        return not self.capacity or self._running() < self.capacity
+
+    def estimated_wait(self, name: str) -> float:
+        """
+        Attente estimée d'un nouvel appel de la classe : appels en file devant lui (classes
+        prioritaires comprises) et une fin d'appel en cours, répartis sur les places de la classe
+        """
+        cls = self.classes[name]
+        if not cls.waiting and self._can_start(cls):
+            return 0.0
+        slots = min(limit for limit in (cls.limit, self.capacity) if limit)
+        work = cls.avg_seconds
+        for other in self.classes.values():
+            work += len(other.waiting) * other.avg_seconds
+            if other is cls:
+                break
+        return work / max(1, slots)
+
+    def admit(self, name: str):
+        """
+        Contrôle d'admission d'une requête de la classe name ; lève LLMOverloaded en cas de refus
+        """
+        cls = self.classes[name]
+        wait = self.estimated_wait(name)
+        if cls.max_queue and len(cls.waiting) >= cls.max_queue:
+            cls.rejected["queue_full"] += 1
+            raise LLMOverloaded(name, "queue_full", wait)
+        if cls.max_wait and wait > cls.max_wait:
+            cls.rejected["wait"] += 1
+            raise LLMOverloaded(name, "wait", wait)
+        cls.admitted += 1
+
+    async def _acquire(self, cls: PriorityClass) -> float:
+        if not cls.waiting and self._can_start(cls):
+            cls.running += 1
+            return 0.0
+        waiter = asyncio.get_running_loop().create_future()
+        cls.waiting.append(waiter)
+        start = time.perf_counter()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Place attribuée juste avant l'annulation : elle est rendue
+                self._release(cls)
+            elif waiter in cls.waiting:
+                cls.waiting.remove(waiter)
+            raise
+        return time.perf_counter() - start
+
+    def _release(self, cls: PriorityClass):
+        cls.running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        for cls in self.classes.values():
+            while cls.waiting and self._can_start(cls):
+                waiter = cls.waiting.popleft()
+                if waiter.done():
+                    continue
+                # La place est comptée dès l'attribution : aucun appel ne peut la prendre entre-temps
+                cls.running += 1
+                waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, name: Optional[str] = None) -> AsyncIterator[None]:
+        """
+        Réserve une place d'appel LLM pour la classe name (à défaut celle de la requête en cours,
+        interactive hors requête)
+        """
+        cls = self.classes[name or current_priority.get() or PRIORITIES[0]]
+        waited = await self._acquire(cls)
+        cls.waited_seconds += waited
+        LLM_QUEUE_WAIT.observe(waited, priority=cls.name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.observe(time.perf_counter() - start, self.alpha)
+            self._release(cls)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity or None,
+            "running": self._running(),
+            "classes": {
+                name: {
+                    "limit": cls.limit or None,
+                    "running": cls.running,
+                    "queued": len(cls.waiting),
+                    "max_queue": cls.max_queue or None,
+                    "max_wait_seconds": cls.max_wait or None,
+                    "estimated_wait_seconds": round(self.estimated_wait(name), 3),
+                    "avg_call_seconds": round(cls.avg_seconds, 3),
+                    "calls": cls.calls,
+                    "waited_seconds": round(cls.waited_seconds, 3),
+                    "admitted": cls.admitted,
+                    "rejected": dict(cls.rejected)
+                }
+                for name, cls in self.classes.items()
+            }
+        }
@@ -0,0 +1,32 @@
+from typing import Any
+from fastapi.responses import Response
+from pydantic import BaseModel
+import orjson
+
+# Clés non textuelles (dates des activités par jour) acceptées, converties en chaînes
+_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+def dumps(value: Any, sort_keys: bool = False) -> bytes:
+    """
+    JSON compact en UTF-8 (orjson) ; dates et heures en ISO 8601, autres types inconnus via str()
+    """
+    return orjson.dumps(value, default=str, option=(_OPTIONS | orjson.OPT_SORT_KEYS) if sort_keys else _OPTIONS)
+
+def compact_json(value: Any, sort_keys: bool = False) -> str:
+    """
+    JSON compact (sans indentation ni espaces) à insérer dans un prompt
+    """
+    return dumps(value, sort_keys).decode()
+
+def loads(data: Any) -> Any:
+    return orjson.loads(data)
+
+class ModelResponse(Response):
+    """
+    Réponse JSON d'un modèle déjà validé, sérialisé directement par pydantic-core : FastAPI ne le
+    revalide pas contre response_model (qui reste utilisé pour la documentation OpenAPI)
+    """
+    media_type = "application/json"
+
+    def render(self, content: BaseModel) -> bytes:
+        return content.model_dump_json().encode()
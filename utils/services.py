@@ -1,54 +1,241 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Callable, Awaitable
+from utils.singleflight import SingleFlight
+from utils.cache import TTLCache
+from utils.breaker import CircuitBreaker
+from utils.catalog import ActivityCatalog, activity_cost
+import asyncio
 import httpx
 from datetime import date
 import os
 
+SOURCE_LABELS = {"supabase": "Supabase", "viator": "Viator"}
+
 class ExternalServices:
-    def __init__(self):
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
         self.supabase_url = os.getenv("SUPABASE_URL")
         self.supabase_key = os.getenv("SUPABASE_KEY")
         self.viator_api_key = os.getenv("VIATOR_API_KEY")
+        self.viator_url = os.getenv("VIATOR_API_URL", "https://api.viator.com/v1")
+        # Client HTTP mutualisé (injecté par le lifespan de l'application)
+        self.client = client
+        # Fusion des requêtes identiques en cours (même destination, mêmes critères)
+        self.flights = SingleFlight()
+        # Nombre maximal de destinations interrogées simultanément par les requêtes groupées
+        self.max_concurrency = int(os.getenv("EXTERNAL_MAX_CONCURRENCY", "4"))
+        # Données de catalogue peu changeantes : cache long ; réponses vides ou en échec : cache court
+        self.cache_ttl = float(os.getenv("EXTERNAL_CACHE_TTL", "900"))
+        self.negative_ttl = float(os.getenv("EXTERNAL_NEGATIVE_TTL", "30"))
+        cache_size = int(os.getenv("EXTERNAL_CACHE_SIZE", "1024"))
+        self.caches = {source: TTLCache(cache_size) for source in SOURCE_LABELS}
+        self.breakers = {
+            source: CircuitBreaker(
+                failure_threshold=int(os.getenv("EXTERNAL_BREAKER_THRESHOLD", "5")),
+                reset_timeout=float(os.getenv("EXTERNAL_BREAKER_RESET", "30"))
+            )
+            for source in SOURCE_LABELS
+        }
+        # Copie locale de la table activities, chargée par start() ; tant qu'elle n'est pas prête
+        # (ou si sa synchronisation échoue trop longtemps), les requêtes passent par Supabase
+        self.catalog: Optional[ActivityCatalog] = None
 
-    async def get_supabase_activities(self, destination: str, mood: str, budget: float) -> List[Dict[str, Any]]:
+    def start(self):
+        """
+        Charge puis synchronise en tâche de fond le catalogue local d'activités (ACTIVITY_CATALOG=1,
+        désactivé par défaut : la table Supabase doit exposer le curseur de synchronisation)
+        """
+        if self.catalog is None and os.getenv("ACTIVITY_CATALOG", "0") == "1" and self._configured("supabase"):
+            self.catalog = ActivityCatalog.from_env(self.fetch_activities_page, activity_cost)
+            self.catalog.start()
+
+    async def close(self):
+        if self.catalog is not None:
+            await self.catalog.close()
+
+    async def _get(self, url: str, params: Dict[str, Any], headers: Dict[str, str]) -> httpx.Response:
+        """
+        Envoie une requête GET via le client partagé (ou un client éphémère à défaut)
+        """
+        if self.client is not None:
+            return await self.client.get(url, params=params, headers=headers)
+        async with httpx.AsyncClient() as client:
+            return await client.get(url, params=params, headers=headers)
+
+    def _configured(self, source: str) -> bool:
+        if source == "supabase":
+            return bool(self.supabase_url and self.supabase_key)
+        return bool(self.viator_api_key)
+
+    async def _call(self, source: str, key: Tuple, fetch: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
         """
-        Récupère les activités depuis Supabase
+        Appel d'une source externe protégé par le cache (TTL, cache négatif des échecs et réponses
+        vides), la fusion des requêtes identiques en cours et le disjoncteur de la source
         """
+        cached = self.caches[source].get(key)
+        if cached is not None:
+            return cached
+        return await self.flights.do(key, lambda: self._call_source(source, key, fetch))
+
+    async def _call_source(self, source: str, key: Tuple, fetch: Callable[[], Awaitable[List[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+        # Source non configurée : inutile d'attendre un timeout
+        if not self._configured(source):
+            return []
+        breaker = self.breakers[source]
+        if not breaker.allow():
+            return []
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.supabase_url}/activities",
-                    params={
-                        "destination": destination,
-                        "mood": mood,
-                        "max_budget": budget
-                    },
-                    headers={"apikey": self.supabase_key}
-                )
-                response.raise_for_status()
-                return response.json()
+            result = await fetch()
+        except asyncio.CancelledError:
+            breaker.abandon()
+            raise
         except Exception as e:
-            print(f"Erreur Supabase: {str(e)}")
+            print(f"Erreur {SOURCE_LABELS[source]}: {str(e)}")
+            breaker.record_failure()
+            self.caches[source].set(key, [], self.negative_ttl)
             return []
+        breaker.record_success()
+        self.caches[source].set(key, result, self.cache_ttl if result else self.negative_ttl)
+        return result
+
+    def status(self) -> Dict[str, Any]:
+        """
+        État des sources externes (configuration, disjoncteur, cache) pour la supervision
+        """
+        return {
+            "sources": {
+                source: {
+                    "configured": self._configured(source),
+                    "breaker": self.breakers[source].snapshot(),
+                    "cache": self.caches[source].stats()
+                }
+                for source in SOURCE_LABELS
+            },
+            "coalescing": self.flights.stats(),
+            "catalog": self.catalog.status() if self.catalog is not None else None
+        }
+
+    async def get_supabase_activities(self, destination: str, mood: str, budget: float) -> List[Dict[str, Any]]:
+        """
+        Récupère les activités depuis Supabase (depuis la copie locale du catalogue si elle est prête)
+        """
+        if self.catalog is not None and self.catalog.ready:
+            return self.catalog.query(destination, mood, budget)
+        return await self._call(
+            "supabase",
+            ("supabase", destination, mood, budget),
+            lambda: self._fetch_supabase_activities(destination, mood, budget)
+        )
+
+    async def _fetch_supabase_activities(self, destination: str, mood: str, budget: float) -> List[Dict[str, Any]]:
+        response = await self._get(
+            f"{self.supabase_url}/activities",
+            params={
+                "destination": destination,
+                "mood": mood,
+                "max_budget": budget
+            },
+            headers={"apikey": self.supabase_key}
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def fetch_activities_page(self, cursor: Optional[Tuple[str, Any]], limit: int) -> List[Dict[str, Any]]:
+        """
+        Page de synchronisation du catalogue : activités (suppressions comprises) postérieures au
+        curseur (updated_at, id), triées par (updated_at, id)
+        """
+        params: Dict[str, Any] = {"order": "updated_at,id", "limit": limit}
+        if cursor is not None:
+            params["updated_after"], params["after_id"] = cursor
+        response = await self._get(
+            f"{self.supabase_url}/activities",
+            params=params,
+            headers={"apikey": self.supabase_key}
+        )
+        response.raise_for_status()
+        return response.json()
 
     async def get_viator_activities(self, destination: str, date: date) -> List[Dict[str, Any]]:
         """
         Récupère les activités depuis Viator
         """
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    "https://api.viator.com/v1/products",
-                    params={
-                        "destId": destination,
-                        "date": date.isoformat()
-                    },
-                    headers={"exp-api-key": self.viator_api_key}
-                )
-                response.raise_for_status()
-                return response.json().get("products", [])
-        except Exception as e:
-            print(f"Erreur Viator: {str(e)}")
-            return []
+        return await self._call(
+            "viator",
+            ("viator", destination, date),
+            lambda: self._fetch_viator_activities(destination, date)
+        )
+
+    async def _fetch_viator_activities(self, destination: str, date: date) -> List[Dict[str, Any]]:
+        response = await self._get(
+            f"{self.viator_url}/products",
+            params={
+                "destId": destination,
+                "date": date.isoformat()
+            },
+            headers={"exp-api-key": self.viator_api_key}
+        )
+        response.raise_for_status()
+        return response.json().get("products", [])
+
+    async def get_viator_activities_range(self, destination: str, start_date: date, end_date: date) -> List[Dict[str, Any]]:
+        """
+        Récupère en une requête les activités Viator d'une destination sur une plage de dates
+        """
+        return await self._call(
+            "viator",
+            ("viator_range", destination, start_date, end_date),
+            lambda: self._fetch_viator_activities_range(destination, start_date, end_date)
+        )
+
+    async def _fetch_viator_activities_range(self, destination: str, start_date: date, end_date: date) -> List[Dict[str, Any]]:
+        response = await self._get(
+            f"{self.viator_url}/products",
+            params={
+                "destId": destination,
+                "startDate": start_date.isoformat(),
+                "endDate": end_date.isoformat()
+            },
+            headers={"exp-api-key": self.viator_api_key}
+        )
+        response.raise_for_status()
+        return response.json().get("products", [])
+
+    async def get_destination_activities(self, destination: str, mood: str, daily_budgets: Dict[date, float]) -> Dict[date, List[Dict[str, Any]]]:
+        """
+        Activités externes de chaque jour d'une destination : une requête Supabase (budget maximal
+        des jours) et une requête Viator (plage de dates) en parallèle, puis répartition locale par jour
+        """
+        if not daily_budgets:
+            return {}
+        days = sorted(daily_budgets)
+        supabase_activities, viator_activities = await asyncio.gather(
+            self.get_supabase_activities(destination, mood, max(daily_budgets.values())),
+            self.get_viator_activities_range(destination, days[0], days[-1])
+        )
+        viator_by_day = _split_by_day(viator_activities, days)
+        return {
+            day: [
+                activity for activity in supabase_activities
+                if activity_cost(activity) is None or activity_cost(activity) <= budget
+            ] + viator_by_day[day]
+            for day, budget in daily_budgets.items()
+        }
+
+    async def get_activities_for_destinations(
+        self,
+        destinations: Sequence[Tuple[str, Dict[date, float]]],
+        mood: str
+    ) -> List[Dict[date, List[Dict[str, Any]]]]:
+        """
+        Requêtes groupées de plusieurs destinations (destination, budget par jour), lancées en
+        parallèle dans la limite de max_concurrency ; résultats dans l'ordre des destinations
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def fetch(destination: str, daily_budgets: Dict[date, float]):
+            async with semaphore:
+                return await self.get_destination_activities(destination, mood, daily_budgets)
+
+        return await asyncio.gather(*(fetch(destination, budgets) for destination, budgets in destinations))
 
     async def find_lodging(self, destination: str, check_in: date, check_out: date, budget: float) -> Dict[str, Any]:
         """
@@ -76,4 +263,29 @@ class ExternalServices:
             "arrival_time": "12:00",
             "cost": 50.0,
             "booking_url": "https://example.com"
-        } 
\ No newline at end of file
+        }
+
+def _product_dates(product: Dict[str, Any]) -> Optional[List[str]]:
+    if product.get("date"):
+        return [str(product["date"])[:10]]
+    dates = product.get("availableDates") or product.get("available_dates")
+    if dates:
+        return [str(d)[:10] for d in dates]
+    return None
+
+def _split_by_day(products: List[Dict[str, Any]], days: List[date]) -> Dict[date, List[Dict[str, Any]]]:
+    """
+    Répartit les produits d'une plage de dates par jour ; un produit sans date est proposé tous les jours
+    """
+    by_day = {day: [] for day in days}
+    iso_days = {day.isoformat(): day for day in days}
+    for product in products:
+        dates = _product_dates(product)
+        if dates is None:
+            for day in days:
+                by_day[day].append(product)
+            continue
+        for iso in dates:
+            if iso in iso_days:
+                by_day[iso_days[iso]].append(product)
+    return by_day
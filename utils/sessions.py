@@ -0,0 +1,269 @@
+from typing import Dict, List, Optional, Tuple
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+import threading
+import asyncio
+import sqlite3
+import time
+import os
+
+# Représentation compacte d'un message : (rôle codé, contenu, horodatage epoch)
+ROLES = ("user", "assistant", "system")
+_ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+Entry = Tuple[int, str, float]
+
+def _to_dict(entry: Entry) -> Dict[str, str]:
+    role, content, timestamp = entry
+    return {
+        "role": ROLES[role],
+        "content": content,
+        "timestamp": datetime.fromtimestamp(timestamp).isoformat()
+    }
+
+class SessionStore(ABC):
+    """
+    Stockage de l'historique des conversations du chat (méthodes asynchrones : un stockage sur
+    disque ne bloque pas la boucle d'évènements)
+    """
+    @abstractmethod
+    async def append(self, session_id: str, role: str, content: str):
+        ...
+
+    @abstractmethod
+    async def history(self, session_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        ...
+
+    @abstractmethod
+    async def count(self, session_id: str) -> int:
+        ...
+
+    @abstractmethod
+    async def get_summary(self, session_id: str) -> Tuple[str, int]:
+        """
+        Résumé glissant de la session et nombre de messages (depuis le début) qu'il couvre
+        """
+
+    @abstractmethod
+    async def set_summary(self, session_id: str, summary: str, covered: int):
+        ...
+
+    def close(self):
+        pass
+
+class _Session:
+    __slots__ = ("entries", "last_access", "summary", "covered")
+
+    def __init__(self, now: float):
+        self.entries: List[Entry] = []
+        self.last_access = now
+        self.summary = ""
+        self.covered = 0
+
+class MemorySessionStore(SessionStore):
+    """
+    Stockage en mémoire borné : au plus max_sessions sessions (LRU), expirées après ttl secondes d'inactivité
+    """
+    def __init__(self, max_sessions: int = 10000, ttl: float = 86400):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float):
+        # Les sessions sont ordonnées par dernier accès : les expirées sont en tête
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and session.last_access > now - self.ttl:
+                break
+            del self._sessions[session_id]
+
+    def _get(self, session_id: str, now: float) -> Optional[_Session]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if session.last_access <= now - self.ttl:
+            del self._sessions[session_id]
+            return None
+        session.last_access = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    async def append(self, session_id: str, role: str, content: str):
+        now = time.time()
+        with self._lock:
+            session = self._get(session_id, now)
+            if session is None:
+                session = self._sessions[session_id] = _Session(now)
+            session.entries.append((_ROLE_CODES[role], content, now))
+            self._evict(now)
+
+    async def history(self, session_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        with self._lock:
+            session = self._get(session_id, time.time())
+            if session is None:
+                return []
+            end = None if limit is None else offset + limit
+            return [_to_dict(entry) for entry in session.entries[offset:end]]
+
+    async def count(self, session_id: str) -> int:
+        with self._lock:
+            session = self._get(session_id, time.time())
+            return len(session.entries) if session else 0
+
+    async def get_summary(self, session_id: str) -> Tuple[str, int]:
+        with self._lock:
+            session = self._get(session_id, time.time())
+            return (session.summary, session.covered) if session else ("", 0)
+
+    async def set_summary(self, session_id: str, summary: str, covered: int):
+        with self._lock:
+            session = self._get(session_id, time.time())
+            if session is not None:
+                session.summary, session.covered = summary, covered
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Stockage SQLite (mode WAL) partagé par les workers gunicorn d'une même machine. Les requêtes
+    s'exécutent dans un thread (asyncio.to_thread) : une écriture qui attend le verrou d'un autre
+    worker (jusqu'à 10 s) ne bloque pas la boucle d'évènements.
+    """
+    def __init__(self, path: str, ttl: float = 86400):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._appends = 0
+        self._db = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                session_id TEXT PRIMARY KEY,
+                message_count INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chat_messages (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                role INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS chat_sessions_last_access ON chat_sessions (last_access);
+            CREATE TABLE IF NOT EXISTS chat_summaries (
+                session_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                covered INTEGER NOT NULL
+            );
+        """)
+
+    async def append(self, session_id: str, role: str, content: str):
+        await asyncio.to_thread(self._append, session_id, role, content)
+
+    def _append(self, session_id: str, role: str, content: str):
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT message_count, last_access FROM chat_sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                if row is not None and row[1] <= now - self.ttl:
+                    # Session expirée : on repart d'un historique vide
+                    self._db.execute("DELETE FROM chat_messages WHERE session_id = ?", (session_id,))
+                    self._db.execute("DELETE FROM chat_summaries WHERE session_id = ?", (session_id,))
+                    row = None
+                seq = row[0] if row else 0
+                self._db.execute(
+                    "INSERT INTO chat_messages (session_id, seq, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (session_id, seq, _ROLE_CODES[role], content, now)
+                )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO chat_sessions (session_id, message_count, last_access) VALUES (?, ?, ?)",
+                    (session_id, seq + 1, now)
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._appends += 1
+            if self._appends % 500 == 0:
+                self._purge(now)
+
+    def _purge(self, now: float):
+        expired = now - self.ttl
+        self._db.execute("BEGIN IMMEDIATE")
+        self._db.execute(
+            "DELETE FROM chat_messages WHERE session_id IN (SELECT session_id FROM chat_sessions WHERE last_access <= ?)",
+            (expired,)
+        )
+        self._db.execute(
+            "DELETE FROM chat_summaries WHERE session_id IN (SELECT session_id FROM chat_sessions WHERE last_access <= ?)",
+            (expired,)
+        )
+        self._db.execute("DELETE FROM chat_sessions WHERE last_access <= ?", (expired,))
+        self._db.execute("COMMIT")
+
+    def _live_count(self, session_id: str) -> int:
+        row = self._db.execute(
+            "SELECT message_count FROM chat_sessions WHERE session_id = ? AND last_access > ?",
+            (session_id, time.time() - self.ttl)
+        ).fetchone()
+        return row[0] if row else 0
+
+    async def history(self, session_id: str, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        return await asyncio.to_thread(self._history, session_id, offset, limit)
+
+    def _history(self, session_id: str, offset: int, limit: Optional[int]) -> List[Dict[str, str]]:
+        with self._lock:
+            count = self._live_count(session_id)
+            end = count if limit is None else min(count, offset + limit)
+            # Pagination sur la clé primaire (session_id, seq) : pas de parcours des messages ignorés
+            rows = self._db.execute(
+                "SELECT role, content, created_at FROM chat_messages WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+                (session_id, offset, end)
+            ).fetchall()
+        return [_to_dict(row) for row in rows]
+
+    async def count(self, session_id: str) -> int:
+        return await asyncio.to_thread(self._count, session_id)
+
+    def _count(self, session_id: str) -> int:
+        with self._lock:
+            return self._live_count(session_id)
+
+    async def get_summary(self, session_id: str) -> Tuple[str, int]:
+        return await asyncio.to_thread(self._get_summary, session_id)
+
+    def _get_summary(self, session_id: str) -> Tuple[str, int]:
+        with self._lock:
+            if not self._live_count(session_id):
+                return "", 0
+            row = self._db.execute(
+                "SELECT summary, covered FROM chat_summaries WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return (row[0], row[1]) if row else ("", 0)
+
+    async def set_summary(self, session_id: str, summary: str, covered: int):
+        await asyncio.to_thread(self._set_summary, session_id, summary, covered)
+
+    def _set_summary(self, session_id: str, summary: str, covered: int):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO chat_summaries (session_id, summary, covered) VALUES (?, ?, ?)",
+                (session_id, summary, covered)
+            )
+
+    def close(self):
+        self._db.close()
+
+def create_session_store() -> SessionStore:
+    """
+    Construit le stockage des sessions à partir des variables d'environnement
+    """
+    ttl = float(os.getenv("SESSION_TTL", "86400"))
+    if os.getenv("SESSION_STORE", "sqlite") == "sqlite":
+        return SQLiteSessionStore(os.getenv("SESSION_DB_PATH", "sessions.db"), ttl=ttl)
+    return MemorySessionStore(max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "10000")), ttl=ttl)
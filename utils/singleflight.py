@@ -0,0 +1,54 @@
+from typing import Any, Awaitable, Callable, Dict, Hashable
+import asyncio
+
+class _Call:
+    def __init__(self, task: asyncio.Future):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Fusionne les appels identiques simultanés : le premier appelant lance l'opération,
+    les suivants attendent le même résultat au lieu de la relancer.
+    L'opération n'est annulée que lorsque tous ses appelants ont été annulés.
+    """
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda task, key=key, call=call: self._forget(key, call))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        call.waiters += 1
+        try:
+            # shield : l'annulation d'un appelant ne doit pas annuler l'opération partagée
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # Dernier appelant annulé : personne n'attend plus le résultat
+                self._forget(key, call)
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: Hashable, call: _Call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if call.task.done() and not call.task.cancelled():
+            # Marque l'exception comme consommée même si plus personne n'attend
+            call.task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._calls)
+        }
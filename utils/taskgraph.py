@@ -0,0 +1,118 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+import asyncio
+import time
+
+# Une étape reçoit les résultats déjà calculés (indexés par nom d'étape) et renvoie son propre résultat
+StepFunc = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+class GraphRun:
+    """
+    Résultat d'une exécution : valeurs par étape et horodatage (début, fin) de chaque étape
+    """
+    def __init__(self, results: Dict[str, Any], timings: Dict[str, tuple], dependencies: Dict[str, Sequence[str]], wall_time: float):
+        self.results = results
+        self.timings = timings
+        self.dependencies = dependencies
+        self.wall_time = wall_time
+
+    def duration(self, name: str) -> float:
+        start, end = self.timings[name]
+        return end - start
+
+    def critical_path(self) -> List[str]:
+        """
+        Chaîne de dépendances dont la somme des durées est la plus longue
+        """
+        longest: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+        # Les étapes sont parcourues par date de fin : les dépendances d'une étape sont déjà traitées
+        for name in sorted(self.timings, key=lambda n: self.timings[n][1]):
+            best = max(self.dependencies[name], key=lambda d: longest[d], default=None)
+            previous[name] = best
+            longest[name] = self.duration(name) + (longest[best] if best else 0.0)
+        if not longest:
+            return []
+        node = max(longest, key=longest.get)
+        path = []
+        while node:
+            path.append(node)
+            node = previous[node]
+        return list(reversed(path))
+
+    def critical_path_time(self) -> float:
+        return sum(self.duration(name) for name in self.critical_path())
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "wall_time": round(self.wall_time, 3),
+            "critical_path": self.critical_path(),
+            "critical_path_time": round(self.critical_path_time(), 3),
+            "steps": {name: round(self.duration(name), 3) for name in self.timings}
+        }
+
+class TaskGraph:
+    """
+    Exécute des étapes asynchrones dépendantes les unes des autres : chaque étape démarre dès que
+    ses dépendances sont terminées, dans la limite de max_concurrency étapes simultanées
+    """
+    def __init__(self, max_concurrency: Optional[int] = None):
+        self.max_concurrency = max_concurrency
+        self.steps: Dict[str, StepFunc] = {}
+        self.dependencies: Dict[str, Sequence[str]] = {}
+
+    def add(self, name: str, func: StepFunc, depends_on: Sequence[str] = ()) -> str:
+        if name in self.steps:
+            raise ValueError(f"Étape déjà définie : {name}")
+        for dependency in depends_on:
+            if dependency not in self.steps:
+                raise ValueError(f"Dépendance inconnue pour {name} : {dependency}")
+        self.steps[name] = func
+        self.dependencies[name] = tuple(depends_on)
+        return name
+
+    async def run(self, on_complete: Optional[Callable[[str, Any], None]] = None) -> GraphRun:
+        """
+        Lance toutes les étapes ; la première erreur annule les étapes en cours et est relevée
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency) if self.max_concurrency else None
+        results: Dict[str, Any] = {}
+        timings: Dict[str, tuple] = {}
+        pending = {name: set(deps) for name, deps in self.dependencies.items()}
+        running: Dict[asyncio.Task, str] = {}
+        started = time.perf_counter()
+
+        async def execute(name: str) -> Any:
+            if semaphore is None:
+                begin = time.perf_counter()
+                value = await self.steps[name](results)
+            else:
+                async with semaphore:
+                    begin = time.perf_counter()
+                    value = await self.steps[name](results)
+            timings[name] = (begin - started, time.perf_counter() - started)
+            return value
+
+        def schedule_ready():
+            for name in [n for n, deps in pending.items() if not deps]:
+                del pending[name]
+                running[asyncio.create_task(execute(name))] = name
+
+        try:
+            schedule_ready()
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = running.pop(task)
+                    results[name] = task.result()
+                    if on_complete:
+                        on_complete(name, results[name])
+                    for deps in pending.values():
+                        deps.discard(name)
+                schedule_ready()
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        return GraphRun(results, timings, self.dependencies, time.perf_counter() - started)
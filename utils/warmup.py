@@ -0,0 +1,141 @@
+from typing import Any, Dict, List, Optional, Sequence
+from utils.llm import LLMService
+from utils.backends import OllamaBackend
+import asyncio
+import logging
+import httpx
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+class Warmup:
+    """
+    Mise en route d'un worker, en tâche de fond dès le démarrage : chargement du modèle sur chaque
+    backend Ollama sain (requête sans prompt, maintenue keep_alive), puis évaluation des messages
+    système les plus utilisés pour que les premiers appels les reprennent du cache KV.
+    Le worker est prêt (/ready) quand le modèle est chargé sur au moins un backend ; ensuite, un
+    backend qui a déchargé le modèle (redémarrage, keep_alive écoulé) le recharge aussitôt.
+    """
+    def __init__(
+        self,
+        llm_service: LLMService,
+        system_messages: Sequence[str] = (),
+        enabled: bool = True,
+        keep_warm: bool = True,
+        interval: float = 15.0,
+        timeout: float = 300.0
+    ):
+        self.llm_service = llm_service
+        self.system_messages = list(system_messages)
+        self.enabled = enabled
+        self.keep_warm = keep_warm
+        # Intervalle entre deux vérifications (nouvel essai si aucun backend n'a pu charger le modèle)
+        self.interval = interval
+        # Chargement à froid d'un gros modèle sur CPU : bien au-delà du timeout des appels
+        self.timeout = timeout
+        self.started_at = time.monotonic()
+        self.warm_seconds: Optional[float] = None
+        self.preloads = 0
+        self.last_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, llm_service: LLMService, system_messages: Sequence[str] = ()) -> "Warmup":
+        return cls(
+            llm_service,
+            system_messages[:int(os.getenv("OLLAMA_WARMUP_PROMPTS", str(len(system_messages))))],
+            enabled=os.getenv("STARTUP_WARMUP", "1") != "0",
+            keep_warm=os.getenv("OLLAMA_KEEP_WARM", "1") != "0",
+            interval=float(os.getenv("OLLAMA_WARMUP_INTERVAL", "15")),
+            timeout=float(os.getenv("OLLAMA_WARMUP_TIMEOUT", "300"))
+        )
+
+    def _backends(self) -> List[OllamaBackend]:
+        model = self.llm_service.model
+        return [backend for backend in self.llm_service.pool.backends if backend.healthy and backend.serves(model)]
+
+    @property
+    def ready(self) -> bool:
+        if not self.enabled:
+            return True
+        model = self.llm_service.model
+        return self.warm_seconds is not None and any(backend.has_loaded(model) for backend in self._backends())
+
+    async def _warm(self, backend: OllamaBackend, prime: bool) -> bool:
+        try:
+            await self.llm_service.preload(backend, self.timeout)
+            self.preloads += 1
+        except (httpx.HTTPError, ValueError) as error:
+            self.last_error = f"{backend.url} : {type(error).__name__}: {error}"
+            logger.warning("Préchargement du modèle sur %s impossible : %s", backend.url, error)
+            return False
+        if prime:
+            try:
+                for system_message in self.system_messages:
+                    await self.llm_service.prime(backend, system_message, self.timeout)
+            except (httpx.HTTPError, ValueError) as error:
+                # Modèle chargé : le backend est prêt, seul le cache KV reste à remplir
+                self.last_error = f"{backend.url} : {type(error).__name__}: {error}"
+                logger.warning("Évaluation des messages système sur %s impossible : %s", backend.url, error)
+        return True
+
+    async def run_once(self) -> bool:
+        """
+        Charge le modèle sur les backends sains qui ne l'ont pas en mémoire (tous, avec évaluation
+        des messages système, au premier passage) ; True si au moins un backend est prêt
+        """
+        model = self.llm_service.model
+        first = self.warm_seconds is None
+        # Modèles installés et chargés : un backend qui ne propose pas le modèle est ignoré
+        await self.llm_service.pool.check_all()
+        cold = [backend for backend in self._backends() if first or not backend.has_loaded(model)]
+        results = await asyncio.gather(*(self._warm(backend, first) for backend in cold))
+        if first and any(results):
+            self.warm_seconds = time.monotonic() - self.started_at
+            logger.info(
+                "Modèle %s chargé sur %d backend(s) en %.1fs, %d message(s) système évalué(s)",
+                model, sum(results), self.warm_seconds, len(self.system_messages)
+            )
+        elif cold and any(results):
+            logger.info("Modèle %s rechargé sur %d backend(s)", model, sum(results))
+        return self.ready
+
+    async def _loop(self):
+        while True:
+            try:
+                ready = await self.run_once()
+            except Exception as error:
+                self.last_error = f"{type(error).__name__}: {error}"
+                logger.exception("Préchargement du modèle en échec")
+                ready = False
+            if ready and not self.keep_warm:
+                return
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self) -> Dict[str, Any]:
+        model = self.llm_service.model
+        return {
+            "ready": self.ready,
+            "warmup": self.enabled,
+            "model": model,
+            "warm_seconds": round(self.warm_seconds, 3) if self.warm_seconds is not None else None,
+            "uptime_seconds": round(time.monotonic() - self.started_at, 3),
+            "backends": {backend.url: backend.has_loaded(model) for backend in self.llm_service.pool.backends},
+            "preloads": self.preloads,
+            "system_messages": len(self.system_messages),
+            "last_error": self.last_error
+        }